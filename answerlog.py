@@ -0,0 +1,290 @@
+import json
+import os
+import time
+from array import array
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Every answer given in a quiz, kept as columns: one typed array per field,
+# appended to in memory and written out in chunks to one file per column.
+# Millions of answers take 19 bytes each, load with one read per column and
+# are aggregated a column at a time, with NumPy when it is installed.
+#
+# Words are numbered the first time they are answered; words.jsonl lists
+# [deck, key] per number.  A crash can leave the columns at different
+# lengths and the last line of words.jsonl cut short, so both are cut back to
+# what was written in full when loaded.
+
+# name -> typecode of each column
+COLUMNS = (
+    ('word', 'I'),      # number of the (deck, key) answered
+    ('direction', 'B'),  # index into DIRECTIONS
+    ('correct', 'B'),   # 1 when graded exact or close
+    ('attempt', 'B'),   # 1 for the first answer to a question, 2 for the next...
+    ('latency', 'f'),   # seconds from the question to the answer
+    ('time', 'd'),      # when it was answered, as a Unix timestamp
+)
+DIRECTIONS = ('ge_to_en', 'en_to_ge')
+# Answers kept in memory before they are written
+CHUNK = 256
+# Repetitions beyond this count towards the last point of a learning curve
+MAX_REPETITION = 10
+
+
+class AnswerLog(object):
+    def __init__(self, directory, chunk=CHUNK):
+        self.directory = directory
+        self.chunk = chunk
+        self.columns = {name: array(typecode) for name, typecode in COLUMNS}
+        # number -> [deck, key]
+        self.words = []
+        self.word_numbers = {}
+        # number -> topic number, and topic number -> name
+        self.word_topics = array('I')
+        self.topics = []
+        self.topic_numbers = {}
+        # Answers and words already written
+        self.flushed = 0
+        self.flushed_words = 0
+        self.load()
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def load(self):
+        try:
+            with open(self._path('words.jsonl'), 'rb') as file:
+                data = file.read()
+        except FileNotFoundError:
+            data = b''
+        # Lines up to the first one that was only partly written
+        end = 0
+        for line in data.splitlines(keepends=True):
+            try:
+                if not line.endswith(b'\n'):
+                    raise ValueError(line)
+                if line.strip():
+                    self._number(*json.loads(line))
+            except ValueError:
+                break
+            end += len(line)
+        if end != len(data):
+            with open(self._path('words.jsonl'), 'wb') as file:
+                file.write(data[:end])
+        self.flushed_words = len(self.words)
+        for name, column in self.columns.items():
+            try:
+                with open(self._path(f"{name}.col"), 'rb') as file:
+                    data = file.read()
+            except FileNotFoundError:
+                data = b''
+            column.frombytes(data[:len(data) - len(data) % column.itemsize])
+        count = min(len(column) for column in self.columns.values())
+        # Words are written before the answers to them, so an answer to a word
+        # that was lost is as partly written as a cut chunk
+        words = self.columns['word'][:count]
+        if words and max(words) >= len(self.words):
+            count = next(index for index, word in enumerate(words) if word >= len(self.words))
+        for column in self.columns.values():
+            del column[count:]
+        self.flushed = count
+        if any(os.path.getsize(self._path(f"{name}.col")) != count * column.itemsize
+               for name, column in self.columns.items() if os.path.exists(self._path(f"{name}.col"))):
+            # Drop a chunk that was only partly written
+            self._rewrite()
+
+    def _number(self, deck, key):
+        number = self.word_numbers.get((deck, key))
+        if number is None:
+            number = self.word_numbers[(deck, key)] = len(self.words)
+            self.words.append([deck, key])
+            topic = deck.partition(':')[2]
+            if topic not in self.topic_numbers:
+                self.topic_numbers[topic] = len(self.topics)
+                self.topics.append(topic)
+            self.word_topics.append(self.topic_numbers[topic])
+        return number
+
+    def __len__(self):
+        return len(self.columns['time'])
+
+    def record(self, deck, key, correct, latency, attempt=1, now=None):
+        direction, _, _ = deck.partition(':')
+        columns = self.columns
+        columns['word'].append(self._number(deck, key))
+        columns['direction'].append(DIRECTIONS.index(direction))
+        columns['correct'].append(1 if correct else 0)
+        columns['attempt'].append(min(attempt, 255))
+        columns['latency'].append(latency)
+        columns['time'].append(time.time() if now is None else now)
+        if len(self) - self.flushed >= self.chunk:
+            self.flush()
+
+    def flush(self):
+        # Appends what was recorded since the last flush; the words go first,
+        # so every number in the columns can be looked up
+        if len(self) == self.flushed:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        if len(self.words) > self.flushed_words:
+            with open(self._path('words.jsonl'), 'a') as file:
+                file.writelines(json.dumps(word) + '\n' for word in self.words[self.flushed_words:])
+            self.flushed_words = len(self.words)
+        for name, column in self.columns.items():
+            with open(self._path(f"{name}.col"), 'ab') as file:
+                column[self.flushed:].tofile(file)
+        self.flushed = len(self)
+
+    def _rewrite(self):
+        for name, column in self.columns.items():
+            with open(self._path(f"{name}.col"), 'wb') as file:
+                column[:self.flushed].tofile(file)
+
+    def close(self):
+        self.flush()
+
+    def snapshot(self):
+        # Copies of the columns, as NumPy arrays when it is installed, for
+        # statistics() to aggregate on another thread while answers keep
+        # being recorded
+        convert = (lambda column: array(column.typecode, column)) if numpy is None else (
+            lambda column: numpy.array(column, dtype=column.typecode))
+        columns = {name: convert(column) for name, column in self.columns.items()}
+        return columns, list(self.words), convert(self.word_topics), list(self.topics)
+
+    def statistics(self, direction=None):
+        return statistics(*self.snapshot(), direction=direction)
+
+
+def statistics(columns, words, word_topics, topics, direction=None):
+    # Statistics over the first attempt at every question, in both
+    # directions or in the given one, from AnswerLog.snapshot()
+    code = None if direction is None else DIRECTIONS.index(direction)
+    names = ('word', 'correct', 'latency')
+    if numpy is not None:
+        keep = columns['attempt'] == 1
+        if code is not None:
+            keep &= columns['direction'] == code
+        answered, correct, latency = (columns[name][keep] for name in names)
+        answer_topics = word_topics[answered]
+        everything = numpy.zeros(len(answered), dtype=numpy.int64)
+        # Every percentile below is read from this one sort
+        by_latency = numpy.argsort(latency)
+    else:
+        rows = [i for i, attempt in enumerate(columns['attempt'])
+                if attempt == 1 and (code is None or columns['direction'][i] == code)]
+        answered, correct, latency = ([columns[name][i] for i in rows] for name in names)
+        answer_topics = [word_topics[word] for word in answered]
+        everything = [0] * len(answered)
+        by_latency = None
+    return Statistics(
+        overall=figures(aggregate(everything, 1, correct, latency, by_latency))[0],
+        topics=dict(zip(topics, figures(aggregate(answer_topics, len(topics), correct, latency, by_latency)))),
+        words=words,
+        word_figures=aggregate(answered, len(words), correct, latency, by_latency),
+        curve=figures(aggregate(repetitions(answered, MAX_REPETITION), MAX_REPETITION, correct, latency, by_latency)),
+    )
+
+
+class Statistics(object):
+    # Each figure is (answers, accuracy, median latency, 90th percentile
+    # latency); curve[n] is the figure for the (n + 1)th time words were
+    # asked.  The words' figures stay columns, since there can be many.
+    def __init__(self, overall, topics, words, word_figures, curve):
+        self.overall = overall
+        self.topics = topics
+        self.words = words
+        self.word_figures = word_figures
+        self.curve = curve
+
+    def hardest_words(self, count=10, min_answers=3):
+        # [((deck, key), figure)] of the least often right words
+        counts, accuracy = self.word_figures[0], self.word_figures[1]
+        if numpy is not None:
+            asked = numpy.flatnonzero(counts >= min_answers)
+            hardest = asked[numpy.argsort(accuracy[asked], kind='stable')[:count]].tolist()
+        else:
+            hardest = sorted((word for word in range(len(counts)) if counts[word] >= min_answers),
+                             key=lambda word: accuracy[word])[:count]
+        return [(tuple(self.words[word]), tuple(float(column[word]) for column in self.word_figures))
+                for word in hardest]
+
+
+def figures(columns):
+    # The (count, accuracy, p50, p90) columns from aggregate() as one tuple
+    # per group
+    counts, accuracy, p50, p90 = columns
+    if numpy is not None:
+        counts, accuracy, p50, p90 = counts.tolist(), accuracy.tolist(), p50.tolist(), p90.tolist()
+    return list(zip(counts, accuracy, p50, p90))
+
+
+def aggregate(groups, size, correct, latency, by_latency=None):
+    # Columns (count, accuracy, p50 latency, p90 latency) over groups
+    # 0..size-1 of the answers; groups, correct and latency are parallel
+    # columns.  With NumPy, by_latency is argsort(latency), shared between
+    # calls.
+    if numpy is not None:
+        groups = numpy.asarray(groups, dtype=numpy.int64)
+        counts = numpy.bincount(groups, minlength=size)
+        right = numpy.bincount(groups, weights=correct, minlength=size)
+        accuracy = numpy.divide(right, counts, out=numpy.zeros(size), where=counts > 0)
+        # Latencies sorted within each group; a percentile is an offset into
+        # the group's run.  A stable sort by group of the answers in latency
+        # order is a radix sort for up to 65,536 groups.
+        if by_latency is None:
+            by_latency = numpy.argsort(latency)
+        keys = groups[by_latency].astype(numpy.min_scalar_type(max(size - 1, 0)))
+        order = by_latency[numpy.argsort(keys, kind='stable')]
+        ordered = numpy.asarray(latency)[order]
+        starts = numpy.concatenate(([0], numpy.cumsum(counts)[:-1]))
+        last = numpy.maximum(counts - 1, 0)
+        if len(ordered):
+            p50 = numpy.where(counts > 0, ordered[numpy.minimum(starts + last // 2, len(ordered) - 1)], 0.0)
+            p90 = numpy.where(counts > 0, ordered[numpy.minimum(starts + (last * 9) // 10, len(ordered) - 1)], 0.0)
+        else:
+            p50 = p90 = numpy.zeros(size)
+        return counts, accuracy, p50, p90
+
+    latencies = [[] for _ in range(size)]
+    right = [0] * size
+    for group, ok, seconds in zip(groups, correct, latency):
+        latencies[group].append(seconds)
+        right[group] += ok
+    counts, accuracy, p50, p90 = [0] * size, [0.0] * size, [0.0] * size, [0.0] * size
+    for group in range(size):
+        ordered = sorted(latencies[group])
+        count = counts[group] = len(ordered)
+        if count:
+            accuracy[group] = right[group] / count
+            p50[group] = ordered[(count - 1) // 2]
+            p90[group] = ordered[((count - 1) * 9) // 10]
+    return counts, accuracy, p50, p90
+
+
+def repetitions(words, cap):
+    # For every answer, how many earlier answers there were to its word,
+    # capped at cap - 1
+    if numpy is not None:
+        words = numpy.asarray(words, dtype=numpy.int64)
+        if not len(words):
+            return words
+        # Stable sort by word keeps each word's answers in time order; the
+        # rank within a run of equal words is the repetition
+        order = numpy.argsort(words, kind='stable')
+        ordered = words[order]
+        starts = numpy.flatnonzero(numpy.concatenate(([True], ordered[1:] != ordered[:-1])))
+        lengths = numpy.diff(numpy.concatenate((starts, [len(ordered)])))
+        rank = numpy.arange(len(ordered)) - numpy.repeat(starts, lengths)
+        result = numpy.empty(len(words), dtype=numpy.int64)
+        result[order] = numpy.minimum(rank, cap - 1)
+        return result
+    seen = {}
+    result = []
+    for word in words:
+        result.append(min(seen.get(word, 0), cap - 1))
+        seen[word] = seen.get(word, 0) + 1
+    return result
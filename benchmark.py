@@ -0,0 +1,314 @@
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from answerlog import AnswerLog
+from quiz import EN_TO_GE, GE_TO_EN, QuizEngine, VocabularyStore
+from scheduler import ReviewScheduler
+from storage import JournalStore, load_json, write_snapshot_cache
+from vocabulary import TopicIndex
+
+# Benchmarks of the storage and quiz code on synthetic dictionaries, run
+# headless through quiz.py.  Results are written as JSON so two runs, e.g.
+# before and after a change, can be compared with --compare.
+#
+#   python benchmark.py --sizes 1000 10000 100000 --output after.json --compare before.json
+
+# German stems with their English meaning; words are compounds of them
+NOUN_STEMS = [
+    ('Haus', 'house'), ('Tür', 'door'), ('Bahn', 'train'), ('Hof', 'yard'), ('Schule', 'school'),
+    ('Buch', 'book'), ('Garten', 'garden'), ('Wasser', 'water'), ('Stadt', 'city'), ('Zeit', 'time'),
+    ('Arbeit', 'work'), ('Straße', 'street'), ('Kind', 'child'), ('Tisch', 'table'), ('Stuhl', 'chair'),
+    ('Fenster', 'window'), ('Baum', 'tree'), ('Brief', 'letter'), ('Wagen', 'car'), ('Feld', 'field'),
+    ('Berg', 'mountain'), ('Fluss', 'river'), ('Brot', 'bread'), ('Milch', 'milk'), ('Käse', 'cheese'),
+    ('Hand', 'hand'), ('Kopf', 'head'), ('Schuh', 'shoe'), ('Licht', 'light'), ('Feuer', 'fire'),
+    ('Land', 'country'), ('Spiel', 'game'), ('Geld', 'money'), ('Wort', 'word'), ('Lied', 'song'),
+    ('Vogel', 'bird'), ('Hund', 'dog'), ('Katze', 'cat'), ('Pferd', 'horse'), ('Fisch', 'fish'),
+    ('Löffel', 'spoon'), ('Messer', 'knife'), ('Gabel', 'fork'), ('Teller', 'plate'), ('Glas', 'glass'),
+    ('Uhr', 'clock'), ('Zug', 'train'), ('Flug', 'flight'), ('Reise', 'trip'), ('Karte', 'map'),
+]
+SUFFIXES = [('', ''), ('chen', 'little '), ('ung', ''), ('heit', ''), ('schaft', '')]
+VERB_STEMS = [
+    ('geh', 'go'), ('komm', 'come'), ('spiel', 'play'), ('lern', 'learn'), ('mach', 'make'), ('sag', 'say'),
+    ('kauf', 'buy'), ('koch', 'cook'), ('trink', 'drink'), ('schreib', 'write'), ('les', 'read'), ('such', 'search'),
+]
+PREFIXES = [('', ''), ('ab', 'off '), ('an', 'on '), ('auf', 'up '), ('aus', 'out '), ('ein', 'in '), ('mit', 'along '),
+            ('vor', 'ahead '), ('zu', 'to '), ('nach', 'after '), ('um', 'around '), ('weg', 'away ')]
+ARTICLES = ['der', 'die', 'das']
+
+
+def synthetic_word(rng):
+    # (german, english) that looks like a real entry: mostly compound nouns
+    # with an article, some separable verbs
+    if rng.random() < 0.2:
+        prefix, english_prefix = rng.choice(PREFIXES)
+        stem, english = rng.choice(VERB_STEMS)
+        return f"{prefix}{stem}en", f"to {english} {english_prefix}".strip()
+    parts = [rng.choice(NOUN_STEMS) for _ in range(rng.randint(1, 3))]
+    suffix, english_suffix = rng.choice(SUFFIXES)
+    german = ''.join(stem if i == 0 else stem.lower() for i, (stem, _) in enumerate(parts)) + suffix
+    english = english_suffix + ' '.join(english for _, english in parts)
+    return f"{rng.choice(ARTICLES)} {german}", english
+
+
+def default_topic_size(size):
+    # Words per topic for a dictionary of size words: real decks get bigger
+    # topics as they grow, and a fixed 1,000 would hide what a topic costs
+    return max(1000, size // 10)
+
+
+def generate_dictionary(size, topics=None, seed=0, alternatives=0.1, topic_size=1000):
+    # {topic: {german: english}} with size words over topics topics (one per
+    # topic_size words by default); a share of the words get two translations
+    rng = random.Random(seed)
+    topics = topics or max(1, size // topic_size)
+    dictionary = {f"topic{i:04d}": {} for i in range(topics)}
+    names = list(dictionary)
+    count = 0
+    while count < size:
+        german, english = synthetic_word(rng)
+        words = dictionary[names[count % topics]]
+        if german in words:
+            # Long decks run out of plain compounds
+            german = f"{german}{rng.randint(2, 99)}"
+            if german in words:
+                continue
+        if rng.random() < alternatives:
+            english = [english, synthetic_word(rng)[1]]
+        words[german] = english
+        count += 1
+    return dictionary
+
+
+def measure(function, repeat):
+    # (median seconds per run, peak bytes allocated during one run), after
+    # one untimed run that fills caches and imports lazily loaded code
+    function()
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    tracemalloc.start()
+    try:
+        function()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return statistics.median(times), peak
+
+
+def per_call(function, calls):
+    # Batches calls too fast to time one by one
+    def run():
+        for _ in range(calls):
+            function()
+    return run
+
+
+def resident_bytes():
+    # Current RSS of this process; Linux only
+    with open('/proc/self/statm') as file:
+        return int(file.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+
+
+def load_memory(filename, compact):
+    # (RSS growth in bytes, seconds) of loading filename in this process,
+    # with plain dicts or CompactTopics
+    before = resident_bytes()
+    start = time.perf_counter()
+    topics = JournalStore(filename, compact_memory=compact).load()
+    seconds = time.perf_counter() - start
+    growth = resident_bytes() - before
+    del topics
+    return growth, seconds
+
+
+def memory_benchmarks(size, directory, seed=0):
+    # Each load runs in a fresh interpreter, so neither sees the other's
+    # freed memory
+    filename = os.path.join(directory, 'dictionary.json')
+    with open(filename, 'w') as file:
+        json.dump(generate_dictionary(size, seed=seed), file)
+    results = []
+    for operation, flags in (('load_rss_plain', []), ('load_rss_compact', ['--compact'])):
+        output = subprocess.run([sys.executable, os.path.abspath(__file__), '--load-memory', filename] + flags,
+                                capture_output=True, text=True, check=True).stdout
+        growth, seconds = json.loads(output)
+        results.append({'size': size, 'operation': operation, 'seconds': seconds, 'rss_bytes': growth})
+    return results
+
+
+def run_benchmarks(size, directory, repeat=5, calls=1000, seed=0, topic_size=None):
+    topic_size = topic_size or default_topic_size(size)
+    filename = os.path.join(directory, 'dictionary.json')
+    with open(filename, 'w') as file:
+        json.dump(generate_dictionary(size, seed=seed, topic_size=topic_size), file)
+    results = []
+
+    def record(operation, seconds, peak, count=1):
+        results.append({'size': size, 'topic_size': topic_size, 'operation': operation, 'seconds': seconds / count,
+                        'peak_bytes': peak, 'calls': count})
+
+    def open_store(use_cache=False):
+        # Without coalescing, a flush waits for the write and nothing else
+        return VocabularyStore(JournalStore(filename, coalesce_delay=0, use_cache=use_cache))
+
+    def load():
+        open_store().close()
+    record('load_dictionary', *measure(load, repeat))
+
+    # Through the binary snapshot cache, written up front so no run parses
+    # the JSON
+    write_snapshot_cache(load_json(filename), filename)
+
+    def load_cached():
+        open_store(use_cache=True).close()
+    record('load_dictionary_cached', *measure(load_cached, repeat))
+
+    vocabulary = open_store()
+    try:
+        topic = next(iter(vocabulary.topics))
+
+        def save():
+            # A full snapshot, written by the background thread
+            vocabulary.save()
+            vocabulary.store.flush()
+        record('save_dictionary', *measure(save, repeat))
+
+        rng = random.Random(seed + 1)
+        # Enough for the warm-up, the timed and the traced runs
+        new_words = iter([synthetic_word(rng) for _ in range(calls * (repeat + 2))])
+
+        # Into a topic of their own, so the quizzed topic keeps its size
+        vocabulary.topics['benchmark'] = {}
+
+        def add():
+            german, english = next(new_words)
+            vocabulary.add_words('benchmark', f"{german}{rng.randint(100, 10 ** 6)}", english)
+        seconds, peak = measure(per_call(add, calls), repeat)
+        vocabulary.store.flush()
+        record('add_new_word', seconds, peak, calls)
+
+        # Building a topic's index happens once, on its first question
+        record('index_topic', *measure(lambda: TopicIndex(vocabulary.topics[topic]), repeat))
+
+        scheduler = ReviewScheduler()
+        for direction in (GE_TO_EN, EN_TO_GE):
+            engine = QuizEngine(vocabulary.index, scheduler, direction)
+            engine.set_topic(topic)
+            record(f'new_question_{direction}', *measure(per_call(engine.new_question, calls), repeat), calls)
+
+            # Four options, the three wrong ones ranked over the whole topic
+            choices = QuizEngine(vocabulary.index, scheduler, direction, choices=4)
+            choices.set_topic(topic)
+            choices.new_question()
+            record(f'multiple_choice_{direction}', *measure(per_call(choices.new_question, calls), repeat), calls)
+
+            questions = [engine.new_question() for _ in range(calls)]
+            for grade, answer in (('right', lambda question: question.answers[0]),
+                                  ('wrong', lambda question: 'definitely wrong')):
+                def check():
+                    for question in questions:
+                        engine.question = question
+                        engine.first_attempt = True
+                        engine.check_answer(answer(question))
+                record(f'check_answer_{grade}_{direction}', *measure(check, repeat), calls)
+
+        # One logged answer per dictionary word, aggregated for the statistics screen
+        answer_log = AnswerLog(os.path.join(directory, 'answers'))
+        decks = [(f"{direction}:{name}", list(words)) for name, words in vocabulary.topics.items() if words
+                 for direction in (GE_TO_EN, EN_TO_GE)]
+        for i in range(size):
+            deck, keys = decks[i % len(decks)]
+            answer_log.record(deck, rng.choice(keys), rng.random() < 0.7, rng.random() * 10, 1 + (i % 3 == 0))
+        answer_log.close()
+        record('answer_statistics', *measure(answer_log.statistics, repeat))
+    finally:
+        vocabulary.close()
+    return results
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def compare(results, baseline):
+    # Lines of "operation size: before -> after (ratio)" for matching rows
+    before = {(row['operation'], row['size']): row['seconds'] for row in baseline['results']}
+    lines = []
+    for row in results:
+        old = before.get((row['operation'], row['size']))
+        if old:
+            lines.append(f"{row['operation']:<28} {row['size']:>9}: {old * 1e6:10.1f} us -> "
+                         f"{row['seconds'] * 1e6:10.1f} us  ({row['seconds'] / old:.2f}x)")
+    return lines
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark loading, saving and quizzing on synthetic dictionaries.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000],
+                        help="dictionary sizes in words, e.g. 1000 10000 100000 1000000")
+    parser.add_argument('--repeat', type=int, default=5, help="timed runs per measurement; the median is kept")
+    parser.add_argument('--calls', type=int, default=1000, help="calls per run for the per-question operations")
+    parser.add_argument('--topic-size', type=int,
+                        help="words per topic; by default a tenth of the dictionary, at least 1000")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help="write the results to this JSON file")
+    parser.add_argument('--compare', help="results file of an earlier run to compare against")
+    parser.add_argument('--generate', metavar='FILE', help="only write a synthetic dictionary of the first size")
+    parser.add_argument('--memory', action='store_true',
+                        help="only measure the RSS growth of loading the dictionary, with and without compact_memory")
+    parser.add_argument('--load-memory', metavar='FILE', help=argparse.SUPPRESS)
+    parser.add_argument('--compact', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.load_memory:
+        # One measurement of --memory, in its own process
+        print(json.dumps(load_memory(args.load_memory, args.compact)))
+        raise SystemExit
+
+    if args.generate:
+        with open(args.generate, 'w') as file:
+            json.dump(generate_dictionary(args.sizes[0], seed=args.seed), file)
+        raise SystemExit
+
+    report = {'revision': git_revision(), 'python': platform.python_version(), 'machine': platform.machine(),
+              'results': []}
+    for size in args.sizes:
+        directory = tempfile.mkdtemp(prefix='dictionary-benchmark-')
+        try:
+            if args.memory:
+                rows = memory_benchmarks(size, directory, args.seed)
+            else:
+                rows = run_benchmarks(size, directory, args.repeat, args.calls, args.seed, args.topic_size)
+        finally:
+            shutil.rmtree(directory)
+        for row in rows:
+            if args.memory:
+                print(f"{row['operation']:<28} {size:>9}: {row['seconds']:10.2f} s   "
+                      f"RSS +{row['rss_bytes'] / 2 ** 20:8.1f} MB")
+            else:
+                print(f"{row['operation']:<28} {size:>9}: {row['seconds'] * 1e6:10.1f} us  "
+                      f"peak {row['peak_bytes'] / 2 ** 20:8.2f} MB")
+        report['results'].extend(rows)
+
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(report, file, indent=2)
+    if args.compare:
+        with open(args.compare) as file:
+            print('\n'.join(compare(report['results'], json.load(file))))
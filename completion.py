@@ -0,0 +1,202 @@
+import bisect
+import threading
+
+from normalize import normalize
+from vocabulary import alternatives
+
+# As-you-type suggestions and duplicate warnings for new words.  Stored German
+# words and English translations are kept in sorted arrays by their
+# normalized form, so finding every entry that starts with what was typed is
+# one binary search plus a scan over the matches, and an insert is one
+# binary search plus a list insert.
+
+GERMAN = 'german'
+ENGLISH = 'english'
+
+
+class PrefixIndex(object):
+    # Sorted list of (normalized, ...) tuples
+    def __init__(self, entries=()):
+        self.entries = sorted(entries)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def add(self, entry):
+        i = bisect.bisect_left(self.entries, entry)
+        if i == len(self.entries) or self.entries[i] != entry:
+            self.entries.insert(i, entry)
+
+    def starting_with(self, prefix, limit):
+        # Up to limit entries whose normalized form starts with prefix, in order
+        entries = self.entries
+        i = bisect.bisect_left(entries, (prefix,))
+        found = []
+        while i < len(entries) and len(found) < limit and entries[i][0].startswith(prefix):
+            found.append(entries[i])
+            i += 1
+        return found
+
+    def discard(self, entry):
+        i = bisect.bisect_left(self.entries, entry)
+        if i < len(self.entries) and self.entries[i] == entry:
+            del self.entries[i]
+
+    def equal_to(self, key):
+        entries = self.entries
+        i = bisect.bisect_left(entries, (key,))
+        found = []
+        while i < len(entries) and entries[i][0] == key:
+            found.append(entries[i])
+            i += 1
+        return found
+
+
+class WordCompleter(object):
+    # Prefix indexes over the words of every topic, one per language for all
+    # topics together and one per language and topic.  Registered as a
+    # listener on the quiz.VocabularyStore so changed words are indexed as
+    # they come in.
+    def __init__(self, topics, normalize=normalize, lock=None, index=None):
+        self.topics = topics
+        self.normalize = normalize
+        # VocabularyStore.lock, held while the topics are read
+        self.lock = lock if lock is not None else threading.RLock()
+        # vocabulary.VocabularyIndex over topics, which tells whether a
+        # translation is still used after an edit without reading the topic
+        self.index = index
+        # language -> PrefixIndex of (normalized, topic, stored)
+        self._all = None
+        # (language, topic) -> PrefixIndex of (normalized, stored)
+        self._topics = {}
+        # Topics changed in bulk and indexed again by build()
+        self._stale = set()
+        self._building = False
+        # Word changes made while build() runs, applied again to what it built
+        self._changes = None
+
+    def _entries(self, topic, language):
+        words = self.topics[topic]
+        if language == GERMAN:
+            return {(self.normalize(german), german) for german in words}
+        return {(self.normalize(english), english) for value in words.values() for english in alternatives(value)}
+
+    def build(self):
+        # Indexes every topic the first time, then the stale ones, about a
+        # second per 100,000 words.  The lock is taken per topic, so
+        # quizzing and adding words only ever wait for one topic to be read;
+        # words changed meanwhile are applied again before the new indexes
+        # replace the old ones.
+        try:
+            while True:
+                with self.lock:
+                    if self._all is None:
+                        names = list(self.topics)
+                        kept = {GERMAN: [], ENGLISH: []}
+                    elif self._stale:
+                        names = list(self._stale)
+                        kept = {language: list(index.entries) for language, index in self._all.items()}
+                    else:
+                        self._building = False
+                        return
+                    self._stale.clear()
+                    self._changes = []
+                entries = {GERMAN: [], ENGLISH: []}
+                topics = {}
+                for topic in names:
+                    with self.lock:
+                        for language, found in entries.items():
+                            words = self._entries(topic, language) if topic in self.topics else set()
+                            topics[(language, topic)] = words
+                            found.extend((key, topic, stored) for key, stored in words)
+                names = set(names)
+                for language, found in entries.items():
+                    found.extend(entry for entry in kept[language] if entry[1] not in names)
+                # The old entries are sorted already, which the sort is fast on
+                indexes = {language: PrefixIndex(found) for language, found in entries.items()}
+                topics = {key: PrefixIndex(words) for key, words in topics.items()}
+                with self.lock:
+                    self._topics.update(topics)
+                    for change in self._changes:
+                        self._apply(indexes, *change)
+                    self._changes = None
+                    self._all = indexes
+        finally:
+            self._building = False
+            self._changes = None
+
+    def build_in_background(self):
+        # Lookups find nothing until the first build is done, and the old
+        # words of stale topics until the next one is
+        if not self._building and (self._all is None or self._stale):
+            self._building = True
+            threading.Thread(target=self.build, daemon=True).start()
+
+    def _index(self, language):
+        # None until the indexes are built, which this starts
+        if self._all is None or self._stale:
+            self.build_in_background()
+        return self._all[language] if self._all is not None else None
+
+    def suggest(self, topic, language, text, limit=5):
+        # Up to limit (stored, topic) starting with text, the current topic's
+        # words first
+        key = self.normalize(text)
+        index = self._index(language) if key else None
+        if index is None:
+            return []
+        local = self._topics.get((language, topic))
+        found = [(stored, topic) for _, stored in local.starting_with(key, limit)] if local is not None else []
+        if len(found) < limit:
+            # The current topic's words come up again in the global index
+            for _, other, stored in index.starting_with(key, limit + len(found)):
+                if other != topic and len(found) < limit:
+                    found.append((stored, other))
+        return found
+
+    def existing(self, language, text):
+        # (stored, topic) of every word that normalizes like text, e.g.
+        # ("der Ausflug", "Reisen") for "ausflug" or "die ausflug"
+        key = self.normalize(text)
+        index = self._index(language) if key else None
+        if index is None:
+            return []
+        return [(stored, topic) for _, topic, stored in index.equal_to(key)]
+
+    def _is_translation(self, topic, words, english):
+        if self.index is not None and self.index.is_built(topic):
+            return bool(self.index.topic(topic).german_for(english))
+        return any(english in alternatives(value) for value in words.values())
+
+    def _apply(self, indexes, topic, germans, englishes):
+        # Makes indexes and topic's own ones agree with how these words are
+        # stored now, whether they were added, edited or deleted
+        words = self.topics[topic] if topic in self.topics else {}
+        for language, changed in ((GERMAN, germans), (ENGLISH, englishes)):
+            local = self._topics.setdefault((language, topic), PrefixIndex())
+            for stored in changed:
+                key = self.normalize(stored)
+                if stored in words if language == GERMAN else self._is_translation(topic, words, stored):
+                    indexes[language].add((key, topic, stored))
+                    local.add((key, stored))
+                else:
+                    indexes[language].discard((key, topic, stored))
+                    local.discard((key, stored))
+
+    def words_changed(self, topic, germans=None, englishes=None):
+        # germans and englishes are the words whose entries may have to be
+        # added or removed, e.g. the old and the new translations of an
+        # edited word; None for either marks the whole topic stale
+        with self.lock:
+            if self._all is None and not self._building:
+                # Every topic is read when the indexes are built
+                return
+            if germans is None or englishes is None:
+                self._stale.add(topic)
+            else:
+                if self._changes is not None:
+                    self._changes.append((topic, germans, englishes))
+                if self._all is not None:
+                    self._apply(self._all, topic, germans, englishes)
+        if germans is None or englishes is None:
+            self.build_in_background()
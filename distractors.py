@@ -0,0 +1,144 @@
+import math
+import random
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Wrong options for multiple-choice questions that look like the right one.
+# Every candidate answer of a topic is a vector of its character trigrams,
+# hashed into DIMENSIONS buckets and scaled to unit length, so the cosine
+# similarity to a right answer is a dot product.  With NumPy the vectors are
+# rows of one matrix and scoring a whole topic is one matrix-vector product;
+# without it, an inverted index from bucket to rows counts the shared
+# trigrams instead.
+
+DIMENSIONS = 256
+NGRAM = 3
+# Larger samplers, i.e. packs, are represented by a random sample
+MAX_CANDIDATES = 5000
+
+
+def features(text, n=NGRAM):
+    # Buckets of the character n-grams of an already normalized string; the
+    # padding makes first and last letters count as well
+    padded = f" {text} "
+    return {hash(padded[i:i + n]) % DIMENSIONS for i in range(max(1, len(padded) - n + 1))}
+
+
+def candidate_keys(sampler, limit=MAX_CANDIDATES):
+    if len(sampler) <= limit:
+        return list(sampler.keys)
+    # vocabulary.KeySampler keeps a list, packs.PackSampler reads the file
+    key_at = getattr(sampler, 'key_at', None) or sampler.keys.__getitem__
+    return [key_at(i) for i in sorted(random.sample(range(len(sampler)), limit))]
+
+
+class DistractorIndex(object):
+    # Candidate answers of one topic in one direction.  Registered as a
+    # listener on the vocabulary.KeySampler of those answers, so it follows
+    # adds and deletes: new words get a new row, deleted ones leave an empty
+    # row behind like the drill mode's WeightedSampler.
+    def __init__(self, keys, normalize):
+        self.normalize = normalize
+        self.keys = []
+        self.normalized = []
+        self.positions = {}
+        if numpy is not None:
+            self.matrix = numpy.zeros((max(16, len(keys)), DIMENSIONS), dtype=numpy.float32)
+        else:
+            # bucket -> set of rows
+            self.postings = {}
+            self.sizes = []
+        for key in keys:
+            self.added(key)
+
+    def __len__(self):
+        return len(self.positions)
+
+    def added(self, key):
+        if key in self.positions:
+            return
+        i = len(self.keys)
+        self.positions[key] = i
+        self.keys.append(key)
+        normalized = self.normalize(key)
+        self.normalized.append(normalized)
+        buckets = features(normalized)
+        if numpy is not None:
+            if i == len(self.matrix):
+                # Grow like a list, so adding stays amortized O(1)
+                matrix = numpy.zeros((2 * i, DIMENSIONS), dtype=numpy.float32)
+                matrix[:i] = self.matrix
+                self.matrix = matrix
+            self.matrix[i, list(buckets)] = 1.0 / math.sqrt(len(buckets))
+        else:
+            for bucket in buckets:
+                self.postings.setdefault(bucket, set()).add(i)
+            self.sizes.append(len(buckets))
+
+    def removed(self, key):
+        i = self.positions.pop(key, None)
+        if i is None:
+            return
+        if numpy is not None:
+            self.matrix[i] = 0.0
+        else:
+            for bucket in features(self.normalized[i]):
+                self.postings[bucket].discard(i)
+        self.keys[i] = None
+
+    def scores(self, text):
+        # Similarity of the normalized text to the rows: an array over all of
+        # them with NumPy, otherwise {row: similarity} for the rows sharing a
+        # trigram with it
+        buckets = features(text)
+        if numpy is not None:
+            query = numpy.zeros(DIMENSIONS, dtype=numpy.float32)
+            query[list(buckets)] = 1.0 / math.sqrt(len(buckets))
+            return self.matrix[:len(self.keys)] @ query
+        shared = {}
+        for bucket in buckets:
+            for i in self.postings.get(bucket, ()):
+                shared[i] = shared.get(i, 0) + 1
+        scale = math.sqrt(len(buckets))
+        return {i: count / (scale * math.sqrt(self.sizes[i])) for i, count in shared.items()}
+
+    def similar(self, text, count, exclude=frozenset()):
+        # Up to count keys most similar to the normalized text, most similar
+        # first, skipping keys whose normalized form is in exclude and keys
+        # that normalize alike
+        if not count or not self.keys:
+            return []
+        scores = self.scores(text)
+        if numpy is not None:
+            n = len(scores)
+            wanted = min(n, 2 * count + len(exclude) + 4)
+            while True:
+                # Only the best `wanted` rows are sorted
+                top = numpy.argpartition(-scores, wanted - 1)[:wanted] if wanted < n else numpy.arange(n)
+                ranked = top[numpy.argsort(-scores[top], kind='stable')].tolist()
+                found = self._pick(ranked, count, exclude)
+                if len(found) == count or wanted == n:
+                    return found
+                wanted = min(n, 2 * wanted)
+        ranked = sorted(scores, key=lambda i: -scores[i])
+        found = self._pick(ranked, count, exclude)
+        if len(found) < count:
+            # Too few words share a trigram with text; fill up with any others
+            found = self._pick(ranked + [i for i in range(len(self.keys)) if i not in scores], count, exclude)
+        return found
+
+    def _pick(self, rows, count, exclude):
+        found = []
+        seen = set(exclude)
+        for i in rows:
+            key = self.keys[i]
+            if key is None or self.normalized[i] in seen:
+                continue
+            seen.add(self.normalized[i])
+            found.append(key)
+            if len(found) == count:
+                break
+        return found
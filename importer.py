@@ -0,0 +1,141 @@
+import argparse
+import csv
+import html
+import itertools
+import re
+
+from normalize import normalize, normalize_keeping_articles
+from vocabulary import VocabularyIndex, split_alternatives
+
+# Streaming bulk import of CSV, TSV and Anki "Notes in Plain Text" exports.
+# Rows are read one at a time and inserted in batches, each persisted once,
+# so memory stays bounded whatever the size of the deck.
+
+ANKI_SEPARATORS = {'tab': '\t', 'comma': ',', 'semicolon': ';', 'space': ' ', 'pipe': '|', 'colon': ':'}
+
+# A first row made of these is a header, not a word
+HEADER_NAMES = {'german', 'deutsch', 'english', 'englisch', 'word', 'translation', 'front', 'back'}
+
+HTML_TAG = re.compile(r'<[^>]+>')
+ANKI_SOUND = re.compile(r'\[sound:[^\]]*\]')
+
+
+def guess_delimiter(line):
+    if '\t' in line:
+        return '\t'
+    if ';' in line and ',' not in line:
+        return ';'
+    return ','
+
+
+def clean_html(text):
+    return html.unescape(HTML_TAG.sub(' ', ANKI_SOUND.sub('', text)))
+
+
+def read_rows(file, delimiter=None, reverse=False):
+    # Yields (german, [english alternatives]) per usable row and None for
+    # rows that cannot be used, so callers can count them as skipped.
+    lines = iter(file)
+    first = next(lines, '')
+    strip_html = False
+    # Anki exports start with "#key:value" header lines
+    while first.startswith('#') and ':' in first:
+        key, _, value = first[1:].strip().partition(':')
+        if key == 'separator':
+            delimiter = ANKI_SEPARATORS.get(value.lower(), value)
+        elif key == 'html':
+            strip_html = value.lower() == 'true'
+        first = next(lines, '')
+    if not first:
+        return
+
+    reader = csv.reader(itertools.chain([first], lines), delimiter=delimiter or guess_delimiter(first))
+    header = next(reader, None)
+    if header is None:
+        return
+    if not {cell.strip().lower() for cell in header[:2]} <= HEADER_NAMES:
+        reader = itertools.chain([header], reader)
+    for row in reader:
+        if len(row) < 2:
+            yield None
+            continue
+        german, english = (row[1], row[0]) if reverse else (row[0], row[1])
+        if strip_html:
+            german, english = clean_html(german), clean_html(english)
+        german = ' '.join(german.split())
+        english = split_alternatives(' '.join(english.split()))
+        if not german or not english:
+            yield None
+            continue
+        yield german, english
+
+
+def import_rows(index, store, topic, rows, batch_size=500):
+    # Generator: inserts one batch per step and yields (imported, skipped,
+    # germans, englishes) after persisting it, so a UI can run one step per
+    # frame.  germans are the words the batch added or gave new
+    # translations, englishes those translations.
+    if topic not in index.topics:
+        index.topics[topic] = {}
+        store.append('add_topic', topic)
+    topic_index = index.topic(topic)
+    imported = skipped = 0
+
+    rows = iter(rows)
+    while True:
+        batch = list(itertools.islice(rows, batch_size))
+        if not batch:
+            break
+        germans = []
+        englishes = {}
+        with store.batch():
+            for row in batch:
+                if row is None:
+                    skipped += 1
+                    continue
+                german, english = row
+                # Dedupe against the topic, including near-duplicates
+                german = topic_index.entry_for(german) or german
+                change = topic_index.merge(german, english)
+                if change is None:
+                    skipped += 1
+                    continue
+                op, value = change
+                store.append(op, topic, german, value)
+                imported += 1
+                germans.append(german)
+                englishes.update(dict.fromkeys(english))
+        yield imported, skipped, germans, list(englishes)
+
+    # Fold the imported journal into the snapshot once, not per batch
+    if store.needs_compaction():
+        store.compact(index.topics)
+
+
+if __name__ == '__main__':
+    from sqlite_store import SQLiteStore
+    from storage import JournalStore
+
+    parser = argparse.ArgumentParser(description="Import a CSV, TSV or Anki text export into a topic.")
+    parser.add_argument('deck', help="file with one German word and its translation(s) per row")
+    parser.add_argument('topic', help="topic to import into; created if missing")
+    parser.add_argument('--dictionary', default='dictionary.json')
+    parser.add_argument('--database', help="import into this SQLite database instead of the JSON dictionary")
+    parser.add_argument('--delimiter', help="column separator, guessed from the first row by default")
+    parser.add_argument('--reverse', action='store_true', help="the English column comes first")
+    parser.add_argument('--keep-articles', action='store_true',
+                        help="keep translations that only differ in their article, e.g. 'the spoon' and 'spoon', apart")
+    parser.add_argument('--batch-size', type=int, default=1000)
+    args = parser.parse_args()
+
+    store = SQLiteStore(args.database) if args.database else JournalStore(args.dictionary)
+    index = VocabularyIndex(store.load(), normalize=normalize_keeping_articles if args.keep_articles else normalize)
+    try:
+        with open(args.deck, 'r', encoding='utf-8-sig', newline='') as deck:
+            imported = skipped = 0
+            rows = read_rows(deck, args.delimiter, args.reverse)
+            for imported, skipped, _, _ in import_rows(index, store, args.topic, rows, args.batch_size):
+                print(f"\rImported {imported} words, skipped {skipped}", end='', flush=True)
+            print(f"\rImported {imported} words into '{args.topic}', skipped {skipped}")
+    finally:
+        store.close()
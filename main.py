@@ -3,6 +3,7 @@ from kivy.uix.boxlayout import BoxLayout
 from kivy.uix.button import Button
 from kivy.uix.label import Label
 from kivy.uix.textinput import TextInput
+from kivy.uix.togglebutton import ToggleButton
 from kivy.uix.screenmanager import ScreenManager, Screen
 from kivy.graphics import Color, Rectangle
 from kivy.uix.floatlayout import FloatLayout
@@ -10,28 +11,160 @@ from kivy.uix.gridlayout import GridLayout
 from kivy.core.window import Window
 from kivy.uix.spinner import Spinner
 from kivy.metrics import dp, sp
-import random
-import json
-from kivy.uix.dropdown import DropDown
+from kivy.clock import Clock
+from functools import partial
+from kivy.uix.modalview import ModalView
+from kivy.uix.recycleview import RecycleView
+from kivy.uix.recycleboxlayout import RecycleBoxLayout
 from kivy.uix.scrollview import ScrollView
-from kivy.uix.gridlayout import GridLayout
+from kivy.properties import NumericProperty, ObjectProperty, StringProperty
+import csv
+import os
+import threading
+from storage import JournalStore, ShardedStore, split_into_shards
+from sqlite_store import SQLiteStore, import_json
+from importer import import_rows, read_rows
+from scheduler import ReviewScheduler
+from matching import EXACT, CLOSE, WRONG
+from quiz import EN_TO_GE, GE_TO_EN, QuestionPrefetcher, QuizEngine, VocabularyStore
+from normalize import normalize, normalize_keeping_articles
+from packs import open_packs
+from completion import ENGLISH, GERMAN, WordCompleter
+from search import SearchIndex
+from answerlog import AnswerLog, MAX_REPETITION, statistics
+from vocabulary import alternatives, split_alternatives
+from tracing import BUCKETS, TRACER, configure_logging, get_logger, instrument, traced
+
+log = get_logger('app')
+
+# Store methods timed while tracing; _write_batch runs on the writer thread
+STORE_OPERATIONS = ('load', 'append', 'compact', 'flush', '_write_batch')
+
+# Completions offered under the new word inputs
+SUGGESTIONS = 4
+# Search results per page of the browse screen
+PAGE_SIZE = 50
+# Seconds between checks whether a quizzed topic is indexed yet
+LOADING_POLL = 0.1
+
+class LazyScreenManager(ScreenManager):
+    # Screens are registered as factories and only built the first time
+    # something asks for them (switching ``current`` goes through get_screen).
+    def __init__(self, **kwargs):
+        super(LazyScreenManager, self).__init__(**kwargs)
+        self.factories = {}
+
+    def register(self, name, factory):
+        self.factories[name] = factory
+
+    def is_built(self, name):
+        return self.has_screen(name)
+
+    def get_screen(self, name):
+        if name in self.factories and not self.has_screen(name):
+            with TRACER.span('build screen', 'ui', screen=name):
+                self.add_widget(self.factories.pop(name)(name=name))
+        return super(LazyScreenManager, self).get_screen(name)
+
+    def on_current(self, instance, value):
+        # A switch builds the screen if needed, runs on_pre_enter and starts
+        # the transition, all within the frame of the button press
+        with TRACER.span('switch screen', 'ui', screen=value):
+            super(LazyScreenManager, self).on_current(instance, value)
+        log.debug('switch screen', screen=value)
+
+    def warm_up(self, *args):
+        # Build one pending screen per frame so the UI never stalls
+        if self.factories:
+            self.get_screen(next(iter(self.factories)))
+            Clock.schedule_once(self.warm_up)
+
+
+def ask_when_ready(screen):
+    # A quiz screen's topic is indexed on the prefetch thread; until then
+    # the screen says so and tries its new_question() again
+    screen.question_label.text = "Loading the topic..."
+    if screen.loading_event is not None:
+        screen.loading_event.cancel()
+    screen.loading_event = Clock.schedule_once(lambda dt: screen.new_question(), LOADING_POLL)
+
+
+def word_count(topics, name):
+    # Sharded topics know their size without loading their words
+    if hasattr(topics, 'count'):
+        return topics.count(name)
+    return len(topics[name])
+
+
+class TopicRow(Button):
+    # Recycled row of a TopicList; its topic, text and callback come from the data
+    topic = StringProperty('')
+    select_callback = ObjectProperty(None)
+
+    def on_release(self):
+        if self.select_callback is not None:
+            self.select_callback(self.topic)
+
+
+class TopicList(RecycleView):
+    # Only the visible rows exist as widgets, however many topics there are
+    def __init__(self, select_callback, row_height=dp(50), spacing=dp(10), **kwargs):
+        super(TopicList, self).__init__(**kwargs)
+        self.select_callback = select_callback
+        self.viewclass = TopicRow
+
+        layout = RecycleBoxLayout(
+            orientation="vertical",
+            default_size=(None, row_height),
+            default_size_hint=(1, None),
+            size_hint_y=None,
+            spacing=spacing
+        )
+        layout.bind(minimum_height=layout.setter('height'))
+        self.add_widget(layout)
+
+    def set_topics(self, topics, packs=None, **row_style):
+        self.data = [
+            dict(row_style, topic=topic, text=f"{topic} ({word_count(topics, topic)})", select_callback=self.select_callback)
+            for topic in topics
+        ]
+        # Read-only packs follow the user's own topics
+        self.data.extend(
+            dict(row_style, topic=name, text=f"{name} ({len(pack)}, pack)", select_callback=self.select_callback)
+            for name, pack in (packs or {}).items() if name not in topics
+        )
+
+
+class WordRow(Button):
+    # Recycled row of a WordList; entry is a search.SearchIndex entry number
+    entry = NumericProperty(-1)
+    select_callback = ObjectProperty(None)
+
+    def on_release(self):
+        if self.select_callback is not None:
+            self.select_callback(self.entry)
+
+
+class WordList(TopicList):
+    # A TopicList of search results
+    def __init__(self, select_callback, **kwargs):
+        super(WordList, self).__init__(select_callback, **kwargs)
+        self.viewclass = WordRow
 
-def load_dictionary(filename):
-    try:
-        with open(filename, 'r') as file:
-            return json.load(file)
-    except FileNotFoundError:
-        return {}
 
-def save_dictionary(dictionary, filename):
-    with open(filename, 'w') as file:
-        json.dump(dictionary, file)
+class TopicDropDown(ModalView):
+    # Drop-in for DropDown (open/dismiss) backed by a TopicList
+    def __init__(self, select_callback, **kwargs):
+        kwargs.setdefault('size_hint', (0.8, 0.7))
+        super(TopicDropDown, self).__init__(**kwargs)
+        self.topic_list = TopicList(select_callback=select_callback, row_height=dp(44), spacing=0)
+        self.add_widget(self.topic_list)
+
 
 class MainScreen(Screen):
-    def __init__(self, topics, save_callback, **kwargs):
+    def __init__(self, topics, **kwargs):
         super(MainScreen, self).__init__(**kwargs)
         self.topics = topics
-        self.save_callback = save_callback
 
         # Main layout with white background
         self.main_layout = BoxLayout(orientation="vertical", size_hint=(1, 1))
@@ -63,6 +196,9 @@ class MainScreen(Screen):
             {"text": "Introduce New Word", "background_color": (0.87, 0.63, 0.87, 1)},
             {"text": "English to German", "background_color": (0.48, 0.78, 0.96, 1)},
             {"text": "German to English", "background_color": (0.5, 1, 0, 1)},
+            {"text": "Import Words", "background_color": (0.96, 0.6, 0.4, 1)},
+            {"text": "Browse Words", "background_color": (0.6, 0.85, 0.75, 1)},
+            {"text": "Statistics", "background_color": (0.75, 0.75, 0.95, 1)},
             {"text": "Exit", "background_color": (1, 0.84, 0, 1)},
         ]
 
@@ -71,7 +207,7 @@ class MainScreen(Screen):
                 text=btn_info['text'],
                 background_color=btn_info['background_color'],
                 color=(1, 1, 1, 1),
-                size_hint=(0.25, 1)
+                size_hint=(0.2, 1)
             )
 
             if btn_info['text'] == "Exit":
@@ -82,6 +218,12 @@ class MainScreen(Screen):
                 btn.bind(on_press=self.switch_to_topic_selection_for_ge_to_en)
             elif btn_info['text'] == "German to English":
                 btn.bind(on_press=self.switch_to_topic_selection_for_ge_to_en)
+            elif btn_info['text'] == "Import Words":
+                btn.bind(on_press=self.switch_to_import_screen)
+            elif btn_info['text'] == "Browse Words":
+                btn.bind(on_press=self.switch_to_browse_screen)
+            elif btn_info['text'] == "Statistics":
+                btn.bind(on_press=self.switch_to_statistics_screen)
 
             button_layout.add_widget(btn)
 
@@ -101,11 +243,19 @@ class MainScreen(Screen):
     def switch_to_topic_selection_for_en_to_ge(self, instance):
         self.manager.current = 'topic_selection_for_en_to_ge_screen'
 
+    def switch_to_import_screen(self, instance):
+        self.manager.current = 'import_screen'
+
+    def switch_to_browse_screen(self, instance):
+        self.manager.current = 'browse_screen'
+
+    def switch_to_statistics_screen(self, instance):
+        self.manager.current = 'statistics_screen'
+
 class TopicSelectionScreen(Screen):
-    def __init__(self, topics, save_callback, **kwargs):
+    def __init__(self, topics, **kwargs):
         super(TopicSelectionScreen, self).__init__(**kwargs)
         self.topics = topics
-        self.save_callback = save_callback
 
         # Main layout with white background
         self.layout = BoxLayout(orientation="vertical", size_hint=(1, 1), padding=dp(20), spacing=dp(20))
@@ -123,19 +273,14 @@ class TopicSelectionScreen(Screen):
         )
         self.layout.add_widget(self.title_label)
 
-        # Dropdown for topic selection using DropDown widget
-        self.dropdown = DropDown()
-        for topic in self.topics.keys():
-            btn = Button(
-                text=topic,
-                size_hint_y=None,
-                height=dp(44),
-                background_color=(0.87, 0.87, 0.87, 0.5),
-                color=(0, 0, 0, 1),
-                font_size=sp(20)
-            )
-            btn.bind(on_release=lambda btn: self.select_existing_topic(btn.text))
-            self.dropdown.add_widget(btn)
+        # Dropdown for topic selection, backed by a recycled list
+        self.dropdown = TopicDropDown(select_callback=self.select_existing_topic)
+        self.dropdown.topic_list.set_topics(
+            self.topics,
+            background_color=(0.87, 0.87, 0.87, 0.5),
+            color=(0, 0, 0, 1),
+            font_size=sp(20)
+        )
 
         # Main button to trigger the dropdown
         self.main_button = Button(
@@ -198,6 +343,15 @@ class TopicSelectionScreen(Screen):
         self.rect.pos = self.layout.pos
         self.rect.size = self.layout.size
 
+    def on_pre_enter(self, *args):
+        # Pick up topics created since the list was filled, e.g. by an import
+        self.dropdown.topic_list.set_topics(
+            self.topics,
+            background_color=(0.87, 0.87, 0.87, 0.5),
+            color=(0, 0, 0, 1),
+            font_size=sp(20)
+        )
+
     def select_existing_topic(self, text):
         # Handle the topic selection
         if text != 'Choose a topic':  # Make sure a valid topic is selected
@@ -224,10 +378,11 @@ class TopicSelectionScreen(Screen):
 
 
 class TopicSelectionForTranslationScreen(Screen):
-    def __init__(self, topics, target_screen, **kwargs):
+    def __init__(self, topics, target_screen, packs=None, **kwargs):
         super(TopicSelectionForTranslationScreen, self).__init__(**kwargs)
         self.topics = topics
         self.target_screen = target_screen
+        self.packs = packs
 
         # Main layout with white background
         self.layout = BoxLayout(orientation="vertical", size_hint=(1, 1))
@@ -241,16 +396,14 @@ class TopicSelectionForTranslationScreen(Screen):
                             size_hint=(1, 0.1))
         self.layout.add_widget(title_label)
 
-        # Create a ScrollView for the topic buttons
-        scroll_view = ScrollView(size_hint=(1, 0.7))  # Take up most of the screen height
-        self.button_container = GridLayout(cols=1, spacing=10, size_hint_y=None)  # Vertical stack of buttons
-        self.button_container.bind(minimum_height=self.button_container.setter('height'))  # Enable dynamic height
+        # Recycled list of topic buttons, taking up most of the screen height
+        self.topic_list = TopicList(select_callback=self.select_existing_topic, row_height=50, spacing=10,
+                                    size_hint=(1, 0.7))
 
         # Add existing topics
         self.add_existing_topics()
 
-        scroll_view.add_widget(self.button_container)
-        self.layout.add_widget(scroll_view)
+        self.layout.add_widget(self.topic_list)
 
         # Button layout for back button
         button_layout = BoxLayout(orientation="horizontal", spacing=20, padding=20, size_hint=(1, 0.2))
@@ -269,14 +422,13 @@ class TopicSelectionForTranslationScreen(Screen):
         self.rect.size = self.layout.size
 
     def add_existing_topics(self):
-        for topic in self.topics.keys():
-            btn_topic = Button(text=topic, background_color=(0.9, 0.9, 0.9, 1), color=(0, 0, 0, 1), size_hint_y=None,
-                               height=50)  # Fixed height for each button
-            btn_topic.bind(on_press=self.select_existing_topic)
-            self.button_container.add_widget(btn_topic)
-
-    def select_existing_topic(self, instance):
-        topic = instance.text
+        self.topic_list.set_topics(self.topics, self.packs, background_color=(0.9, 0.9, 0.9, 1), color=(0, 0, 0, 1))
+
+    def on_pre_enter(self, *args):
+        # Pick up topics created since the list was filled, e.g. by an import
+        self.add_existing_topics()
+
+    def select_existing_topic(self, topic):
         self.manager.get_screen(self.target_screen).set_topic(topic)
         self.manager.current = self.target_screen
 
@@ -286,11 +438,16 @@ class TopicSelectionForTranslationScreen(Screen):
 
 
 class NewWordScreen(Screen):
-    def __init__(self, topics, save_callback, **kwargs):
+    def __init__(self, vocabulary, completer, **kwargs):
         super(NewWordScreen, self).__init__(**kwargs)
-        self.topics = topics
-        self.save_callback = save_callback
+        self.vocabulary = vocabulary
+        # completion.WordCompleter over every topic
+        self.completer = completer
         self.current_topic = None
+        # (input, stored word) behind each suggestion button
+        self.suggestions = []
+        # language -> duplicate warning for what was typed in its field
+        self.warnings = {GERMAN: "", ENGLISH: ""}
 
         # Main layout with white background
         self.layout = BoxLayout(orientation="vertical", size_hint=(1, 1), padding=dp(20), spacing=dp(20))
@@ -326,7 +483,7 @@ class NewWordScreen(Screen):
 
         # Input for English translation (under the button)
         self.translation_input = TextInput(
-            hint_text="Enter English translation",
+            hint_text="Enter English translation(s), comma separated",
             multiline=False,
             background_color=(1, 1, 1, 1),
             foreground_color=(0, 0, 0, 1),
@@ -348,7 +505,7 @@ class NewWordScreen(Screen):
 
         # Input for German word (under the button)
         self.word_input = TextInput(
-            hint_text="Enter German word",
+            hint_text="Enter German word(s), comma separated",
             multiline=False,
             background_color=(1, 1, 1, 1),
             foreground_color=(0, 0, 0, 1),
@@ -363,6 +520,35 @@ class NewWordScreen(Screen):
         # Add the top layout to the main layout
         self.layout.add_widget(top_layout)
 
+        # Stored words starting with what is being typed; a tap completes it
+        suggestion_layout = BoxLayout(orientation="horizontal", size_hint=(1, 0.1), spacing=dp(10))
+        self.suggestion_buttons = []
+        for _ in range(SUGGESTIONS):
+            btn = Button(
+                text="",
+                background_color=(0.95, 0.95, 0.95, 1),
+                color=(0, 0, 0, 1),
+                font_size=sp(16),
+                opacity=0,
+                disabled=True
+            )
+            btn.bind(on_press=self.complete)
+            suggestion_layout.add_widget(btn)
+            self.suggestion_buttons.append(btn)
+        self.layout.add_widget(suggestion_layout)
+
+        # Warns while typing about words that are already stored
+        self.warning_label = Label(
+            text="",
+            color=(0.8, 0.4, 0, 1),
+            size_hint=(1, 0.1),
+            font_size=sp(16)
+        )
+        self.layout.add_widget(self.warning_label)
+
+        self.word_input.bind(text=self.on_german_text)
+        self.translation_input.bind(text=self.on_english_text)
+
         # Submit button
         self.submit_button = Button(
             text="Submit",
@@ -400,32 +586,520 @@ class NewWordScreen(Screen):
         self.rect.pos = self.layout.pos
         self.rect.size = self.layout.size
 
+    def on_enter(self, *args):
+        # Indexing every stored word takes a moment on large dictionaries.
+        # Warming the screen up builds it, but only showing it reads every
+        # topic.
+        self.completer.build_in_background()
+
     def set_topic(self, topic):
         self.current_topic = topic
         self.title_label.text = f"New Word Screen - Topic: {topic}"
 
+    @traced()
+    def on_german_text(self, instance, text):
+        self.show_suggestions(instance, GERMAN, text)
+
+    @traced()
+    def on_english_text(self, instance, text):
+        self.show_suggestions(instance, ENGLISH, text)
+
+    def show_suggestions(self, text_input, language, text):
+        # Only the alternative being typed, after the last comma, is completed
+        found = self.completer.suggest(self.current_topic, language, text.split(',')[-1], SUGGESTIONS)
+        self.suggestions = [(text_input, stored) for stored, _ in found]
+        for i, btn in enumerate(self.suggestion_buttons):
+            if i < len(found):
+                stored, topic = found[i]
+                btn.text = stored if topic == self.current_topic else f"{stored} ({topic})"
+                btn.opacity, btn.disabled = 1, False
+            else:
+                btn.text = ""
+                btn.opacity, btn.disabled = 0, True
+
+        warnings = []
+        for part in split_alternatives(text):
+            topics = sorted({topic for _, topic in self.completer.existing(language, part)})
+            if self.current_topic in topics:
+                warnings.append(f"'{part}' already exists in this topic.")
+            elif topics:
+                warnings.append(f"'{part}' already exists in topic {', '.join(topics)}.")
+        self.warnings[language] = " ".join(warnings)
+        self.warning_label.text = " ".join(warning for warning in self.warnings.values() if warning)
+
+    def complete(self, instance):
+        i = self.suggestion_buttons.index(instance)
+        if i >= len(self.suggestions):
+            return
+        text_input, stored = self.suggestions[i]
+        parts = text_input.text.split(',')
+        parts[-1] = f" {stored}" if len(parts) > 1 else stored
+        text_input.text = ','.join(parts)
+        text_input.focus = True
+
+    @traced()
     def add_new_word(self, instance):
-        german_word = self.word_input.text.strip()
-        english_translation = self.translation_input.text.strip()
-
-        if german_word and english_translation:
-            self.topics[self.current_topic][german_word] = english_translation
-            self.save_callback(self.topics)
+        # Both fields accept comma-separated alternatives
+        added = self.vocabulary.add_words(self.current_topic, self.word_input.text, self.translation_input.text)
+        if added is None:
+            self.result_label.text = "Please enter both the word and its translation."
+        elif not added:
+            self.result_label.text = "This word and translation already exist."
+        else:
             self.result_label.text = "Word added successfully!"
             self.word_input.text = ""
             self.translation_input.text = ""
-        else:
-            self.result_label.text = "Please enter both the word and its translation."
+
+    def show_save_result(self, error):
+        if error is not None:
+            self.result_label.text = f"Could not save the dictionary: {error}"
+        elif self.result_label.text == "Word added successfully!":
+            self.result_label.text = "Word added and saved!"
+
+    def switch_to_main(self, instance):
+        self.manager.current = 'main_screen'
+
+
+class ImportScreen(Screen):
+    def __init__(self, vocabulary, **kwargs):
+        super(ImportScreen, self).__init__(**kwargs)
+        self.vocabulary = vocabulary
+        self.importer = None
+        self.topic = None
+        self.deck = None
+        self.imported = self.skipped = 0
+
+        # Main layout with white background
+        self.layout = BoxLayout(orientation="vertical", size_hint=(1, 1), padding=dp(20), spacing=dp(20))
+        with self.layout.canvas.before:
+            Color(1, 1, 1, 1)
+            self.rect = Rectangle(size=self.layout.size, pos=self.layout.pos)
+        self.layout.bind(size=self.update_rect, pos=self.update_rect)
+
+        self.title_label = Label(
+            text="Import Words",
+            font_size=sp(24),
+            color=(0, 0, 0, 1),
+            size_hint=(1, 0.1)
+        )
+        self.layout.add_widget(self.title_label)
+
+        # Input for the file to import
+        self.path_input = TextInput(
+            hint_text="Path to a CSV, TSV or Anki text export",
+            multiline=False,
+            background_color=(1, 1, 1, 1),
+            foreground_color=(0, 0, 0, 1),
+            font_size=sp(18),
+            size_hint=(1, 0.1)
+        )
+        self.layout.add_widget(self.path_input)
+
+        # Input for the topic, created if it does not exist yet
+        self.topic_input = TextInput(
+            hint_text="Topic to import into",
+            multiline=False,
+            background_color=(1, 1, 1, 1),
+            foreground_color=(0, 0, 0, 1),
+            font_size=sp(18),
+            size_hint=(1, 0.1)
+        )
+        self.layout.add_widget(self.topic_input)
+
+        # Column order of the file
+        self.reverse_toggle = ToggleButton(
+            text="English column first",
+            background_color=(0.6, 0.8, 1, 1),
+            color=(0, 0, 0, 1),
+            size_hint=(1, 0.1),
+            font_size=sp(18)
+        )
+        self.layout.add_widget(self.reverse_toggle)
+
+        # Import button
+        self.import_button = Button(
+            text="Import",
+            background_color=(0.9, 0.9, 0.9, 1),
+            size_hint=(1, 0.1),
+            font_size=sp(20)
+        )
+        self.import_button.bind(on_press=self.start_import)
+        self.layout.add_widget(self.import_button)
+
+        # Progress label
+        self.result_label = Label(
+            text="",
+            color=(0, 0, 0, 1),
+            size_hint=(1, 0.1),
+            font_size=sp(16)
+        )
+        self.layout.add_widget(self.result_label)
+
+        # Back button at the bottom
+        btn_back = Button(
+            text="Back to Main Menu",
+            background_color=(1, 1, 1, 1),
+            color=(0, 0, 0, 1),
+            size_hint=(1, 0.1),
+            font_size=sp(18)
+        )
+        btn_back.bind(on_press=self.switch_to_main)
+        self.layout.add_widget(btn_back)
+
+        self.add_widget(self.layout)
+
+    def update_rect(self, *args):
+        self.rect.pos = self.layout.pos
+        self.rect.size = self.layout.size
+
+    @traced()
+    def start_import(self, instance):
+        path = self.path_input.text.strip()
+        topic = self.topic_input.text.strip()
+        if self.importer is not None:
+            return
+        if not path or not topic:
+            self.result_label.text = "Please enter both the file and the topic."
+            return
+        try:
+            self.deck = open(path, 'r', encoding='utf-8-sig', newline='')
+        except OSError as e:
+            self.result_label.text = f"Could not open the file: {e}"
+            return
+
+        self.imported = self.skipped = 0
+        self.topic = topic
+        rows = read_rows(self.deck, reverse=self.reverse_toggle.state == 'down')
+        self.importer = import_rows(self.vocabulary.index, self.vocabulary.store, topic, rows)
+        self.import_button.disabled = True
+        # One batch per frame keeps the UI responsive during big imports
+        Clock.schedule_interval(self.import_step, 0)
+
+    @traced()
+    def import_step(self, dt):
+        try:
+            with self.vocabulary.lock:
+                imported, skipped, germans, englishes = next(self.importer)
+            self.vocabulary.changed(self.topic, germans, englishes)
+        except StopIteration:
+            self.finish_import()
+            return False
+        except (OSError, UnicodeDecodeError, csv.Error) as e:
+            self.finish_import()
+            self.result_label.text = f"Import failed: {e}"
+            return False
+        self.imported, self.skipped = imported, skipped
+        self.result_label.text = f"Imported {imported} words, skipped {skipped}..."
+
+    def finish_import(self):
+        self.deck.close()
+        self.importer = None
+        self.import_button.disabled = False
+        self.result_label.text = f"Imported {self.imported} words into '{self.topic_input.text.strip()}', skipped {self.skipped}."
+
+    def switch_to_main(self, instance):
+        self.manager.current = 'main_screen'
+
+
+class BrowseScreen(Screen):
+    # Searches the words of every topic, a page of results at a time, and
+    # edits or deletes the one tapped
+    def __init__(self, vocabulary, search_index, **kwargs):
+        super(BrowseScreen, self).__init__(**kwargs)
+        self.vocabulary = vocabulary
+        # search.SearchIndex over every topic
+        self.search_index = search_index
+        self.results = []
+        self.page = 0
+        # (topic, german) being edited
+        self.selected = None
+        self.search_event = None
+
+        # Main layout with white background
+        self.layout = BoxLayout(orientation="vertical", size_hint=(1, 1), padding=dp(20), spacing=dp(10))
+        with self.layout.canvas.before:
+            Color(1, 1, 1, 1)
+            self.rect = Rectangle(size=self.layout.size, pos=self.layout.pos)
+        self.layout.bind(size=self.update_rect, pos=self.update_rect)
+
+        self.search_input = TextInput(
+            hint_text="Search German or English words in every topic",
+            multiline=False,
+            background_color=(1, 1, 1, 1),
+            foreground_color=(0, 0, 0, 1),
+            font_size=sp(18),
+            size_hint=(1, 0.08)
+        )
+        self.search_input.bind(text=self.on_search_text)
+        self.layout.add_widget(self.search_input)
+
+        # Result count and page
+        self.status_label = Label(
+            text="",
+            color=(0, 0, 0, 1),
+            size_hint=(1, 0.06),
+            font_size=sp(16)
+        )
+        self.layout.add_widget(self.status_label)
+
+        # Recycled rows of the current page
+        self.word_list = WordList(select_callback=self.select_entry, row_height=dp(40), spacing=dp(4),
+                                  size_hint=(1, 0.46))
+        self.layout.add_widget(self.word_list)
+
+        page_layout = BoxLayout(orientation="horizontal", size_hint=(1, 0.08), spacing=dp(10))
+        self.previous_button = Button(text="Previous", background_color=(0.9, 0.9, 0.9, 1), disabled=True)
+        self.previous_button.bind(on_press=self.previous_page)
+        page_layout.add_widget(self.previous_button)
+        self.next_button = Button(text="Next", background_color=(0.9, 0.9, 0.9, 1), disabled=True)
+        self.next_button.bind(on_press=self.next_page)
+        page_layout.add_widget(self.next_button)
+        self.layout.add_widget(page_layout)
+
+        # Editing the tapped word
+        edit_layout = BoxLayout(orientation="horizontal", size_hint=(1, 0.08), spacing=dp(10))
+        self.selected_label = Label(text="", color=(0, 0, 0, 1), font_size=sp(16), size_hint=(0.35, 1))
+        edit_layout.add_widget(self.selected_label)
+        self.english_input = TextInput(
+            hint_text="English translation(s), comma separated",
+            multiline=False,
+            background_color=(1, 1, 1, 1),
+            foreground_color=(0, 0, 0, 1),
+            font_size=sp(16),
+            size_hint=(0.35, 1)
+        )
+        edit_layout.add_widget(self.english_input)
+        self.save_button = Button(text="Save", background_color=(0.5, 1, 0, 1), size_hint=(0.15, 1), disabled=True)
+        self.save_button.bind(on_press=self.save_entry)
+        edit_layout.add_widget(self.save_button)
+        self.delete_button = Button(text="Delete", background_color=(1, 0.4, 0.4, 1), size_hint=(0.15, 1),
+                                    disabled=True)
+        self.delete_button.bind(on_press=self.delete_entry)
+        edit_layout.add_widget(self.delete_button)
+        self.layout.add_widget(edit_layout)
+
+        self.result_label = Label(
+            text="",
+            color=(0, 0, 0, 1),
+            size_hint=(1, 0.06),
+            font_size=sp(16)
+        )
+        self.layout.add_widget(self.result_label)
+
+        # Back button at the bottom
+        btn_back = Button(
+            text="Back to Main Menu",
+            background_color=(1, 1, 1, 1),
+            color=(0, 0, 0, 1),
+            size_hint=(1, 0.08),
+            font_size=sp(18)
+        )
+        btn_back.bind(on_press=self.switch_to_main)
+        self.layout.add_widget(btn_back)
+
+        self.add_widget(self.layout)
+
+    def update_rect(self, *args):
+        self.rect.pos = self.layout.pos
+        self.rect.size = self.layout.size
+
+    def on_enter(self, *args):
+        # Warming the screen up builds it, but only showing it reads every
+        # topic
+        self.search_index.build_in_background()
+
+    def on_search_text(self, instance, text):
+        # Searches once typing pauses rather than on every keystroke
+        if self.search_event is not None:
+            self.search_event.cancel()
+        self.search_event = Clock.schedule_once(lambda dt: self.run_search(), 0.15)
+
+    @traced()
+    def run_search(self, page=0):
+        self.results = self.search_index.search(self.search_input.text)
+        self.page = min(page, max(0, (len(self.results) - 1) // PAGE_SIZE))
+        self.show_page()
+
+    def show_page(self):
+        pages = max(1, (len(self.results) + PAGE_SIZE - 1) // PAGE_SIZE)
+        status = f"{len(self.results)} words, page {self.page + 1} of {pages}"
+        if self.search_index.is_building():
+            status += " (still indexing)"
+            # Searched again as more topics come in
+            if self.search_event is not None:
+                self.search_event.cancel()
+            self.search_event = Clock.schedule_once(lambda dt: self.run_search(self.page), 0.5)
+        self.status_label.text = status if self.search_input.text.strip() else ""
+        rows = []
+        # Only the words of this page are looked up
+        for entry in self.results[self.page * PAGE_SIZE:(self.page + 1) * PAGE_SIZE]:
+            word = self.search_index.entry(entry)
+            if word is not None:
+                topic, german, english = word
+                rows.append({'entry': entry, 'text': f"{german} - {', '.join(alternatives(english))}   [{topic}]",
+                             'select_callback': self.select_entry, 'background_color': (0.9, 0.9, 0.9, 1),
+                             'color': (0, 0, 0, 1)})
+        self.word_list.data = rows
+        self.word_list.scroll_y = 1
+        self.previous_button.disabled = self.page == 0
+        self.next_button.disabled = self.page >= pages - 1
+
+    def previous_page(self, instance):
+        self.page -= 1
+        self.show_page()
+
+    def next_page(self, instance):
+        self.page += 1
+        self.show_page()
+
+    def select_entry(self, entry):
+        word = self.search_index.entry(entry)
+        if word is None:
+            return
+        topic, german, english = word
+        self.selected = (topic, german)
+        self.selected_label.text = f"{german} [{topic}]"
+        self.english_input.text = ", ".join(alternatives(english))
+        self.save_button.disabled = self.delete_button.disabled = False
+        self.result_label.text = ""
+
+    def clear_selection(self):
+        self.selected = None
+        self.selected_label.text = ""
+        self.english_input.text = ""
+        self.save_button.disabled = self.delete_button.disabled = True
+
+    @traced()
+    def save_entry(self, instance):
+        if self.selected is None:
+            return
+        topic, german = self.selected
+        if not self.vocabulary.edit_word(topic, german, self.english_input.text):
+            self.result_label.text = "Please enter at least one translation."
+            return
+        self.result_label.text = f"Saved '{german}'."
+        self.run_search(self.page)
+
+    @traced()
+    def delete_entry(self, instance):
+        if self.selected is None:
+            return
+        topic, german = self.selected
+        self.vocabulary.delete_word(topic, german)
+        self.clear_selection()
+        self.result_label.text = f"Deleted '{german}' from {topic}."
+        self.run_search(self.page)
+
+    def switch_to_main(self, instance):
+        self.manager.current = 'main_screen'
+
+
+class StatisticsScreen(Screen):
+    # Accuracy, answer times and learning curve from the answer log
+    def __init__(self, answer_log, **kwargs):
+        super(StatisticsScreen, self).__init__(**kwargs)
+        self.answer_log = answer_log
+        self.directions = {"Both directions": None, "German to English": GE_TO_EN, "English to German": EN_TO_GE}
+
+        # Main layout with white background
+        self.layout = BoxLayout(orientation="vertical", size_hint=(1, 1), padding=dp(20), spacing=dp(10))
+        with self.layout.canvas.before:
+            Color(1, 1, 1, 1)
+            self.rect = Rectangle(size=self.layout.size, pos=self.layout.pos)
+        self.layout.bind(size=self.update_rect, pos=self.update_rect)
+
+        title_label = Label(text="Statistics", font_size=sp(24), color=(0, 0, 0, 1), size_hint=(1, 0.1))
+        self.layout.add_widget(title_label)
+
+        self.direction_spinner = Spinner(
+            text="Both directions",
+            values=list(self.directions),
+            size_hint=(1, 0.08),
+            font_size=sp(16)
+        )
+        self.direction_spinner.bind(text=lambda spinner, text: self.refresh())
+        self.layout.add_widget(self.direction_spinner)
+
+        # The report, scrollable when it is longer than the screen
+        scroll = ScrollView(size_hint=(1, 0.72))
+        self.report_label = Label(
+            text="",
+            color=(0, 0, 0, 1),
+            font_size=sp(15),
+            halign="left",
+            valign="top",
+            size_hint_y=None
+        )
+        self.report_label.bind(width=lambda label, width: setattr(label, 'text_size', (width, None)))
+        self.report_label.bind(texture_size=lambda label, size: setattr(label, 'height', size[1]))
+        scroll.add_widget(self.report_label)
+        self.layout.add_widget(scroll)
+
+        # Back button at the bottom
+        btn_back = Button(
+            text="Back to Main Menu",
+            background_color=(1, 1, 1, 1),
+            color=(0, 0, 0, 1),
+            size_hint=(1, 0.1),
+            font_size=sp(18)
+        )
+        btn_back.bind(on_press=self.switch_to_main)
+        self.layout.add_widget(btn_back)
+
+        self.add_widget(self.layout)
+
+    def update_rect(self, *args):
+        self.rect.pos = self.layout.pos
+        self.rect.size = self.layout.size
+
+    def on_pre_enter(self, *args):
+        self.refresh()
+
+    def refresh(self):
+        # The columns are copied here and aggregated on a worker thread, which
+        # takes a moment with millions of answers
+        self.report_label.text = "Computing..."
+        snapshot = self.answer_log.snapshot()
+        direction = self.directions[self.direction_spinner.text]
+        threading.Thread(target=self.compute, args=(snapshot, direction), daemon=True).start()
+
+    def compute(self, snapshot, direction):
+        with TRACER.span('statistics', 'stats', answers=len(snapshot[0]['time'])):
+            report = self.report(statistics(*snapshot, direction=direction))
+        Clock.schedule_once(lambda dt: setattr(self.report_label, 'text', report))
+
+    def report(self, stats):
+        count, accuracy, p50, p90 = stats.overall
+        if not count:
+            return "No answers yet."
+        lines = [f"{count} questions, {accuracy:.0%} right at the first try, "
+                 f"answered in {p50:.1f} s (median), 90% within {p90:.1f} s", "", "Topics:"]
+        topics = sorted(stats.topics.items(), key=lambda item: -item[1][0])
+        for topic, (count, accuracy, p50, p90) in topics[:15]:
+            if count:
+                lines.append(f"  {topic}: {accuracy:.0%} of {count}, median {p50:.1f} s, p90 {p90:.1f} s")
+        hardest = stats.hardest_words()
+        if hardest:
+            lines += ["", "Hardest words:"]
+            for (deck, key), (count, accuracy, _, _) in hardest:
+                lines.append(f"  {key} ({deck.partition(':')[2]}): {accuracy:.0%} of {int(count)}")
+        lines += ["", "Accuracy by how often a word was asked:"]
+        for repetition, (count, accuracy, _, _) in enumerate(stats.curve, 1):
+            if count:
+                label = f"{repetition}" if repetition < MAX_REPETITION else f"{repetition}+"
+                lines.append(f"  {label:>3}: {'#' * round(accuracy * 30):<30} {accuracy:.0%} of {count}")
+        return "\n".join(lines)
 
     def switch_to_main(self, instance):
         self.manager.current = 'main_screen'
 
 
 class TranslateGeToEnScreen(Screen):
-    def __init__(self, topics, **kwargs):
+    def __init__(self, engine, **kwargs):
         super(TranslateGeToEnScreen, self).__init__(**kwargs)
-        self.topics = topics
-        self.current_topic = None
+        # quiz.QuizEngine asking German words
+        self.engine = engine
+        self.loading_event = None
 
         self.layout = BoxLayout(orientation="vertical", padding=dp(20), spacing=dp(10))
 
@@ -488,44 +1162,56 @@ class TranslateGeToEnScreen(Screen):
 
         self.add_widget(self.layout)
 
-        self.current_value = ""
-        self.correct_key = ""
-
     def update_rect(self, *args):
         self.rect.pos = self.layout.pos
         self.rect.size = self.layout.size
 
+    @traced()
     def set_topic(self, topic):
-        self.current_topic = topic
+        self.engine.set_topic(topic)
         self.new_question()
 
     def on_enter(self, *args):
-        self.new_question()
-        if self.current_topic:
+        # set_topic already asked the first question
+        if self.engine.question is None:
             self.new_question()
 
     def new_question(self):
-        if self.current_topic:
-            translations = self.topics[self.current_topic]
-            self.correct_key = random.choice(list(translations.keys()))
-            self.current_value = translations[self.correct_key]
+        if self.engine.topic:
+            if not self.engine.is_ready():
+                ask_when_ready(self)
+                return
+            question = self.engine.new_question()
+            if question is None:
+                self.question_label.text = "This topic has no words yet!"
+                return
 
-            # Test: Print to console for debugging
-            print(f"Selected Word: {self.correct_key} - Translation: {self.current_value}")
+            log.debug('question', topic=self.engine.topic, word=question.key, answers=question.answers)
 
             # Setting the word to be translated
-            self.question_label.text = f"What is the English translation of '{self.correct_key}'?"
+            self.question_label.text = f"What is the English translation of '{question.prompt}'?"
             self.answer_input.text = ""
             self.result_label.text = ""
         else:
             self.question_label.text = "No topic selected!"
 
+    @traced()
     def check_answer(self, instance):
-        user_input = self.answer_input.text.strip()
+        question = self.engine.question
+        if question is None:
+            return
+        result = self.engine.check_answer(self.answer_input.text)
 
-        if user_input.lower() == self.current_value.lower():
+        if result.grade == EXACT:
+            self.schedule_new_question()
             self.result_label.text = "Correct!"
+        elif result.grade == CLOSE:
             self.schedule_new_question()
+            self.result_label.text = f"Almost! It is spelled '{', '.join(question.answers)}'."
+        elif result.hint is not None:
+            # The learner typed the translation of another word
+            english, german = result.hint
+            self.result_label.text = f"Incorrect, '{english}' is the translation of '{german}'. Try again."
         else:
             self.result_label.text = "Incorrect, try again."
 
@@ -534,11 +1220,14 @@ class TranslateGeToEnScreen(Screen):
 
     def switch_to_main(self, instance):
         self.manager.current = 'main_screen'
+
+
 class TranslateEnToGeScreen(Screen):
-    def __init__(self, topics, **kwargs):
+    def __init__(self, engine, **kwargs):
         super(TranslateEnToGeScreen, self).__init__(**kwargs)
-        self.topics = topics
-        self.current_topic = None
+        # quiz.QuizEngine asking English words
+        self.engine = engine
+        self.loading_event = None
 
         self.layout = BoxLayout(orientation="vertical")
 
@@ -566,68 +1255,352 @@ class TranslateEnToGeScreen(Screen):
 
         self.add_widget(self.layout)
 
-        self.current_value = ""
-        self.correct_key = ""
-
     def update_rect(self, *args):
         self.rect.pos = self.layout.pos
         self.rect.size = self.layout.size
 
+    @traced()
     def set_topic(self, topic):
-        self.current_topic = topic
+        self.engine.set_topic(topic)
         self.new_question()
 
     def on_enter(self, *args):
-        if self.current_topic:
+        # set_topic already asked the first question
+        if self.engine.topic and self.engine.question is None:
             self.new_question()
 
     def new_question(self):
-        translations = self.topics[self.current_topic]
-        self.current_value = random.choice(list(translations.values()))
-        self.correct_key = [key for key, value in translations.items() if value == self.current_value][0]
-        self.question_label.text = f"What is the German translation of '{self.current_value}'?"
+        if not self.engine.is_ready():
+            ask_when_ready(self)
+            return
+        question = self.engine.new_question()
+        if question is None:
+            self.question_label.text = "This topic has no words yet!"
+            return
+        self.question_label.text = f"What is the German translation of '{question.prompt}'?"
         self.answer_input.text = ""
         self.result_label.text = ""
 
+    @traced()
     def check_answer(self, instance):
-        user_input = self.answer_input.text.strip()
+        question = self.engine.question
+        if question is None:
+            return
+        result = self.engine.check_answer(self.answer_input.text)
 
-        if user_input.lower() == self.correct_key.lower():
+        if result.grade == EXACT:
+            self.schedule_new_question()
             self.result_label.text = "Correct!"
+        elif result.grade == CLOSE:
             self.schedule_new_question()
+            self.result_label.text = f"Almost! It is spelled '{', '.join(question.answers)}'."
+        elif result.hint is not None:
+            # The learner typed the German for another word
+            german, meaning = result.hint
+            self.result_label.text = f"Incorrect, '{german}' means '{meaning}'. Try again."
         else:
             self.result_label.text = "Incorrect, try again."
 
     def schedule_new_question(self):
-        self.result_label.text = "Correct!"
         self.answer_input.text = ""
         self.new_question()
 
     def switch_to_main(self, instance):
         self.manager.current = 'main_screen'
 
+class MultipleChoiceScreen(Screen):
+    # Either quiz direction, answered by picking one of engine.choices
+    # options instead of typing
+    def __init__(self, engine, **kwargs):
+        super(MultipleChoiceScreen, self).__init__(**kwargs)
+        # quiz.QuizEngine with choices set
+        self.engine = engine
+        self.loading_event = None
+        self.language = "English" if engine.direction == GE_TO_EN else "German"
+
+        self.layout = BoxLayout(orientation="vertical", padding=dp(20), spacing=dp(10))
+
+        with self.layout.canvas.before:
+            Color(1, 1, 1, 1)
+            self.rect = Rectangle(size=self.layout.size, pos=self.layout.pos)
+        self.layout.bind(size=self.update_rect, pos=self.update_rect)
+
+        # Label for the question
+        self.question_label = Label(
+            text="",
+            color=(0, 0, 0, 1),
+            font_size=sp(24),
+            halign="center",
+            size_hint=(1, 0.2)
+        )
+        self.layout.add_widget(self.question_label)
+
+        # One button per option, reused for every question
+        choice_layout = GridLayout(cols=2, spacing=dp(10), size_hint=(1, 0.4))
+        self.choice_buttons = []
+        for _ in range(engine.choices):
+            btn = Button(
+                text="",
+                background_color=(0.48, 0.78, 0.96, 1),
+                color=(1, 1, 1, 1),
+                font_size=sp(18)
+            )
+            btn.bind(on_press=self.check_answer)
+            choice_layout.add_widget(btn)
+            self.choice_buttons.append(btn)
+        self.layout.add_widget(choice_layout)
+
+        # Label for the result
+        self.result_label = Label(
+            text="",
+            color=(0, 0, 0, 1),
+            font_size=sp(18),
+            halign="center",
+            size_hint=(1, 0.2)
+        )
+        self.layout.add_widget(self.result_label)
+
+        # Back button to return to the main menu
+        btn_back = Button(
+            text="Back to Main Menu",
+            background_color=(1, 1, 1, 1),
+            color=(0, 0, 0, 1),
+            size_hint=(1, 0.2),
+            font_size=sp(18)
+        )
+        btn_back.bind(on_press=self.switch_to_main)
+        self.layout.add_widget(btn_back)
+
+        self.add_widget(self.layout)
+
+    def update_rect(self, *args):
+        self.rect.pos = self.layout.pos
+        self.rect.size = self.layout.size
+
+    @traced()
+    def set_topic(self, topic):
+        self.engine.set_topic(topic)
+        self.new_question()
+
+    def on_enter(self, *args):
+        # set_topic already asked the first question
+        if self.engine.topic and self.engine.question is None:
+            self.new_question()
+
+    def new_question(self):
+        if not self.engine.is_ready():
+            ask_when_ready(self)
+            self.show_choices([])
+            return
+        question = self.engine.new_question()
+        if question is None:
+            self.question_label.text = "This topic has no words yet!"
+            self.show_choices([])
+            return
+        self.question_label.text = f"What is the {self.language} translation of '{question.prompt}'?"
+        self.result_label.text = ""
+        self.show_choices(question.choices)
+
+    def show_choices(self, choices):
+        # Small topics may have fewer options than buttons
+        for i, btn in enumerate(self.choice_buttons):
+            btn.text = choices[i] if i < len(choices) else ""
+            btn.disabled = i >= len(choices)
+
+    @traced()
+    def check_answer(self, instance):
+        question = self.engine.question
+        if question is None:
+            return
+        result = self.engine.check_answer(instance.text)
+
+        if result.grade == WRONG:
+            # Options can be tried until the right one is found
+            instance.disabled = True
+            if result.hint is not None:
+                answer, word = result.hint
+                self.result_label.text = f"Incorrect, '{answer}' belongs to '{word}'. Try again."
+            else:
+                self.result_label.text = "Incorrect, try again."
+        else:
+            self.new_question()
+            self.result_label.text = "Correct!"
+
+    def switch_to_main(self, instance):
+        self.manager.current = 'main_screen'
+
+
+class DebugOverlay(Label):
+    # Rolling timings of the traced handlers over every screen; F12 hides it
+    def __init__(self, **kwargs):
+        super(DebugOverlay, self).__init__(
+            color=(0.8, 0, 0, 1),
+            font_size=sp(11),
+            halign='left',
+            size_hint=(None, None),
+            pos=(dp(4), dp(4)),
+            **kwargs
+        )
+        self.bind(texture_size=self.setter('size'))
+        Window.bind(on_key_down=self.on_key_down)
+        Clock.schedule_interval(self.refresh, 1)
+
+    def refresh(self, dt):
+        lines = [f"slow frames: {TRACER.slow_frames}"]
+        frames = TRACER.histograms.get('frame')
+        if frames is not None:
+            bounds = [f"<{bound}" for bound in BUCKETS] + [f">{BUCKETS[-1]}"]
+            lines.append("frame ms " + " ".join(f"{bound}:{count}" for bound, count in zip(bounds, frames.buckets()) if count))
+        # Slowest handlers first
+        summary = sorted(TRACER.summary().items(), key=lambda item: -item[1][2])
+        for name, (calls, p50, p95, worst) in summary[:8]:
+            lines.append(f"{name}: n={calls} p50={p50 * 1000:.1f} p95={p95 * 1000:.1f} max={worst * 1000:.1f} ms")
+        self.text = "\n".join(lines)
+
+    def on_key_down(self, window, key, *args):
+        if key == 293:  # F12
+            self.opacity = 0 if self.opacity else 1
+
+
 class TranslationApp(App):
+    def build_config(self, config):
+        # backend = json | sqlite | sharded (one file per topic, loaded on use)
+        # snapshot_cache: keep a binary copy of dictionary.json for fast starts
+        # compact_memory: hold the words in packed buffers (large decks)
+        config.setdefaults('storage', {'backend': 'json', 'database': 'dictionary.db', 'shards': 'dictionary_topics',
+                                       'snapshot_cache': 1, 'compact_memory': 0})
+        # Build the remaining screens in the background after the first frame
+        config.setdefaults('screens', {'warm_up': 1})
+        # Every answer is logged here, one file per column
+        config.setdefaults('stats', {'directory': 'answers'})
+        # Read-only vocabulary packs (*.pack) offered as extra topics
+        config.setdefaults('packs', {'directory': 'packs'})
+        # Ask every word of a topic once before repeating any of them
+        # mode = random | review (spaced repetition) | drill (weak words)
+        # max_typos: spelling mistakes still graded as close to right
+        # ignore_articles: accept "Ausflug" for "der Ausflug"
+        # prefetch: questions kept ready per topic and direction, 0 for none
+        # choices: options per question in multiple-choice mode, 0 to type
+        config.setdefaults('quiz', {'no_repeat': 1, 'mode': 'random', 'max_typos': 1, 'ignore_articles': 1,
+                                    'prefetch': 3, 'choices': 0})
+        # trace: time handlers, store operations and frames, and write them
+        # to trace_file (Chrome trace JSON) on exit; overlay shows them live
+        # log_level = debug | info | warning | error
+        config.setdefaults('debug', {'trace': 0, 'trace_file': 'trace.json', 'frame_budget_ms': 17, 'overlay': 0,
+                                     'log_level': 'warning'})
+
     def build(self):
         self.filename = 'dictionary.json'
-        self.topics = self.load_dictionary(self.filename)
-
-        sm = ScreenManager()
-
-        sm.add_widget(MainScreen(name='main_screen', topics=self.topics, save_callback=self.save_dictionary))
-        sm.add_widget(TopicSelectionScreen(name='topic_selection_screen', topics=self.topics, save_callback=self.save_dictionary))
-        sm.add_widget(NewWordScreen(name='new_word_screen', topics=self.topics, save_callback=self.save_dictionary))
-        sm.add_widget(TranslateGeToEnScreen(name='translate_ge_to_en_screen', topics=self.topics))
-        sm.add_widget(TranslateEnToGeScreen(name='translate_en_to_ge_screen', topics=self.topics))
-        sm.add_widget(TopicSelectionForTranslationScreen(name='topic_selection_for_ge_to_en_screen', topics=self.topics, target_screen='translate_ge_to_en_screen'))
-        sm.add_widget(TopicSelectionForTranslationScreen(name='topic_selection_for_en_to_ge_screen', topics=self.topics, target_screen='translate_en_to_ge_screen'))
+        configure_logging(self.config.get('debug', 'log_level'))
+        TRACER.enabled = bool(self.config.getint('debug', 'trace') or self.config.getint('debug', 'overlay'))
+        store = self.create_store()
+        # Review state is persisted next to the dictionary, journaled like it
+        self.review_store = JournalStore(os.path.splitext(self.filename)[0] + '.reviews.json')
+        if TRACER.enabled:
+            TRACER.frame_budget = self.config.getfloat('debug', 'frame_budget_ms') / 1000.0
+            Clock.schedule_interval(TRACER.frame, 0)
+            instrument(store, STORE_OPERATIONS)
+            instrument(self.review_store, STORE_OPERATIONS, prefix='ReviewStore')
+        if self.config.getint('debug', 'overlay'):
+            Window.add_widget(DebugOverlay())
+
+        answer_normalize = normalize if self.config.getint('quiz', 'ignore_articles') else normalize_keeping_articles
+        # Packs are rebuilt here if their keys were normalized differently
+        self.packs = open_packs(self.config.get('packs', 'directory'), answer_normalize)
+        self.vocabulary = VocabularyStore(
+            store,
+            shuffle_bag=self.config.getint('quiz', 'no_repeat'),
+            normalize=answer_normalize,
+            packs=self.packs
+        )
+        self.store = self.vocabulary.store
+        self.topics = self.vocabulary.topics
+        self.index = self.vocabulary.index
+        self.scheduler = ReviewScheduler(self.review_store.load(), on_review=self.save_review)
+        mode = self.config.get('quiz', 'mode')
+        max_typos = self.config.getint('quiz', 'max_typos')
+        # Also indexes the quizzed topics, so it runs even with prefetch = 0
+        self.prefetcher = QuestionPrefetcher(self.vocabulary.lock, self.config.getint('quiz', 'prefetch'))
+        self.vocabulary.listeners.append(self.prefetcher)
+        # Always ignores articles, so "die Ausflug" is caught as a duplicate
+        self.completer = WordCompleter(self.topics, lock=self.vocabulary.lock, index=self.index)
+        self.vocabulary.listeners.append(self.completer)
+        # Indexed one topic at a time once the browse screen is first shown
+        self.search_index = SearchIndex(self.topics, lock=self.vocabulary.lock)
+        self.vocabulary.listeners.append(self.search_index)
+        self.answer_log = AnswerLog(self.config.get('stats', 'directory'))
+        choices = self.config.getint('quiz', 'choices')
+        engines = {
+            direction: QuizEngine(self.index, self.scheduler, direction, mode, max_typos,
+                                  lock=self.vocabulary.lock, prefetcher=self.prefetcher, choices=choices,
+                                  answer_log=self.answer_log)
+            for direction in (GE_TO_EN, EN_TO_GE)
+        }
+        # Multiple choice replaces typing in both directions
+        ge_to_en_screen = MultipleChoiceScreen if choices else TranslateGeToEnScreen
+        en_to_ge_screen = MultipleChoiceScreen if choices else TranslateEnToGeScreen
+
+        sm = LazyScreenManager()
+
+        # Only the first screen is built before the first frame
+        sm.add_widget(MainScreen(name='main_screen', topics=self.topics))
+        sm.register('topic_selection_screen', partial(TopicSelectionScreen, topics=self.topics))
+        sm.register('new_word_screen', partial(NewWordScreen, vocabulary=self.vocabulary, completer=self.completer))
+        sm.register('translate_ge_to_en_screen', partial(ge_to_en_screen, engine=engines[GE_TO_EN]))
+        sm.register('translate_en_to_ge_screen', partial(en_to_ge_screen, engine=engines[EN_TO_GE]))
+        sm.register('import_screen', partial(ImportScreen, vocabulary=self.vocabulary))
+        sm.register('statistics_screen', partial(StatisticsScreen, answer_log=self.answer_log))
+        sm.register('browse_screen', partial(BrowseScreen, vocabulary=self.vocabulary, search_index=self.search_index))
+        sm.register('topic_selection_for_ge_to_en_screen', partial(TopicSelectionForTranslationScreen, topics=self.topics, target_screen='translate_ge_to_en_screen', packs=self.packs))
+        sm.register('topic_selection_for_en_to_ge_screen', partial(TopicSelectionForTranslationScreen, topics=self.topics, target_screen='translate_en_to_ge_screen', packs=self.packs))
+
+        if self.config.getint('screens', 'warm_up'):
+            Clock.schedule_once(sm.warm_up, 1)
 
         return sm
 
-    def load_dictionary(self, filename):
-        return load_dictionary(filename)
-
-    def save_dictionary(self, topics):
-        save_dictionary(topics, self.filename)
+    def create_store(self):
+        if self.config.get('storage', 'backend') == 'sqlite':
+            database = self.config.get('storage', 'database')
+            if not os.path.exists(database) and os.path.exists(self.filename):
+                # First start on the SQLite backend: bring the JSON words along
+                import_json(self.filename, database)
+            return SQLiteStore(database)
+        if self.config.get('storage', 'backend') == 'sharded':
+            shards = self.config.get('storage', 'shards')
+            if not os.path.exists(shards) and os.path.exists(self.filename):
+                # First start on the sharded backend: split the JSON words up
+                split_into_shards(self.filename, shards)
+            return ShardedStore(shards, on_saved=self.schedule_saved)
+        return JournalStore(self.filename, on_saved=self.schedule_saved,
+                            use_cache=self.config.getint('storage', 'snapshot_cache'),
+                            compact_memory=self.config.getint('storage', 'compact_memory'))
+
+    def save_review(self, deck, key, card):
+        self.review_store.append('edit', deck, key, card)
+        if self.review_store.needs_compaction():
+            self.review_store.compact(self.scheduler.cards)
+
+    def schedule_saved(self, error):
+        # Runs on the writer thread; hand the result over to the main thread
+        Clock.schedule_once(lambda dt: self.on_dictionary_saved(error))
+
+    def on_dictionary_saved(self, error):
+        if self.root.is_built('new_word_screen'):
+            self.root.get_screen('new_word_screen').show_save_result(error)
+
+    def on_stop(self):
+        # Flushes every pending write before the app goes away
+        self.prefetcher.close()
+        self.vocabulary.close()
+        self.review_store.close()
+        self.answer_log.close()
+        for pack in self.packs.values():
+            pack.close()
+        if self.config.getint('debug', 'trace'):
+            trace_file = self.config.get('debug', 'trace_file')
+            TRACER.export_chrome_trace(trace_file)
+            log.info('trace written', file=trace_file, events=len(TRACER.events))
 
 if __name__ == '__main__':
     TranslationApp().run()
\ No newline at end of file
@@ -0,0 +1,181 @@
+# Typo-tolerant answer checking.  Answers are graded as exact, close (within a
+# few typos) or wrong, and a BK-tree over a topic's answers tells whether a
+# wrong answer is the translation of a different word.
+
+EXACT = 'exact'
+CLOSE = 'close'
+WRONG = 'wrong'
+
+
+def bounded_distance(a, b, limit):
+    # Optimal string alignment distance (Levenshtein plus adjacent
+    # transpositions).  Only a band of width 2 * limit + 1 around the diagonal
+    # is computed, and the search gives up as soon as a whole row exceeds
+    # limit; anything over the limit is returned as limit + 1.
+    if a == b:
+        return 0
+    big = limit + 1
+
+    # A shared prefix or suffix never changes the distance
+    start = 0
+    shortest = min(len(a), len(b))
+    while start < shortest and a[start] == b[start]:
+        start += 1
+    end_a, end_b = len(a), len(b)
+    while end_a > start and end_b > start and a[end_a - 1] == b[end_b - 1]:
+        end_a -= 1
+        end_b -= 1
+    a, b = a[start:end_a], b[start:end_b]
+
+    if len(a) > len(b):
+        a, b = b, a
+    la, lb = len(a), len(b)
+    if lb - la > limit:
+        return big
+    if la == 0:
+        return lb
+
+    previous2 = None
+    previous = [j if j <= limit else big for j in range(lb + 1)]
+    for i in range(1, la + 1):
+        current = [big] * (lb + 1)
+        if i <= limit:
+            current[0] = i
+        best = current[0]
+        ca = a[i - 1]
+        for j in range(max(1, i - limit), min(lb, i + limit) + 1):
+            cb = b[j - 1]
+            value = previous[j - 1] + (ca != cb)
+            if previous[j] + 1 < value:
+                value = previous[j] + 1
+            if current[j - 1] + 1 < value:
+                value = current[j - 1] + 1
+            if i > 1 and j > 1 and ca == b[j - 2] and a[i - 2] == cb and previous2[j - 2] + 1 < value:
+                value = previous2[j - 2] + 1
+            current[j] = value
+            if value < best:
+                best = value
+        if best > limit:
+            return big
+        previous2, previous = previous, current
+    return min(previous[lb], big)
+
+
+def pattern_masks(pattern):
+    # Bit i of masks[c] is set where pattern[i] is c, for levenshtein()
+    masks = {}
+    for i, c in enumerate(pattern):
+        masks[c] = masks.get(c, 0) | (1 << i)
+    return masks
+
+
+def levenshtein(pattern, masks, text):
+    # Plain Levenshtein distance with Myers' bit-parallel algorithm: one
+    # column of the table per letter of text, kept as bit vectors over
+    # pattern, so a comparison costs a few integer operations per letter
+    # however far apart the strings are.  masks is pattern_masks(pattern),
+    # shared by every comparison with pattern.
+    m = len(pattern)
+    if not m:
+        return len(text)
+    full = (1 << m) - 1
+    top = 1 << (m - 1)
+    vp, vn = full, 0
+    score = m
+    for c in text:
+        pm = masks.get(c, 0)
+        d0 = ((((pm & vp) + vp) ^ vp) | pm | vn) & full
+        hp = vn | (~(d0 | vp) & full)
+        hn = d0 & vp
+        if hp & top:
+            score += 1
+        elif hn & top:
+            score -= 1
+        hp = ((hp << 1) | 1) & full
+        hn = (hn << 1) & full
+        vp = hn | (~(d0 | hp) & full)
+        vn = d0 & hp
+    return score
+
+
+def allowed_typos(answer, max_typos):
+    # Short words have to be spelled exactly; longer ones may have one typo
+    # per four letters, up to max_typos.
+    return min(max_typos, len(answer) // 4)
+
+
+def grade_answer(answer, accepted, max_typos=1):
+    # answer and accepted are already normalized; returns (grade, match)
+    if answer in accepted:
+        return EXACT, answer
+    for candidate in accepted:
+        limit = allowed_typos(candidate, max_typos)
+        if limit and bounded_distance(answer, candidate, limit) <= limit:
+            return CLOSE, candidate
+    return WRONG, None
+
+
+class BKTree(object):
+    # Burkhard-Keller tree keyed by edit distance.  Nodes are
+    # [normalized, [originals], {distance: child}]; only additions are
+    # supported, callers filter out entries that were deleted since.
+    #
+    # The pruning needs a metric, which the optimal string alignment
+    # distance answers are graded by is not: "ca" -> "ac" -> "abc" takes one
+    # edit each, "ca" -> "abc" three.  The tree is keyed by the Levenshtein
+    # distance instead, which counts a transposition as two edits, so every
+    # answer within limit of the query is within 2 * limit by Levenshtein;
+    # those candidates are then checked with bounded_distance().
+    def __init__(self, items=(), normalize=str.lower):
+        self.normalize = normalize
+        self.root = None
+        for item in items:
+            self.add(item)
+
+    def add(self, item, key=None):
+        # key is item normalized, when the caller already has it
+        key = self.normalize(item) if key is None else key
+        if self.root is None:
+            self.root = [key, [item], {}]
+            return
+        masks = pattern_masks(key)
+        current = self.root
+        while True:
+            distance = levenshtein(key, masks, current[0])
+            if distance == 0:
+                if item not in current[1]:
+                    current[1].append(item)
+                return
+            child = current[2].get(distance)
+            if child is None:
+                current[2][distance] = [key, [item], {}]
+                return
+            current = child
+
+    def search(self, query, limit):
+        # Originals within limit of the normalized query, closest first.
+        # With the distance d to a node, only its children at an edge within
+        # [d - radius, d + radius] can hold candidates.
+        found = []
+        radius = 2 * limit
+        stack = [self.root] if self.root is not None else []
+        masks = pattern_masks(query)
+        while stack:
+            node = stack.pop()
+            key, originals, children = node
+            if not children and abs(len(key) - len(query)) > limit:
+                # The lengths alone rule out a leaf
+                continue
+            distance = levenshtein(query, masks, key)
+            typos = distance
+            if limit < distance <= radius:
+                # Where a transposition counts once
+                typos = bounded_distance(query, key, limit)
+            if typos <= limit:
+                found.extend((typos, original) for original in originals)
+            for edge in range(max(1, distance - radius), distance + radius + 1):
+                child = children.get(edge)
+                if child is not None:
+                    stack.append(child)
+        found.sort(key=lambda match: match[0])
+        return [item for _, item in found]
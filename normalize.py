@@ -0,0 +1,42 @@
+import re
+import unicodedata
+
+# Normalized forms of German and English answers, so "der Löffel",
+# "Der  LOEFFEL" and "Löffel" all compare equal.  Every stored string is
+# normalized once, when it is loaded or inserted.  These are for grading;
+# whether two stored words are the same word is told by identity_key().
+
+ARTICLES = {
+    'der', 'die', 'das', 'den', 'dem', 'des',
+    'ein', 'eine', 'einen', 'einem', 'einer', 'eines',
+    'the', 'a', 'an', 'to',
+}
+
+# Applied after casefolding, which already turns ß into ss
+TRANSLITERATION = str.maketrans({'ä': 'ae', 'ö': 'oe', 'ü': 'ue'})
+
+WHITESPACE = re.compile(r'\s+')
+
+
+def normalize(text, strip_articles=True):
+    text = unicodedata.normalize('NFKC', text).casefold()
+    # Casefolding can decompose characters again (e.g. "İ")
+    text = unicodedata.normalize('NFC', text).translate(TRANSLITERATION)
+    text = WHITESPACE.sub(' ', text).strip()
+    if strip_articles:
+        article, _, rest = text.partition(' ')
+        if rest and article in ARTICLES:
+            text = rest
+    return text
+
+
+def normalize_keeping_articles(text):
+    return normalize(text, strip_articles=False)
+
+
+def identity_key(text):
+    # Stored words that only differ in case or spacing are the same word;
+    # the article always counts, as "der See" (lake) and "die See" (sea)
+    # are different words
+    text = unicodedata.normalize('NFKC', text).casefold()
+    return WHITESPACE.sub(' ', unicodedata.normalize('NFC', text)).strip()
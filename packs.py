@@ -0,0 +1,398 @@
+import argparse
+import bisect
+import mmap
+import os
+import random
+import struct
+import sys
+from array import array
+from collections.abc import Mapping
+
+from normalize import normalize, normalize_keeping_articles
+from tracing import get_logger
+from vocabulary import alternatives
+
+# Read-only vocabulary packs: large curated decks shipped next to the user's
+# dictionary.json.  A pack is memory-mapped, so its words are paged in on
+# demand and shared between processes instead of copied onto the heap, and
+# it is quizzed straight from the file without building a dict.
+#
+# Layout (little-endian, every section 4-byte aligned):
+#   header          magic, version, word count, English entry count, name size,
+#                   then from version 3 the normalizer of the keys
+#   name            UTF-8 topic name, padded
+#   word offsets    2 * words + 1 uint32: word i is data[o[2i]:o[2i+1]] in
+#                   German and data[o[2i+1]:o[2i+2]] in English, words sorted
+#                   by their German UTF-8 bytes (the sorted key index)
+#   English offsets entries + 1 uint32 into the English strings, sorted
+#   English words   entries uint32: the word each English entry belongs to
+#   German keys     words + 1 uint32 into the normalized German words, sorted
+#   German key words  words uint32: the word each German key belongs to
+#   English keys    entries + 1 uint32 into the normalized English entries, sorted
+#   English key entries  entries uint32: the English entry each key belongs to
+#   data            the strings, alternatives joined by SEPARATOR, then the keys
+#
+# Version 1 packs have no key sections; their wrong-answer hints only find
+# answers typed exactly as stored.  Version 2 keys are always normalized
+# with normalize().
+
+MAGIC = b'DGPACK\0\0'
+VERSION = 3
+HEADER = struct.Struct('<8sIIII')
+NORMALIZER = struct.Struct('<I')
+# The normalizers keys can be written with, numbered as in the header
+NORMALIZERS = [normalize, normalize_keeping_articles]
+SEPARATOR = '\x1f'
+EXTENSION = '.pack'
+
+log = get_logger('packs')
+
+
+def _padded(data):
+    return data + b'\0' * (-len(data) % 4)
+
+
+def write_pack(filename, name, words, normalize=normalize):
+    # words: german -> english (one string or a list of alternatives);
+    # normalize is one of NORMALIZERS
+    if normalize not in NORMALIZERS:
+        raise ValueError(f"packs cannot record the normalizer {normalize!r}")
+    entries = sorted((german.encode(), alternatives(english)) for german, english in words.items())
+    english_entries = sorted(
+        (english.encode(), number) for number, (_, translations) in enumerate(entries) for english in translations
+    )
+    # The answers normalized like the user's input, for the hints
+    german_keys = sorted((normalize(german.decode()).encode(), number) for number, (german, _) in enumerate(entries))
+    english_keys = sorted((normalize(english.decode()).encode(), i) for i, (english, _) in enumerate(english_entries))
+    name = _padded(name.encode())
+    header = HEADER.pack(MAGIC, VERSION, len(entries), len(english_entries), len(name))
+    header += NORMALIZER.pack(NORMALIZERS.index(normalize))
+
+    offsets = array('I')
+    english_offsets = array('I')
+    english_words = array('I', [number for _, number in english_entries])
+    german_key_offsets = array('I')
+    german_key_words = array('I', [number for _, number in german_keys])
+    english_key_offsets = array('I')
+    english_key_entries = array('I', [i for _, i in english_keys])
+    start = len(header) + len(name) + 4 * (2 * len(entries) + 1 + 2 * len(english_entries) + 1)
+    start += 4 * (2 * len(german_keys) + 1 + 2 * len(english_keys) + 1)
+    data = bytearray()
+    for german, translations in entries:
+        offsets.append(start + len(data))
+        data += german
+        offsets.append(start + len(data))
+        data += SEPARATOR.join(translations).encode()
+    offsets.append(start + len(data))
+    for english, _ in english_entries:
+        english_offsets.append(start + len(data))
+        data += english
+    english_offsets.append(start + len(data))
+    for keys, key_offsets in ((german_keys, german_key_offsets), (english_keys, english_key_offsets)):
+        for key, _ in keys:
+            key_offsets.append(start + len(data))
+            data += key
+        key_offsets.append(start + len(data))
+    tables = (offsets, english_offsets, english_words,
+              german_key_offsets, german_key_words, english_key_offsets, english_key_entries)
+    if sys.byteorder != 'little':
+        for table in tables:
+            table.byteswap()
+
+    tmp_filename = filename + '.tmp'
+    with open(tmp_filename, 'wb') as file:
+        file.write(header)
+        file.write(name)
+        for table in tables:
+            file.write(table.tobytes())
+        file.write(data)
+    os.replace(tmp_filename, filename)
+
+
+class VocabularyPack(Mapping):
+    # german -> english over a mapped pack file; lookups binary search the
+    # sorted key index and decode only the strings they touch.
+    def __init__(self, filename):
+        if sys.byteorder != 'little':
+            raise ValueError("vocabulary packs can only be read on little-endian machines")
+        with open(filename, 'rb') as file:
+            self._map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.word_count, self.english_count, name_size = HEADER.unpack_from(self._map)
+        if magic != MAGIC or not 1 <= version <= VERSION:
+            raise ValueError(f"{filename} is not a version {VERSION} vocabulary pack")
+        self.filename = filename
+        self.version = version
+        start = HEADER.size
+        # The normalizer of the key sections; None without them
+        self.normalize = None if version < 2 else normalize
+        if version >= 3:
+            self.normalize = NORMALIZERS[NORMALIZER.unpack_from(self._map, start)[0]]
+            start += NORMALIZER.size
+        self.name = bytes(self._map[start:start + name_size]).rstrip(b'\0').decode()
+        view = memoryview(self._map)
+        start += name_size
+        end = start + 4 * (2 * self.word_count + 1)
+        self._offsets = view[start:end].cast('I')
+        start, end = end, end + 4 * (self.english_count + 1)
+        self._english_offsets = view[start:end].cast('I')
+        start, end = end, end + 4 * self.english_count
+        self._english_words = view[start:end].cast('I')
+        self._views = [self._offsets, self._english_offsets, self._english_words]
+        if version >= 2:
+            for name, count in (('german', self.word_count), ('english', self.english_count)):
+                start, end = end, end + 4 * (count + 1)
+                key_offsets = view[start:end].cast('I')
+                start, end = end, end + 4 * count
+                key_positions = view[start:end].cast('I')
+                setattr(self, f'_{name}_keys', (key_offsets, key_positions))
+                self._views += [key_offsets, key_positions]
+
+    def german_at(self, i):
+        return self._map[self._offsets[2 * i]:self._offsets[2 * i + 1]].decode()
+
+    def english_at(self, i):
+        text = self._map[self._offsets[2 * i + 1]:self._offsets[2 * i + 2]].decode()
+        return text.split(SEPARATOR) if SEPARATOR in text else text
+
+    def english_entry(self, i):
+        return self._map[self._english_offsets[i]:self._english_offsets[i + 1]].decode()
+
+    def find(self, german):
+        # Position of german in the sorted key index, or -1
+        key = german.encode()
+        lo, hi = 0, self.word_count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._map[self._offsets[2 * mid]:self._offsets[2 * mid + 1]] < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < self.word_count and self._map[self._offsets[2 * lo]:self._offsets[2 * lo + 1]] == key:
+            return lo
+        return -1
+
+    def english_range(self, english):
+        # range of English entries equal to english
+        return self._range(self._english_offsets, english.encode())
+
+    def _range(self, offsets, key):
+        strings = _Strings(self, offsets)
+        return range(bisect.bisect_left(strings, key), bisect.bisect_right(strings, key))
+
+    def german_for(self, english):
+        return {self.german_at(self._english_words[i]) for i in self.english_range(english)}
+
+    def german_matching(self, key):
+        # German words whose normalized form is key
+        if self.version < 2:
+            return [key] if key in self else []
+        offsets, words = self._german_keys
+        return [self.german_at(words[i]) for i in self._range(offsets, key.encode())]
+
+    def english_matching(self, key):
+        # English answers whose normalized form is key
+        if self.version < 2:
+            return [key] if self.english_range(key) else []
+        offsets, entries = self._english_keys
+        # An answer shared by several words has an entry for each
+        return list(dict.fromkeys(self.english_entry(entries[i]) for i in self._range(offsets, key.encode())))
+
+    def __getitem__(self, german):
+        i = self.find(german)
+        if i < 0:
+            raise KeyError(german)
+        return self.english_at(i)
+
+    def __contains__(self, german):
+        return isinstance(german, str) and self.find(german) >= 0
+
+    def __iter__(self):
+        for i in range(self.word_count):
+            yield self.german_at(i)
+
+    def __len__(self):
+        return self.word_count
+
+    def close(self):
+        for view in self._views:
+            view.release()
+        self._map.close()
+
+
+class _Strings(object):
+    # Sequence of the strings between consecutive offsets as bytes, for bisect
+    def __init__(self, pack, offsets):
+        self.pack = pack
+        self.offsets = offsets
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        return self.pack._map[self.offsets[i]:self.offsets[i + 1]]
+
+
+class _EnglishSet(object):
+    # Membership test over a pack's English answers, for the scheduler
+    def __init__(self, pack):
+        self.pack = pack
+
+    def __contains__(self, english):
+        return bool(self.pack.english_range(english))
+
+    def __iter__(self):
+        previous = None
+        for i in range(self.pack.english_count):
+            english = self.pack.english_entry(i)
+            if english != previous:
+                yield english
+            previous = english
+
+
+class PackSampler(object):
+    # KeySampler over positions 0..count-1 of a pack.  The shuffle bag is a
+    # Fisher-Yates shuffle that only records the swapped positions, so a
+    # round costs memory in proportion to the draws, not to the pack.
+    def __init__(self, count, key_at, keys, shuffle_bag=True):
+        self.count = count
+        self.key_at = key_at
+        # Iterable and container of all keys, for the scheduler
+        self.keys = keys
+        self.positions = keys
+        self.shuffle_bag = shuffle_bag
+        self.remaining = count
+        self._swapped = {}
+        # Keys put back this round; they count as undrawn
+        self._returned = []
+        # Packs never change, so there is nothing to tell listeners
+        self.listeners = []
+
+    def __len__(self):
+        return self.count
+
+    def draw(self):
+        if not self.count:
+            return None
+        if not self.shuffle_bag:
+            return self.key_at(int(random.random() * self.count))
+
+        if self.remaining == 0 and not self._returned:
+            self.remaining = self.count
+            self._swapped.clear()
+        i = int(random.random() * (self.remaining + len(self._returned)))
+        if i >= self.remaining:
+            returned = self._returned
+            returned[i - self.remaining], returned[-1] = returned[-1], returned[i - self.remaining]
+            return returned.pop()
+        last = self.remaining - 1
+        picked = self._swapped.get(i, i)
+        self._swapped[i] = self._swapped.pop(last, last)
+        self.remaining = last
+        return self.key_at(picked)
+
+    def put_back(self, key):
+        # Like KeySampler.put_back; the pack's order is not tracked, so the
+        # key is kept aside until it is drawn again or the round ends
+        if self.shuffle_bag and self.remaining < self.count:
+            self._returned.append(key)
+
+
+class PackAnswers(object):
+    # Stands in for the BK-tree of answers: a pack only recognises answers
+    # that normalize exactly like the query, since fuzzy search would mean
+    # reading it all
+    def __init__(self, matching):
+        self.matching = matching
+
+    def search(self, query, limit):
+        return self.matching(query)
+
+
+class PackIndex(object):
+    # The read-only part of vocabulary.TopicIndex over a VocabularyPack
+    def __init__(self, pack, shuffle_bag=True, normalize=normalize):
+        self.normalize = normalize
+        self.words = pack
+        self.pack = pack
+        english = _EnglishSet(pack)
+        self.german_sampler = PackSampler(pack.word_count, pack.german_at, pack, shuffle_bag)
+        self.english_sampler = PackSampler(pack.english_count, pack.english_entry, english, shuffle_bag)
+        self._answer_trees = {'ge_to_en': PackAnswers(pack.english_matching),
+                              'en_to_ge': PackAnswers(pack.german_matching)}
+        if pack.normalize is not None and pack.normalize is not normalize:
+            # Keys normalized unlike the answers would give wrong hints
+            self._answer_trees = {}
+
+    def key(self, text):
+        return self.normalize(text)
+
+    def german_for(self, english):
+        return self.pack.german_for(english)
+
+    def accepted_english(self, german):
+        return frozenset(self.key(english) for english in alternatives(self.pack[german]))
+
+    def accepted_german(self, english):
+        return frozenset(self.key(german) for german in self.german_for(english))
+
+    def answer_tree(self, direction):
+        return self._answer_trees.get(direction)
+
+    def build_answer_tree(self, direction, lock):
+        # Packs are looked up in place; there is nothing to build
+        pass
+
+
+def rebuild_pack(pack, normalize):
+    # Writes pack again with its keys normalized by normalize; returns the
+    # reopened pack, which replaces the closed one
+    words = {pack.german_at(i): pack.english_at(i) for i in range(pack.word_count)}
+    pack.close()
+    write_pack(pack.filename, pack.name, words, normalize)
+    return VocabularyPack(pack.filename)
+
+
+def open_packs(directory, normalize=normalize):
+    # name -> VocabularyPack for every pack in directory.  Packs whose keys
+    # were normalized differently from the app's answers are rebuilt once;
+    # if that fails they are quizzed without wrong-answer hints.
+    packs = {}
+    if not os.path.isdir(directory):
+        return packs
+    for filename in sorted(os.listdir(directory)):
+        if filename.endswith(EXTENSION):
+            pack = VocabularyPack(os.path.join(directory, filename))
+            if pack.normalize is not None and pack.normalize is not normalize and normalize in NORMALIZERS:
+                try:
+                    pack = rebuild_pack(pack, normalize)
+                except OSError as e:
+                    log.warning('pack not rebuilt', pack=pack.filename, error=str(e))
+                    pack = VocabularyPack(pack.filename)
+            packs[pack.name] = pack
+    return packs
+
+
+if __name__ == '__main__':
+    from importer import read_rows
+
+    parser = argparse.ArgumentParser(description="Build a read-only vocabulary pack from a CSV, TSV or Anki export.")
+    parser.add_argument('deck', help="file with one German word and its translation(s) per row")
+    parser.add_argument('name', help="topic name the pack appears under")
+    parser.add_argument('pack', help="pack file to write, e.g. packs/frequency.pack")
+    parser.add_argument('--delimiter', help="column separator, guessed from the first row by default")
+    parser.add_argument('--reverse', action='store_true', help="the English column comes first")
+    parser.add_argument('--keep-articles', action='store_true',
+                        help="normalize the keys keeping articles, for apps with ignore_articles = 0")
+    args = parser.parse_args()
+
+    words = {}
+    with open(args.deck, 'r', encoding='utf-8-sig', newline='') as deck:
+        for row in read_rows(deck, args.delimiter, args.reverse):
+            if row is not None:
+                german, english = row
+                merged = words.setdefault(german, [])
+                merged.extend(e for e in english if e not in merged)
+    write_pack(args.pack, args.name, {german: english[0] if len(english) == 1 else english
+                                      for german, english in words.items()},
+               normalize_keeping_articles if args.keep_articles else normalize)
+    print(f"Wrote {len(words)} words to {args.pack}")
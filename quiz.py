@@ -0,0 +1,398 @@
+import queue
+import random
+import threading
+import time
+from collections import deque
+
+from distractors import DistractorIndex, candidate_keys
+from matching import EXACT, WRONG, grade_answer
+from normalize import normalize
+from scheduler import deck_name
+from tracing import get_logger
+from vocabulary import VocabularyIndex, alternatives, split_alternatives
+
+# The quiz without its user interface: asking and grading questions, and
+# adding words.  Nothing here imports Kivy, so the screens in main.py only
+# turn these results into text and a benchmark or a server can drive the
+# same code directly.
+
+GE_TO_EN = 'ge_to_en'
+EN_TO_GE = 'en_to_ge'
+
+log = get_logger('quiz')
+
+
+class Question(object):
+    __slots__ = ('key', 'prompt', 'answers', 'accepted', 'choices')
+
+    def __init__(self, key, prompt, answers, accepted, choices=None):
+        # The scheduled key: a German word, or an English one for en_to_ge
+        self.key = key
+        self.prompt = prompt
+        # Right answers as stored, for showing them
+        self.answers = answers
+        # Right answers normalized, for grading
+        self.accepted = accepted
+        # Options shown for a multiple-choice question, one of them right
+        self.choices = choices
+
+
+class Result(object):
+    __slots__ = ('grade', 'match', 'hint')
+
+    def __init__(self, grade, match=None, hint=None):
+        self.grade = grade
+        # The accepted answer that was matched
+        self.match = match
+        # For a wrong answer that belongs to another word: (answer, word),
+        # e.g. ("cat", "die Katze") or ("die Katze", "cat, kitty")
+        self.hint = hint
+
+
+class VocabularyStore(object):
+    # The words of every topic, their indexes and the store that persists
+    # them.  store is a storage.JournalStore, storage.ShardedStore or
+    # sqlite_store.SQLiteStore.
+    def __init__(self, store, shuffle_bag=True, normalize=normalize, packs=None):
+        self.store = store
+        self.topics = store.load()
+        self.index = VocabularyIndex(self.topics, shuffle_bag, normalize, packs)
+        # Held while the words, their indexes or the schedule are read or
+        # changed, since questions are also drawn on the prefetch thread
+        self.lock = threading.RLock()
+        # Objects with words_changed(topic, germans, englishes)
+        self.listeners = []
+
+    def add_words(self, topic, german_text, english_text):
+        # Both texts accept comma-separated alternatives.  Returns how many
+        # German words were added or given new translations, or None when
+        # either text is empty.
+        german_words = split_alternatives(german_text)
+        english_translations = split_alternatives(english_text)
+        if not german_words or not english_translations:
+            return None
+        changed = []
+        with self.lock:
+            topic_index = self.index.topic(topic)
+            for german in german_words:
+                # Near-duplicates such as "der ausflug" are merged into the
+                # stored "der Ausflug" instead of becoming a second entry
+                german = topic_index.entry_for(german) or german
+                change = topic_index.merge(german, english_translations)
+                if change is None:
+                    continue
+                op, value = change
+                self.save((op, topic, german, value))
+                changed.append(german)
+            if changed:
+                self.changed(topic, changed, english_translations)
+        return len(changed)
+
+    def edit_word(self, topic, german, english_text):
+        # Replaces the translations of a stored German word; returns False
+        # when english_text is empty
+        english_translations = split_alternatives(english_text)
+        if not english_translations:
+            return False
+        value = english_translations[0] if len(english_translations) == 1 else english_translations
+        with self.lock:
+            topic_index = self.index.topic(topic)
+            old = topic_index.words.get(german)
+            op = topic_index.set(german, value)
+            self.save((op, topic, german, value))
+            # Translations may have been dropped as well as added
+            englishes = alternatives(old) if old is not None else []
+            self.changed(topic, [german], list(dict.fromkeys(englishes + english_translations)))
+        return True
+
+    def delete_word(self, topic, german):
+        with self.lock:
+            topic_index = self.index.topic(topic)
+            english = topic_index.words[german]
+            topic_index.delete(german)
+            self.save(('delete', topic, german))
+            self.changed(topic, [german], alternatives(english))
+
+    def changed(self, topic, germans=None, englishes=None):
+        # Tells the listeners which words of topic changed; None for either
+        # means any of them may have
+        for listener in self.listeners:
+            listener.words_changed(topic, germans, englishes)
+
+    def save(self, change=None):
+        # Single changes only go to the journal; the full snapshot is
+        # rewritten in the background once enough of them piled up.
+        if change is None:
+            self.store.compact(self.topics)
+            return
+        self.store.append(*change)
+        if self.store.needs_compaction():
+            self.store.compact(self.topics)
+
+    def close(self):
+        # Flushes every pending write
+        self.store.close()
+
+
+class QuizEngine(object):
+    # One quiz direction over one topic at a time
+    def __init__(self, index, scheduler, direction, mode='random', max_typos=1, lock=None, prefetcher=None,
+                 choices=0, answer_log=None):
+        self.index = index
+        self.scheduler = scheduler
+        self.direction = direction
+        # random | review | drill
+        self.mode = mode
+        self.max_typos = max_typos
+        # VocabularyStore.lock when questions are prefetched
+        self.lock = lock if lock is not None else threading.RLock()
+        self.prefetcher = prefetcher
+        # Options per multiple-choice question; 0 to type the answer
+        self.choices = choices
+        # topic -> DistractorIndex, built on the first multiple-choice question
+        self.distractors = {}
+        # answerlog.AnswerLog recording every answer, if any
+        self.answer_log = answer_log
+        self.topic = None
+        self.deck = None
+        self.question = None
+        self.first_attempt = True
+        # When the current question was asked, and how often it was answered
+        self.asked_at = None
+        self.attempts = 0
+        # key -> value of answers when it was last answered, to tell which
+        # prefetched questions were drawn before that
+        self.answered = {}
+        self.answers = 0
+
+    def set_topic(self, topic):
+        # With a prefetcher, the topic is prepared on its thread and
+        # is_ready() tells when a question can be asked
+        self.topic = topic
+        self.deck = deck_name(self.direction, topic)
+        self.question = None
+        if self.prefetcher is not None:
+            self.prefetcher.request(self)
+        else:
+            self.prepare(topic)
+
+    def prepare(self, topic):
+        # Builds topic's index, about a second for 100,000 words, and the
+        # answer tree of this direction for the wrong-answer hints, several
+        # more; the tree is built without holding the lock
+        with self.lock:
+            topic_index = self.index.topic(topic)
+        topic_index.build_answer_tree(self.direction, self.lock)
+
+    def is_ready(self):
+        # Whether new_question() can ask without building the topic's index
+        return self.topic is None or self.index.is_built(self.topic)
+
+    def sampler(self, topic_index):
+        return topic_index.german_sampler if self.direction == GE_TO_EN else topic_index.english_sampler
+
+    def draw_key(self, deck, sampler):
+        if self.mode == 'review':
+            return self.scheduler.next_key(deck, sampler)
+        if self.mode == 'drill':
+            return self.scheduler.drill_key(deck, sampler)
+        return sampler.draw()
+
+    def draw_question(self, topic):
+        # A Question for topic, or None when it has no words.  Only draws
+        # it, so the prefetcher can call it ahead of time.
+        topic_index = self.index.topic(topic)
+        key = self.draw_key(deck_name(self.direction, topic), self.sampler(topic_index))
+        if key is None:
+            return None
+        if self.direction == GE_TO_EN:
+            question = Question(key, key, alternatives(topic_index.words[key]), topic_index.accepted_english(key))
+        else:
+            # Every German word with this translation is a right answer
+            question = Question(key, key, sorted(topic_index.german_for(key)), topic_index.accepted_german(key))
+        if self.choices:
+            question.choices = self.draw_choices(topic, topic_index, question)
+        return question
+
+    def distractor_index(self, topic, topic_index):
+        # The answers of the other direction's sampler are this one's options
+        distractors = self.distractors.get(topic)
+        if distractors is None:
+            sampler = topic_index.english_sampler if self.direction == GE_TO_EN else topic_index.german_sampler
+            distractors = self.distractors[topic] = DistractorIndex(candidate_keys(sampler), topic_index.key)
+            sampler.listeners.append(distractors)
+        return distractors
+
+    def draw_choices(self, topic, topic_index, question):
+        # One right answer and the wrong ones most similar to it, shuffled
+        answer = random.choice(question.answers)
+        wrong = self.distractor_index(topic, topic_index).similar(
+            topic_index.key(answer), self.choices - 1, question.accepted)
+        choices = wrong + [answer]
+        random.shuffle(choices)
+        return choices
+
+    def put_back(self, topic, question):
+        # A drawn question that will not be asked returns its word to the
+        # shuffle bag; the drill mode draws without one
+        if self.mode != 'drill':
+            self.sampler(self.index.topic(topic)).put_back(question.key)
+
+    def is_current(self, question, drawn_at):
+        # Whether a question drawn when answers was drawn_at can still be
+        # asked: its word must not have been answered or deleted since
+        if self.answered.get(question.key, -1) >= drawn_at:
+            return False
+        return question.key in self.sampler(self.index.topic(self.topic)).positions
+
+    def new_question(self):
+        # The next Question, or None when the topic has no words
+        self.first_attempt = True
+        question = self.prefetcher.pop(self) if self.prefetcher is not None else None
+        if question is None:
+            with self.lock:
+                question = self.draw_question(self.topic)
+        self.question = question
+        self.asked_at = time.perf_counter()
+        self.attempts = 0
+        return question
+
+    def record_answer(self, key, correct):
+        # Only the first try at a question counts for the schedule
+        if self.first_attempt:
+            with self.lock:
+                self.scheduler.review(self.deck, key, correct)
+                self.answered[key] = self.answers
+                self.answers += 1
+            self.first_attempt = False
+
+    def check_answer(self, text):
+        question = self.question
+        user_input = self.index.normalize(text)
+        if question.choices is not None:
+            # A picked option: the wrong ones were chosen to look like the
+            # right answer, so being close to it does not count
+            grade, match = (EXACT, user_input) if user_input in question.accepted else (WRONG, None)
+        else:
+            grade, match = grade_answer(user_input, question.accepted, self.max_typos)
+        self.record_answer(question.key, grade != WRONG)
+        self.attempts += 1
+        if self.answer_log is not None:
+            latency = time.perf_counter() - self.asked_at if self.asked_at is not None else 0.0
+            self.answer_log.record(self.deck, question.key, grade != WRONG, latency, self.attempts)
+        if grade == WRONG:
+            with self.lock:
+                return Result(grade, hint=self.wrong_answer_hint(user_input))
+        return Result(grade, match)
+
+    def wrong_answer_hint(self, user_input):
+        # Whether the learner typed the answer to another word; there is no
+        # hint until the answer tree is built
+        topic_index = self.index.topic(self.topic)
+        question = self.question
+        tree = topic_index.answer_tree(self.direction)
+        if tree is None:
+            return None
+        for answer in tree.search(user_input, self.max_typos):
+            if self.direction == GE_TO_EN:
+                germans = topic_index.german_for(answer)
+                if germans and question.key not in germans:
+                    return answer, min(germans)
+            elif answer in topic_index.words and answer not in question.answers:
+                return answer, ', '.join(alternatives(topic_index.words[answer]))
+        return None
+
+
+class QuestionPrefetcher(object):
+    # Prepares the topics of its engines and keeps a few questions ready per
+    # engine and topic, both on a worker thread, so asking the next one is a
+    # pop.  With a depth of 0 it only prepares the topics.  Registered as a listener on
+    # the VocabularyStore: questions about changed words are dropped, their
+    # words go back into the shuffle bag, and they are drawn again.  The
+    # lock is held for one question at a time, so new_question() never waits
+    # for more than one draw.
+    def __init__(self, lock, depth=3):
+        self.lock = lock
+        self.depth = depth
+        # (engine, topic) -> deque of (engine.answers when drawn, Question)
+        self.ready = {}
+        self._queue = queue.Queue()
+        self._worker = threading.Thread(target=self._run, daemon=True)
+        self._worker.start()
+
+    def request(self, engine):
+        # Top up engine's current topic in the background
+        self._queue.put((engine, engine.topic))
+
+    def pop(self, engine):
+        # A ready question for engine's topic that is still current, or None
+        with self.lock:
+            ready = self.ready.get((engine, engine.topic))
+            question = None
+            while ready and question is None:
+                drawn_at, candidate = ready.popleft()
+                if engine.is_current(candidate, drawn_at):
+                    question = candidate
+        self.request(engine)
+        return question
+
+    def words_changed(self, topic, germans=None, englishes=None):
+        # Drops the questions whose answers changed, or all of topic's when
+        # the change is not known word by word
+        with self.lock:
+            for (engine, name), ready in self.ready.items():
+                if name != topic:
+                    continue
+                if germans is None or englishes is None:
+                    dropped = list(ready)
+                    ready.clear()
+                else:
+                    changed = set(germans) if engine.direction == GE_TO_EN else set(englishes)
+                    dropped = [entry for entry in ready if entry[1].key in changed]
+                    kept = [entry for entry in ready if entry[1].key not in changed]
+                    ready.clear()
+                    ready.extend(kept)
+                for _, question in dropped:
+                    engine.put_back(name, question)
+                self._queue.put((engine, name))
+
+    def flush(self):
+        # Waits until every requested top-up is done
+        self._queue.join()
+
+    def close(self):
+        if self._worker is not None:
+            self._queue.put(None)
+            self._worker.join()
+            self._worker = None
+
+    def _run(self):
+        while True:
+            request = self._queue.get()
+            try:
+                if request is None:
+                    return
+                self._fill(*request)
+            except Exception:
+                # The worker keeps serving other requests; new_question()
+                # draws on the spot meanwhile
+                log.exception('prefetch failed', direction=request[0].direction, topic=request[1])
+            finally:
+                self._queue.task_done()
+
+    def _fill(self, engine, topic):
+        if topic is None:
+            return
+        while True:
+            with self.lock:
+                ready = self.ready.setdefault((engine, topic), deque())
+                if len(ready) >= self.depth:
+                    break
+                question = engine.draw_question(topic)
+                if question is None:
+                    break
+                ready.append((engine.answers, question))
+            # Lets a waiting new_question() take the lock between draws
+            time.sleep(0)
+        # Only needed for the first wrong answer, so the questions come first
+        engine.prepare(topic)
@@ -0,0 +1,274 @@
+import heapq
+import random
+import time
+
+# SM-2 style spaced repetition.  Review state is kept per deck, where a deck
+# is one topic quizzed in one direction ("ge_to_en:pabloWords"), as
+# {deck: {key: [interval_days, ease, due, repetitions, error_rate]}} so it
+# can be persisted with the same journal store as the dictionary.
+
+INTERVAL, EASE, DUE, REPETITIONS, ERROR_RATE = range(5)
+
+DAY = 24 * 60 * 60
+# A missed word comes back within the same session
+RELEARN_DELAY = 60
+MIN_EASE = 1.3
+START_EASE = 2.5
+# Intervals grow geometrically; without a cap they overflow a float
+MAX_INTERVAL = 100 * 365
+
+# Recent error rate, as an exponential moving average of missed answers
+ERROR_SMOOTHING = 0.3
+START_ERROR_RATE = 0.5
+# Even well known words keep a small chance of being drilled
+DRILL_FLOOR = 0.05
+
+
+def deck_name(direction, topic):
+    return f"{direction}:{topic}"
+
+
+class FenwickTree(object):
+    # Binary indexed tree over weights: point updates, prefix sums and
+    # weighted lookups all in O(log n).
+    def __init__(self, weights=()):
+        self.tree = [0.0] + list(weights)
+        n = len(self.tree)
+        for i in range(1, n):
+            parent = i + (i & -i)
+            if parent < n:
+                self.tree[parent] += self.tree[i]
+
+    def __len__(self):
+        return len(self.tree) - 1
+
+    def add(self, i, delta):
+        i += 1
+        while i < len(self.tree):
+            self.tree[i] += delta
+            i += i & -i
+
+    def prefix(self, i):
+        # Sum of the first i weights
+        total = 0.0
+        while i > 0:
+            total += self.tree[i]
+            i -= i & -i
+        return total
+
+    def total(self):
+        return self.prefix(len(self.tree) - 1)
+
+    def append(self, weight):
+        i = len(self.tree)
+        # The new node covers weights (i - lowbit(i), i]
+        self.tree.append(weight + self.prefix(i - 1) - self.prefix(i - (i & -i)))
+
+    def find(self, target):
+        # Index of the weight whose cumulative range contains target
+        i = 0
+        step = 1 << (len(self.tree) - 1).bit_length()
+        while step:
+            j = i + step
+            if j < len(self.tree) and self.tree[j] <= target:
+                target -= self.tree[j]
+                i = j
+            step >>= 1
+        return min(i, len(self.tree) - 2)
+
+
+class WeightedSampler(object):
+    # Draws keys with probability proportional to weight(key).  Registered as
+    # a listener on a vocabulary.KeySampler so it follows adds and deletes.
+    def __init__(self, keys, weight):
+        self.weight = weight
+        self.keys = list(keys)
+        self.positions = {key: i for i, key in enumerate(self.keys)}
+        self.weights = [weight(key) for key in self.keys]
+        self.tree = FenwickTree(self.weights)
+
+    def added(self, key):
+        if key in self.positions:
+            return
+        self.positions[key] = len(self.keys)
+        self.keys.append(key)
+        self.weights.append(self.weight(key))
+        self.tree.append(self.weights[-1])
+
+    def removed(self, key):
+        # Leaves a zero-weight hole; keys are never shifted until the holes
+        # outnumber the keys
+        i = self.positions.pop(key)
+        self.tree.add(i, -self.weights[i])
+        self.weights[i] = 0.0
+        self.keys[i] = None
+        if len(self.keys) - len(self.positions) > len(self.positions):
+            self._compact()
+
+    def _compact(self):
+        # Drops the holes and rebuilds the tree, which also clears the
+        # rounding error that subtracting weights leaves in its sums
+        live = [(key, weight) for key, weight in zip(self.keys, self.weights) if key is not None]
+        self.keys = [key for key, _ in live]
+        self.weights = [weight for _, weight in live]
+        self.positions = {key: i for i, key in enumerate(self.keys)}
+        self.tree = FenwickTree(self.weights)
+
+    def update(self, key):
+        i = self.positions.get(key)
+        if i is not None:
+            weight = self.weight(key)
+            self.tree.add(i, weight - self.weights[i])
+            self.weights[i] = weight
+
+    def draw(self):
+        if not self.positions:
+            return None
+        for _ in range(len(self.keys)):
+            key = self.keys[self.tree.find(random.random() * self.tree.total())]
+            # Rounding can land on the edge of a deleted key's empty range
+            if key is not None:
+                return key
+        # Only when every weight is zero
+        return random.choice(list(self.positions))
+
+
+class SparseWeightedSampler(object):
+    # WeightedSampler over keys key_at(0)..key_at(count - 1) where only the
+    # keys passed in, and those updated later, have a weight of their own
+    # and every other key has default.  Made for read-only packs: the keys
+    # stay in the mapped file and only the reviewed ones are held.
+    def __init__(self, count, key_at, keys, weight, default):
+        self.count = count
+        self.key_at = key_at
+        self.default = default
+        self.weighted = WeightedSampler(keys, weight)
+
+    def update(self, key):
+        if key in self.weighted.positions:
+            self.weighted.update(key)
+        else:
+            self.weighted.added(key)
+
+    def draw(self):
+        others = self.count - len(self.weighted.positions)
+        weighted = self.weighted.tree.total()
+        if others <= 0 or random.random() * (weighted + others * self.default) < weighted:
+            return self.weighted.draw()
+        # A uniform position, drawn again when it holds a weighted key; when
+        # nearly every key is weighted, those are drawn instead
+        for _ in range(32):
+            key = self.key_at(int(random.random() * self.count))
+            if key not in self.weighted.positions:
+                return key
+        return self.weighted.draw()
+
+
+class ReviewScheduler(object):
+    def __init__(self, cards=None, on_review=None):
+        self.cards = cards if cards is not None else {}
+        # Called with (deck, key, card) after every review, e.g. to persist it
+        self.on_review = on_review
+        # deck -> heap of (due, key); entries whose due no longer matches the
+        # card are stale and dropped when they reach the top
+        self._heaps = {}
+        # deck -> WeightedSampler or SparseWeightedSampler by recent error rate
+        self._drills = {}
+
+    def _heap(self, deck):
+        heap = self._heaps.get(deck)
+        if heap is None:
+            heap = [(card[DUE], key) for key, card in self.cards.get(deck, {}).items()]
+            heapq.heapify(heap)
+            self._heaps[deck] = heap
+        return heap
+
+    def _top(self, deck, valid):
+        heap = self._heap(deck)
+        cards = self.cards.get(deck, {})
+        while heap:
+            due, key = heap[0]
+            card = cards.get(key)
+            if card is not None and card[DUE] == due and key in valid:
+                return due, key
+            heapq.heappop(heap)
+            if card is not None and key not in valid:
+                # The word was deleted from the topic
+                del cards[key]
+        return None
+
+    def next_due(self, deck, valid, now=None):
+        now = time.time() if now is None else now
+        top = self._top(deck, valid)
+        if top is not None and top[0] <= now:
+            return top[1]
+        return None
+
+    def next_key(self, deck, sampler, now=None, new_attempts=5):
+        # Due words first, then words never reviewed, then the earliest due
+        # one so the learner can study ahead.
+        key = self.next_due(deck, sampler.positions, now)
+        if key is not None:
+            return key
+        cards = self.cards.get(deck, {})
+        for _ in range(new_attempts):
+            key = sampler.draw()
+            if key is None or key not in cards:
+                return key
+        top = self._top(deck, sampler.positions)
+        return top[1] if top is not None else sampler.draw()
+
+    def error_rate(self, deck, key):
+        card = self.cards.get(deck, {}).get(key)
+        if card is None or len(card) <= ERROR_RATE:
+            return START_ERROR_RATE
+        return card[ERROR_RATE]
+
+    def drill_key(self, deck, sampler):
+        # Weak words come up more often, in proportion to their error rate
+        drill = self._drills.get(deck)
+        if drill is None:
+            weight = lambda key: DRILL_FLOOR + self.error_rate(deck, key)
+            if hasattr(sampler, 'key_at'):
+                # A packs.PackSampler: only the reviewed keys are read
+                reviewed = [key for key in self.cards.get(deck, {}) if key in sampler.positions]
+                drill = SparseWeightedSampler(len(sampler), sampler.key_at, reviewed, weight,
+                                              DRILL_FLOOR + START_ERROR_RATE)
+            else:
+                drill = WeightedSampler(sampler.keys, weight)
+                sampler.listeners.append(drill)
+            self._drills[deck] = drill
+        return drill.draw()
+
+    def review(self, deck, key, correct, now=None):
+        now = time.time() if now is None else now
+        card = self.cards.setdefault(deck, {}).get(key)
+        if card is None:
+            card = [0, START_EASE, now, 0, START_ERROR_RATE]
+        elif len(card) <= ERROR_RATE:
+            card.append(START_ERROR_RATE)
+
+        quality = 4 if correct else 1
+        if correct:
+            if card[REPETITIONS] == 0:
+                card[INTERVAL] = 1
+            elif card[REPETITIONS] == 1:
+                card[INTERVAL] = 6
+            else:
+                card[INTERVAL] = min(round(card[INTERVAL] * card[EASE]), MAX_INTERVAL)
+            card[REPETITIONS] += 1
+            card[DUE] = now + card[INTERVAL] * DAY
+        else:
+            card[REPETITIONS] = 0
+            card[INTERVAL] = 0
+            card[DUE] = now + RELEARN_DELAY
+        card[EASE] = max(MIN_EASE, card[EASE] + 0.1 - (5 - quality) * (0.08 + (5 - quality) * 0.02))
+        card[ERROR_RATE] += ERROR_SMOOTHING * ((0.0 if correct else 1.0) - card[ERROR_RATE])
+
+        self.cards[deck][key] = card
+        heapq.heappush(self._heap(deck), (card[DUE], key))
+        if deck in self._drills:
+            self._drills[deck].update(key)
+        if self.on_review is not None:
+            self.on_review(deck, key, card)
+        return card
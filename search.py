@@ -0,0 +1,236 @@
+import bisect
+import re
+import threading
+from array import array
+
+from normalize import ARTICLES, normalize_keeping_articles
+from vocabulary import alternatives
+
+# Search over the words of every topic.  Each word is an entry with a
+# number; an inverted index maps every token (word of the normalized German
+# or English text) and every character trigram of those tokens to the
+# entries containing it.  A query term of three or more letters matches
+# anywhere inside a word, a shorter one only at the start of a word.  The
+# rarest term picks the candidates: the shortest posting list of its
+# trigrams, or the tokens starting with it from a sorted list of all
+# tokens.  The candidates are then checked against the entries' indexed
+# texts, never against the topics themselves.
+#
+# Posting lists only ever grow.  A changed word gets a new entry number and
+# its old one is marked dead, and dead numbers are filtered out of results
+# until they outweigh the live ones and everything is indexed again.
+
+TOKEN = re.compile(r'\w+')
+NGRAM = 3
+# Words indexed per hold of the lock while building
+CHUNK = 500
+
+
+def tokens(text):
+    # Words of a normalized text, without articles
+    return [token for token in TOKEN.findall(text) if token not in ARTICLES]
+
+
+def entry_text(german, english, normalize=normalize_keeping_articles):
+    # What a word is searched by: the tokens of the German word, then those
+    # of each translation on a line of its own
+    return '\n'.join(' '.join(tokens(normalize(text))) for text in [german] + alternatives(english))
+
+
+class SearchIndex(object):
+    def __init__(self, topics, lock=None, normalize=normalize_keeping_articles):
+        self.topics = topics
+        self.normalize = normalize
+        # VocabularyStore.lock, held while the topics are read
+        self.lock = lock if lock is not None else threading.RLock()
+        self._clear()
+        self._building = False
+        # Topics changed in bulk, indexed again by the background builder;
+        # searched as they were until then
+        self._stale = set()
+
+    def _clear(self):
+        # entry -> normalized text, or None once the word changed
+        self.texts = []
+        # entry -> (topic, german)
+        self.keys = []
+        # topic -> {german: entry}
+        self.topic_entries = {}
+        self.postings = {}
+        self.trigrams = {}
+        self.sorted_tokens = []
+        self.live = 0
+        # Topics read so far; changes to the others are picked up with them
+        self.indexed = set()
+
+    def __len__(self):
+        return self.live
+
+    def _add(self, topic, german, text):
+        entry = len(self.texts)
+        self.texts.append(text)
+        self.keys.append((topic, german))
+        self.topic_entries.setdefault(topic, {})[german] = entry
+        self.live += 1
+        words = set(tokens(text))
+        for token in words:
+            posting = self.postings.get(token)
+            if posting is None:
+                posting = self.postings[token] = array('I')
+                bisect.insort(self.sorted_tokens, token)
+            posting.append(entry)
+        for gram in {token[i:i + NGRAM] for token in words for i in range(len(token) - NGRAM + 1)}:
+            posting = self.trigrams.get(gram)
+            if posting is None:
+                posting = self.trigrams[gram] = array('I')
+            posting.append(entry)
+
+    def _forget(self, topic, german):
+        entry = self.topic_entries.get(topic, {}).pop(german, None)
+        if entry is not None:
+            self.texts[entry] = None
+            self.keys[entry] = None
+            self.live -= 1
+
+    def _index_word(self, topic, german):
+        words = self.topics[topic] if topic in self.topics else {}
+        english = words.get(german)
+        if english is None:
+            self._forget(topic, german)
+            return
+        text = entry_text(german, english, self.normalize)
+        entry = self.topic_entries.get(topic, {}).get(german)
+        if entry is not None and self.texts[entry] == text:
+            return
+        self._forget(topic, german)
+        self._add(topic, german, text)
+
+    def _index_topic(self, topic):
+        # Brings one topic up to date, a chunk of words per hold of the lock:
+        # only words whose text changed get a new entry.  Words changed
+        # meanwhile are indexed by words_changed.
+        with self.lock:
+            self._stale.discard(topic)
+            words = self.topics[topic] if topic in self.topics else {}
+            for german in [german for german in self.topic_entries.get(topic, {}) if german not in words]:
+                self._forget(topic, german)
+            germans = list(words)
+        for start in range(0, len(germans), CHUNK):
+            with self.lock:
+                for german in germans[start:start + CHUNK]:
+                    self._index_word(topic, german)
+        with self.lock:
+            self.indexed.add(topic)
+
+    def build(self):
+        # Indexes every topic not indexed yet, then the ones changed in bulk
+        # since, so quizzing and adding words never wait long for the lock.
+        try:
+            names = list(self.topics)
+            while True:
+                for topic in names:
+                    if topic not in self.indexed or topic in self._stale:
+                        self._index_topic(topic)
+                with self.lock:
+                    # Topics added while the others were read, and stale ones
+                    names = [topic for topic in self.topics if topic not in self.indexed]
+                    names.extend(self._stale)
+                    if not names:
+                        self._building = False
+                        return
+        finally:
+            self._building = False
+
+    def build_in_background(self):
+        # Started by the browse screen, so the topics are only all read,
+        # e.g. every shard loaded, once somebody searches, and again for
+        # topics changed in bulk.  Searches only cover what was indexed so
+        # far until it is done.
+        if not self._building and (not self.indexed or self._stale):
+            self._building = True
+            threading.Thread(target=self.build, daemon=True).start()
+
+    def is_building(self):
+        return self._building
+
+    def _compact(self):
+        dead = len(self.texts) - self.live
+        if dead > max(self.live, 1024):
+            # Rebuild without the dead entries
+            texts = [(topic, german, text) for (topic, german), text in zip(self.keys, self.texts) if text is not None]
+            indexed = self.indexed
+            self._clear()
+            self.indexed = indexed
+            for topic, german, text in texts:
+                self._add(topic, german, text)
+
+    def _candidates(self, term):
+        # Sorted entries that may contain term, a superset of the matches;
+        # may include dead entries
+        if len(term) < NGRAM:
+            found = set()
+            i = bisect.bisect_left(self.sorted_tokens, term)
+            while i < len(self.sorted_tokens) and self.sorted_tokens[i].startswith(term):
+                found.update(self.postings[self.sorted_tokens[i]])
+                i += 1
+            return sorted(found)
+        postings = [self.trigrams.get(term[i:i + NGRAM], ()) for i in range(len(term) - NGRAM + 1)]
+        return min(postings, key=len)
+
+    def _cost(self, term):
+        if len(term) < NGRAM:
+            # Short terms match many tokens; they only drive when alone
+            return len(self.texts) + NGRAM - len(term)
+        return min(len(self.trigrams.get(term[i:i + NGRAM], ())) for i in range(len(term) - NGRAM + 1))
+
+    def search(self, query, topic=None):
+        # Entries matching every term of query, in the order they were
+        # indexed; only from topic when it is given
+        normalized = self.normalize(query)
+        terms = set(tokens(normalized) or TOKEN.findall(normalized))
+        if not terms:
+            return []
+        with self.lock:
+            self._compact()
+            driver = min(terms, key=self._cost)
+            texts, keys = self.texts, self.keys
+            found = [entry for entry in self._candidates(driver) if texts[entry] is not None]
+            # The trigrams of a term can also occur apart, so every long term
+            # is checked, and short ones but the driver by their word starts
+            for term in terms:
+                if len(term) >= NGRAM:
+                    found = [entry for entry in found if term in texts[entry]]
+                elif term != driver:
+                    starts = re.compile(r'\b' + re.escape(term)).search
+                    found = [entry for entry in found if starts(texts[entry])]
+            if topic is not None:
+                found = [entry for entry in found if keys[entry][0] == topic]
+        if self._stale:
+            self.build_in_background()
+        return found
+
+    def entry(self, entry):
+        # (topic, german, english) of a search result, or None if it changed
+        with self.lock:
+            key = self.keys[entry] if entry < len(self.keys) else None
+            if key is None:
+                return None
+            topic, german = key
+            english = self.topics[topic].get(german)
+            return None if english is None else (topic, german, english)
+
+    def words_changed(self, topic, germans=None, englishes=None):
+        with self.lock:
+            if not self.indexed and not self._building:
+                # Nothing read yet; the build picks the change up
+                return
+            if germans is None:
+                self._stale.add(topic)
+            else:
+                for german in germans:
+                    self._index_word(topic, german)
+                if not self._building:
+                    # A topic added since the build gets every word this way
+                    self.indexed.add(topic)
+        if germans is None:
+            self.build_in_background()
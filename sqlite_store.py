@@ -0,0 +1,293 @@
+import argparse
+import json
+import sqlite3
+import threading
+from collections.abc import MutableMapping
+from contextlib import contextmanager, nullcontext
+
+from storage import JournalStore
+
+# Optional SQLite backend for the topics.  The screens keep using the usual
+# ``topics[topic][german]`` mapping API, but every topic reads its rows on
+# demand and every insert is a single-row transaction, so nothing is held in
+# memory beyond what the current screen looks at.
+#
+# A sqlite3 connection only works on the thread that opened it.  Threads
+# other than the one that loaded the topics, e.g. the question prefetcher,
+# read through a connection of their own, opened on first use.
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS topics (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS entries (
+    id INTEGER PRIMARY KEY,
+    topic_id INTEGER NOT NULL REFERENCES topics (id) ON DELETE CASCADE,
+    german TEXT NOT NULL,
+    english TEXT NOT NULL,
+    -- JSON list when several translations are accepted; english is then the first
+    alternatives TEXT,
+    UNIQUE (topic_id, german)
+);
+CREATE INDEX IF NOT EXISTS entries_by_english ON entries (topic_id, english);
+"""
+
+
+# PRAGMA user_version of the schema above
+SCHEMA_VERSION = 1
+
+
+def encode_value(english):
+    # The (english, alternatives) columns of a translation
+    if isinstance(english, list):
+        return english[0], json.dumps(english)
+    return english, None
+
+
+def decode_value(english, alternatives):
+    return json.loads(alternatives) if alternatives is not None else english
+
+
+def migrate(conn):
+    # Version 0 kept a list of translations as JSON in english, told apart
+    # from a single translation by its leading '["'
+    if conn.execute("PRAGMA user_version").fetchone()[0] >= SCHEMA_VERSION:
+        return
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(entries)")]
+    with conn:
+        if 'alternatives' not in columns:
+            conn.execute("ALTER TABLE entries ADD COLUMN alternatives TEXT")
+            rows = conn.execute("SELECT id, english FROM entries WHERE english LIKE '[\"%'").fetchall()
+            for entry_id, text in rows:
+                try:
+                    english = json.loads(text)
+                except ValueError:
+                    continue
+                if isinstance(english, list) and english:
+                    conn.execute("UPDATE entries SET english = ?, alternatives = ? WHERE id = ?",
+                                 encode_value(english) + (entry_id,))
+        conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+
+def connect(filename, check_same_thread=True):
+    conn = sqlite3.connect(filename, check_same_thread=check_same_thread)
+    conn.execute("PRAGMA foreign_keys = ON")
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.executescript(SCHEMA)
+    migrate(conn)
+    return conn
+
+
+class SQLiteTopic(MutableMapping):
+    def __init__(self, conn, topic_id, topics=None):
+        self._conn = conn
+        self.topic_id = topic_id
+        self.topics = topics
+
+    @property
+    def conn(self):
+        # The calling thread's connection when the topic belongs to topics
+        return self.topics.conn if self.topics is not None else self._conn
+
+    def _transaction(self):
+        # Inside SQLiteTopics.batch() the surrounding transaction commits
+        if self.topics is not None and self.topics.batching:
+            return nullcontext()
+        return self.conn
+
+    def __getitem__(self, german):
+        row = self.conn.execute(
+            "SELECT english, alternatives FROM entries WHERE topic_id = ? AND german = ?", (self.topic_id, german)
+        ).fetchone()
+        if row is None:
+            raise KeyError(german)
+        return decode_value(*row)
+
+    def __setitem__(self, german, english):
+        with self._transaction():
+            self.conn.execute(
+                "INSERT INTO entries (topic_id, german, english, alternatives) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (topic_id, german) DO UPDATE SET english = excluded.english, "
+                "alternatives = excluded.alternatives",
+                (self.topic_id, german) + encode_value(english)
+            )
+
+    def __delitem__(self, german):
+        with self._transaction():
+            cursor = self.conn.execute(
+                "DELETE FROM entries WHERE topic_id = ? AND german = ?", (self.topic_id, german)
+            )
+        if cursor.rowcount == 0:
+            raise KeyError(german)
+
+    def __contains__(self, german):
+        return self.conn.execute(
+            "SELECT 1 FROM entries WHERE topic_id = ? AND german = ?", (self.topic_id, german)
+        ).fetchone() is not None
+
+    def __iter__(self):
+        cursor = self.conn.execute("SELECT german FROM entries WHERE topic_id = ? ORDER BY id", (self.topic_id,))
+        return (row[0] for row in cursor)
+
+    def __len__(self):
+        return self.conn.execute("SELECT COUNT(*) FROM entries WHERE topic_id = ?", (self.topic_id,)).fetchone()[0]
+
+    # The Mapping mixins would issue one query per key; read the topic at once.
+    def items(self):
+        cursor = self.conn.execute(
+            "SELECT german, english, alternatives FROM entries WHERE topic_id = ? ORDER BY id", (self.topic_id,)
+        )
+        return [(german, decode_value(english, alternatives)) for german, english, alternatives in cursor]
+
+    def values(self):
+        return [english for _, english in self.items()]
+
+    def update(self, other=(), **kwargs):
+        pairs = other.items() if hasattr(other, 'items') else other
+        with self._transaction():
+            self.conn.executemany(
+                "INSERT INTO entries (topic_id, german, english, alternatives) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (topic_id, german) DO UPDATE SET english = excluded.english, "
+                "alternatives = excluded.alternatives",
+                ((self.topic_id, german) + encode_value(english)
+                 for german, english in list(pairs) + list(kwargs.items()))
+            )
+
+
+class SQLiteTopics(MutableMapping):
+    def __init__(self, conn, filename=None):
+        self._conn = conn
+        # Database other threads connect to; without it, or for an in-memory
+        # database, every thread uses conn
+        self.filename = filename if filename != ':memory:' else None
+        self._owner = threading.get_ident()
+        self._local = threading.local()
+        # Connections of other threads, closed with the store
+        self.connections = []
+        self.batching = False
+        self._topics = {}
+
+    @property
+    def conn(self):
+        if self.filename is None or threading.get_ident() == self._owner:
+            return self._conn
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            # Closed from the owner's thread by SQLiteStore.close()
+            conn = self._local.conn = connect(self.filename, check_same_thread=False)
+            self.connections.append(conn)
+        return conn
+
+    @contextmanager
+    def batch(self):
+        # Groups every write inside the block into one transaction
+        self.batching = True
+        try:
+            with self.conn:
+                yield
+        finally:
+            self.batching = False
+
+    def _topic_id(self, name):
+        row = self.conn.execute("SELECT id FROM topics WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else None
+
+    def __getitem__(self, name):
+        if name not in self._topics:
+            topic_id = self._topic_id(name)
+            if topic_id is None:
+                raise KeyError(name)
+            self._topics[name] = SQLiteTopic(self._conn, topic_id, self)
+        return self._topics[name]
+
+    def __setitem__(self, name, words):
+        with self.conn if not self.batching else nullcontext():
+            self.conn.execute("INSERT OR IGNORE INTO topics (name) VALUES (?)", (name,))
+        topic = self[name]
+        topic.update(words)
+
+    def __delitem__(self, name):
+        with self.conn:
+            cursor = self.conn.execute("DELETE FROM topics WHERE name = ?", (name,))
+        if cursor.rowcount == 0:
+            raise KeyError(name)
+        self._topics.pop(name, None)
+
+    def __contains__(self, name):
+        return name in self._topics or self._topic_id(name) is not None
+
+    def __iter__(self):
+        return (row[0] for row in self.conn.execute("SELECT name FROM topics ORDER BY id"))
+
+    def __len__(self):
+        return self.conn.execute("SELECT COUNT(*) FROM topics").fetchone()[0]
+
+    def setdefault(self, name, default=None):
+        if name not in self:
+            self[name] = default or {}
+        return self[name]
+
+
+class SQLiteStore(object):
+    # Same interface as storage.JournalStore.  Rows are written by the
+    # mapping itself, so there is no journal to append to or compact.
+    def __init__(self, filename):
+        self.filename = filename
+        self.conn = None
+        self.topics = None
+
+    def load(self):
+        if self.conn is None:
+            self.conn = connect(self.filename)
+            self.topics = SQLiteTopics(self.conn, self.filename)
+        return self.topics
+
+    def batch(self):
+        return self.topics.batch()
+
+    def append(self, op, topic, key=None, value=None):
+        pass
+
+    def needs_compaction(self):
+        return False
+
+    def compact(self, topics, background=True):
+        pass
+
+    def flush(self):
+        pass
+
+    def close(self):
+        if self.conn is not None:
+            for conn in self.topics.connections:
+                conn.close()
+            self.conn.close()
+            self.conn = None
+
+
+def import_json(json_filename, db_filename):
+    # The snapshot with its journal replayed, so words added or edited since
+    # it was last compacted come along
+    topics = JournalStore(json_filename).load()
+
+    conn = connect(db_filename)
+    count = 0
+    try:
+        target = SQLiteTopics(conn)
+        for name, words in topics.items():
+            target[name] = words
+            count += len(words)
+    finally:
+        conn.close()
+    return count
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Import a dictionary.json file into a SQLite vocabulary database.")
+    parser.add_argument('json_file', nargs='?', default='dictionary.json')
+    parser.add_argument('db_file', nargs='?', default='dictionary.db')
+    args = parser.parse_args()
+
+    imported = import_json(args.json_file, args.db_file)
+    print(f"Imported {imported} words into {args.db_file}")
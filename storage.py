@@ -0,0 +1,517 @@
+import hashlib
+import json
+import marshal
+import os
+import queue
+import sys
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections.abc import MutableMapping
+from contextlib import contextmanager
+
+from compact import load_compact_json
+from tracing import get_logger
+
+# The vocabulary lives in a JSON snapshot (dictionary.json) plus an
+# append-only journal next to it (dictionary.json.journal).  Every add, edit
+# or delete is written as one JSON line, so the cost of a write depends on the
+# size of the change.  All writes go through one background writer thread,
+# which coalesces bursts of edits into a single write and from time to time
+# folds the journal back into the snapshot.
+
+log = get_logger('storage')
+
+
+def load_json(filename):
+    try:
+        with open(filename, 'r') as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return {}
+
+
+def atomic_write_json(data, filename):
+    # Write next to the target, fsync and rename, so a crash never leaves a
+    # half-written file behind.
+    tmp_filename = filename + '.tmp'
+    with open(tmp_filename, 'w') as file:
+        json.dump(data, file)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(tmp_filename, filename)
+    if hasattr(os, 'O_DIRECTORY'):
+        # Make the rename itself durable
+        fd = os.open(os.path.dirname(os.path.abspath(filename)), os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+
+# Binary snapshot cache: a marshal copy of dictionary.json with interned
+# strings, valid while the JSON file has the recorded mtime, size and hash.
+CACHE_VERSION = 1
+# Version 4 shares repeated objects but tracks every one it loads, which makes
+# reading about twice as slow; interned strings are enough
+MARSHAL_VERSION = 2
+
+
+def cache_filename(filename):
+    return filename + '.cache'
+
+
+def file_digest(filename):
+    digest = hashlib.blake2b(digest_size=16)
+    with open(filename, 'rb') as file:
+        for chunk in iter(lambda: file.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.digest()
+
+
+def cache_header(filename):
+    stat = os.stat(filename)
+    return (CACHE_VERSION, sys.implementation.cache_tag, stat.st_mtime_ns, stat.st_size, file_digest(filename))
+
+
+def intern_topics(topics):
+    # marshal keeps interned strings interned, so the words loaded from the
+    # cache share memory with the same strings used elsewhere
+    intern = sys.intern
+    interned = {}
+    for topic, words in topics.items():
+        interned[intern(topic)] = {
+            intern(german): [intern(e) for e in english] if isinstance(english, list) else intern(english)
+            for german, english in words.items()
+        }
+    return interned
+
+
+def write_snapshot_cache(topics, filename, header=None):
+    # topics must not change while this runs, so pass a private copy when
+    # calling from a background thread.  header describes the JSON file the
+    # topics were read from; it defaults to the file as it is now.
+    if header is None:
+        header = cache_header(filename)
+    # The header is a separate object so a stale cache is rejected before
+    # the words are decoded
+    header = marshal.dumps(header)
+    # The load-time and the writer threads may both be regenerating it
+    tmp_filename = f"{cache_filename(filename)}.{threading.get_ident()}.tmp"
+    with open(tmp_filename, 'wb') as file:
+        file.write(len(header).to_bytes(4, 'little'))
+        file.write(header)
+        file.write(marshal.dumps(intern_topics(topics), MARSHAL_VERSION))
+    os.replace(tmp_filename, cache_filename(filename))
+
+
+def load_snapshot(filename, use_cache=True):
+    # dictionary.json through its binary cache when that is still fresh
+    if not use_cache:
+        return load_json(filename)
+    try:
+        header = cache_header(filename)
+    except FileNotFoundError:
+        return {}
+    try:
+        # marshal.load() on a file reads it in small pieces; one read and
+        # loads() is several times faster
+        with open(cache_filename(filename), 'rb') as file:
+            size = int.from_bytes(file.read(4), 'little')
+            if marshal.loads(file.read(size)) == header:
+                return marshal.loads(file.read())
+    except (OSError, EOFError, ValueError, TypeError):
+        pass
+
+    topics = load_json(filename)
+    # marshal runs without releasing the GIL, so this copy cannot race with
+    # the main thread editing the words
+    data = marshal.dumps(topics)
+    threading.Thread(target=_write_cache_from_marshal, args=(data, filename, header), daemon=True).start()
+    return topics
+
+
+def _write_cache_from_marshal(data, filename, header):
+    try:
+        write_snapshot_cache(marshal.loads(data), filename, header)
+    except OSError:
+        pass
+
+
+def apply_change(topics, record):
+    op = record['op']
+    topic = record['topic']
+    if op in ('add', 'edit'):
+        topics.setdefault(topic, {})[record['key']] = record['value']
+    elif op == 'delete':
+        topics.get(topic, {}).pop(record['key'], None)
+    elif op == 'add_topic':
+        topics.setdefault(topic, {})
+    elif op == 'delete_topic':
+        topics.pop(topic, None)
+    else:
+        raise ValueError(f"Unknown journal operation: {op}")
+
+
+def replay_journal(topics, filename):
+    # Replaying is idempotent (the last record for a word wins), so a journal
+    # that was already folded into the snapshot can safely be replayed again.
+    count = 0
+    try:
+        with open(filename, 'r') as file:
+            for line in file:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # A crash in the middle of an append leaves a truncated
+                    # line behind; the records around it are still good.
+                    continue
+                apply_change(topics, record)
+                count += 1
+    except FileNotFoundError:
+        pass
+    return count
+
+
+# Seconds before a batch that failed with an OSError is written again
+RETRY_DELAY = 1.0
+
+
+class BackgroundWriter(ABC):
+    # One writer thread per store.  Jobs are queued by the main thread; each
+    # burst of them is handed to _write_batch in one go.
+    def __init__(self, coalesce_delay=0.05, on_saved=None):
+        self.coalesce_delay = coalesce_delay
+        # Called from the writer thread after every batch, with the error or None
+        self.on_saved = on_saved
+        self._queue = queue.Queue()
+        self._worker = None
+        # The OSError of the batch held for a retry; None once it is written
+        self._error = None
+
+    def flush(self):
+        # Waits for the queued jobs; raises the OSError of a batch that is
+        # still held for a retry, so its changes are not on disk yet
+        if self._worker is not None:
+            self._queue.join()
+            error = self._error
+            if error is not None:
+                raise error
+
+    def close(self):
+        if self._worker is not None:
+            self._queue.put(None)
+            self._worker.join()
+            self._worker = None
+
+    def _submit(self, job):
+        if self._worker is None:
+            self._worker = threading.Thread(target=self._run, daemon=True)
+            self._worker.start()
+        self._queue.put(job)
+
+    def _run(self):
+        # Jobs of a batch that failed with an OSError, e.g. on a full disk,
+        # are written again with the next batch, or after RETRY_DELAY
+        failed = []
+        running = True
+        while running:
+            try:
+                jobs = [self._queue.get(timeout=RETRY_DELAY if failed else None)]
+            except queue.Empty:
+                jobs = []
+            # Give a burst of edits a moment to arrive so it ends up in one write
+            time.sleep(self.coalesce_delay)
+            while True:
+                try:
+                    jobs.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            if None in jobs:
+                running = False
+            batch = failed + [job for job in jobs if job is not None]
+            error = None
+            try:
+                self._write_batch(batch)
+                failed = []
+            except OSError as e:
+                error = e
+                failed = batch
+            except Exception as e:
+                # Anything else, e.g. a value json cannot encode, would fail
+                # the same way again; the batch is dropped so later ones are
+                # still written and flush() and close() return
+                log.exception('batch dropped', store=type(self).__name__, jobs=len(batch))
+                error = e
+                failed = []
+            finally:
+                # Set before the jobs are done, so flush() sees it
+                self._error = error if failed else None
+                for _ in jobs:
+                    self._queue.task_done()
+            if self.on_saved is not None:
+                self.on_saved(error)
+        if failed:
+            # The retry on close failed too, and nothing retries it any more
+            log.error('unwritten changes lost', store=type(self).__name__, jobs=len(failed), error=str(self._error))
+        self._stopped()
+
+    @abstractmethod
+    def _write_batch(self, jobs):
+        # Writes a list of jobs on the writer thread
+        pass
+
+    def _stopped(self):
+        pass
+
+
+class JournalStore(BackgroundWriter):
+    def __init__(self, filename, compact_after=1000, coalesce_delay=0.05, on_saved=None, use_cache=False,
+                 compact_memory=False):
+        super(JournalStore, self).__init__(coalesce_delay, on_saved)
+        self.filename = filename
+        self.use_cache = use_cache
+        # Load the words into compact.CompactTopics instead of plain dicts
+        self.compact_memory = compact_memory
+        self.journal_filename = filename + '.journal'
+        # Left behind by older versions that rotated the journal while compacting
+        self.rotated_filename = filename + '.journal.1'
+        self.compact_after = compact_after
+        self.pending = 0
+        self._journal = None
+        # Records collected inside batch(), written as one job
+        self._batch = None
+
+    def load(self):
+        if self.compact_memory:
+            topics = load_compact_json(self.filename)
+        else:
+            topics = load_snapshot(self.filename, self.use_cache)
+        self.pending = replay_journal(topics, self.rotated_filename)
+        self.pending += replay_journal(topics, self.journal_filename)
+        return topics
+
+    def append(self, op, topic, key=None, value=None):
+        record = {'op': op, 'topic': topic}
+        if key is not None:
+            record['key'] = key
+        if value is not None:
+            record['value'] = value
+        line = json.dumps(record) + '\n'
+        if self._batch is not None:
+            self._batch.append(line)
+        else:
+            self._submit(('append', line))
+        self.pending += 1
+
+    @contextmanager
+    def batch(self):
+        # Every append inside the block reaches the writer as a single job
+        self._batch = []
+        try:
+            yield
+        finally:
+            lines, self._batch = self._batch, None
+            if lines:
+                self._submit(('append', ''.join(lines)))
+
+    def needs_compaction(self):
+        return self.pending >= self.compact_after
+
+    def compact(self, topics, background=True):
+        # Copy on the calling thread so the writer never sees the dict change
+        # size under it.  The copy already contains every queued record.
+        snapshot = {topic: dict(words) for topic, words in topics.items()}
+        self.pending = 0
+        self._submit(('snapshot', snapshot))
+        if not background:
+            self.flush()
+
+    def _stopped(self):
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+
+    def _write_batch(self, jobs):
+        snapshot = None
+        lines = []
+        for kind, payload in jobs:
+            if kind == 'snapshot':
+                # Only the latest snapshot matters, and it already covers every
+                # record queued before it.
+                snapshot = payload
+                lines = []
+            else:
+                lines.append(payload)
+
+        if snapshot is not None:
+            self._write_snapshot(snapshot)
+        if lines:
+            if self._journal is None:
+                self._journal = self._open_journal()
+            self._journal.write(''.join(lines))
+            self._journal.flush()
+            os.fsync(self._journal.fileno())
+
+    def _open_journal(self):
+        journal = open(self.journal_filename, 'a+')
+        if journal.tell() > 0:
+            journal.seek(journal.tell() - 1)
+            if journal.read(1) != '\n':
+                # Terminate a torn record so the next one starts on its own line
+                journal.write('\n')
+        return journal
+
+    def _write_snapshot(self, snapshot):
+        atomic_write_json(snapshot, self.filename)
+        if self.use_cache:
+            # snapshot is the writer's private copy
+            write_snapshot_cache(snapshot, self.filename)
+        # A crash before this point replays the old journal on top of the new
+        # snapshot, which is harmless.
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+        for filename in (self.journal_filename, self.rotated_filename):
+            try:
+                os.remove(filename)
+            except FileNotFoundError:
+                pass
+
+
+class ShardedTopics(MutableMapping):
+    # Topic name -> words, where each topic's words are only read from its
+    # shard file the first time the topic is used.  Names and word counts
+    # come from the manifest.
+    def __init__(self, directory, manifest):
+        self.directory = directory
+        self.manifest = manifest
+        self._loaded = {}
+        # Shard files of deleted topics, removed with the next manifest
+        self.dropped = set()
+
+    def count(self, name):
+        if name in self._loaded:
+            return len(self._loaded[name])
+        return self.manifest[name]['count']
+
+    def is_loaded(self, name):
+        return name in self._loaded
+
+    def __getitem__(self, name):
+        words = self._loaded.get(name)
+        if words is None:
+            entry = self.manifest[name]
+            words = self._loaded[name] = load_json(os.path.join(self.directory, entry['file']))
+        return words
+
+    def __setitem__(self, name, words):
+        if name not in self.manifest:
+            used = {entry['file'] for entry in self.manifest.values()}
+            number = len(self.manifest)
+            while f"{number:04d}.json" in used:
+                number += 1
+            self.manifest[name] = {'file': f"{number:04d}.json", 'count': len(words)}
+            self.dropped.discard(self.manifest[name]['file'])
+        self._loaded[name] = dict(words)
+
+    def __delitem__(self, name):
+        self.dropped.add(self.manifest.pop(name)['file'])
+        self._loaded.pop(name, None)
+
+    def __contains__(self, name):
+        return name in self.manifest
+
+    def __iter__(self):
+        return iter(self.manifest)
+
+    def __len__(self):
+        return len(self.manifest)
+
+
+class ShardedStore(BackgroundWriter):
+    # One JSON shard per topic plus a small manifest.json with names, shard
+    # files and counts.  A change rewrites only its topic's shard.
+    def __init__(self, directory, coalesce_delay=0.05, on_saved=None):
+        super(ShardedStore, self).__init__(coalesce_delay, on_saved)
+        self.directory = directory
+        self.manifest_filename = os.path.join(directory, 'manifest.json')
+        self.topics = None
+        # Topics changed inside batch(), saved when it ends
+        self._dirty = None
+
+    def load(self):
+        manifest = load_json(self.manifest_filename)
+        self.topics = ShardedTopics(self.directory, manifest.get('topics', {}))
+        return self.topics
+
+    def append(self, op, topic, key=None, value=None):
+        # The words were already changed in memory; schedule the shard
+        if self._dirty is not None:
+            self._dirty.add(topic)
+        else:
+            self._save_topics([topic])
+
+    @contextmanager
+    def batch(self):
+        self._dirty = set()
+        try:
+            yield
+        finally:
+            dirty, self._dirty = self._dirty, None
+            self._save_topics(dirty)
+
+    def _save_topics(self, names):
+        shards = {}
+        for name in names:
+            if name in self.topics:
+                entry = self.topics.manifest[name]
+                # Copy on the calling thread; the writer only sees copies
+                words = dict(self.topics[name])
+                entry['count'] = len(words)
+                shards[entry['file']] = words
+        manifest = {'topics': {name: dict(entry) for name, entry in self.topics.manifest.items()}}
+        dropped, self.topics.dropped = self.topics.dropped, set()
+        self._submit((shards, manifest, dropped))
+
+    def needs_compaction(self):
+        return False
+
+    def compact(self, topics, background=True):
+        # Nothing to fold; just wait for the queue when asked to
+        if not background:
+            self.flush()
+
+    def _write_batch(self, jobs):
+        shards = {}
+        manifest = None
+        dropped = set()
+        for job_shards, job_manifest, job_dropped in jobs:
+            # Later copies of a shard replace earlier ones
+            shards.update(job_shards)
+            manifest = job_manifest
+            dropped |= job_dropped
+        os.makedirs(self.directory, exist_ok=True)
+        for filename, words in shards.items():
+            atomic_write_json(words, os.path.join(self.directory, filename))
+        if manifest is not None:
+            atomic_write_json(manifest, self.manifest_filename)
+            # Shards of deleted topics, unless a new topic took the file over;
+            # nothing else in the directory is touched
+            kept = {entry['file'] for entry in manifest['topics'].values()}
+            for filename in dropped - kept:
+                try:
+                    os.remove(os.path.join(self.directory, filename))
+                except FileNotFoundError:
+                    pass
+
+
+def split_into_shards(filename, directory):
+    # One-off conversion of a dictionary.json (and its journal) to shards
+    store = ShardedStore(directory, coalesce_delay=0)
+    topics = store.load()
+    for name, words in JournalStore(filename).load().items():
+        topics[name] = words
+    store._save_topics(list(topics))
+    store.close()
@@ -0,0 +1,72 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from answerlog import AnswerLog
+
+# The column files of answerlog.py and their recovery after a crash.
+#
+#   python -m unittest test_answerlog
+
+
+class AnswerLogTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        log = AnswerLog(self.directory, chunk=2)
+        log.record('ge_to_en:Tiere', 'der Hund', True, 1.5, now=100.0)
+        log.record('en_to_ge:Tiere', 'dog', False, 3.0, now=101.0)
+        log.record('ge_to_en:Essen', 'die Gabel', True, 2.0, attempt=2, now=102.0)
+        log.close()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def path(self, name):
+        return os.path.join(self.directory, name)
+
+    def cut(self, name, size):
+        with open(self.path(name), 'r+b') as file:
+            file.truncate(size)
+
+    def test_reloads_the_answers(self):
+        log = AnswerLog(self.directory)
+        self.assertEqual(len(log), 3)
+        self.assertEqual(log.words, [['ge_to_en:Tiere', 'der Hund'], ['en_to_ge:Tiere', 'dog'],
+                                     ['ge_to_en:Essen', 'die Gabel']])
+        self.assertEqual(list(log.columns['correct']), [1, 0, 1])
+        self.assertEqual(log.topics, ['Tiere', 'Essen'])
+
+    def test_partly_written_chunk_is_dropped(self):
+        # The crash hit while the last answer's columns were written
+        self.cut('time.col', 2 * 8 + 3)
+        self.cut('latency.col', 2 * 4)
+        log = AnswerLog(self.directory)
+        self.assertEqual(len(log), 2)
+        self.assertTrue(all(len(column) == 2 for column in log.columns.values()))
+        self.assertEqual(os.path.getsize(self.path('word.col')), 2 * 4)
+        # Recording goes on from the recovered state
+        log.record('ge_to_en:Tiere', 'der Hund', False, 1.0, now=103.0)
+        log.close()
+        self.assertEqual(list(AnswerLog(self.directory).columns['time']), [100.0, 101.0, 103.0])
+
+    def test_cut_word_line_drops_its_answers(self):
+        with open(self.path('words.jsonl'), 'rb') as file:
+            data = file.read()
+        self.cut('words.jsonl', len(data) - 5)
+        log = AnswerLog(self.directory)
+        self.assertEqual(len(log.words), 2)
+        # The answer to the lost word goes with it
+        self.assertEqual(len(log), 2)
+        with open(self.path('words.jsonl'), 'rb') as file:
+            self.assertTrue(file.read().endswith(b'\n'))
+
+    def test_statistics(self):
+        statistics = AnswerLog(self.directory).statistics()
+        # Only first attempts count
+        self.assertEqual(statistics.overall[0], 2)
+        self.assertEqual(statistics.overall[1], 0.5)
+
+
+if __name__ == '__main__':
+    unittest.main()
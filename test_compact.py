@@ -0,0 +1,79 @@
+import json
+import os
+import random
+import shutil
+import tempfile
+import unittest
+
+from compact import CompactTopic, CompactTopics, load_compact_json
+
+# The memory-compact topics of compact.py, checked against plain dicts.
+#
+#   python -m unittest test_compact
+
+
+class CompactTopicTest(unittest.TestCase):
+    def check(self, topic, words):
+        self.assertEqual(len(topic), len(words))
+        self.assertEqual(list(topic), list(words))
+        self.assertEqual(dict(topic.items()), words)
+        for german, english in words.items():
+            self.assertIn(german, topic)
+            self.assertEqual(topic[german], english)
+
+    def test_articles_and_alternatives(self):
+        words = {'der Hund': 'dog', 'die Gabel': ['fork', 'prong'], 'der': 'the', 'Eine Katze': 'a cat', '': 'none'}
+        self.check(CompactTopic(words), words)
+
+    def test_matches_a_dict_through_random_changes(self):
+        # Enough adds and deletes to grow the table, reuse REMOVED slots and
+        # compact the buffer several times
+        rng = random.Random(4)
+        topic = CompactTopic({'der Anfang': 'start'})
+        words = {'der Anfang': 'start'}
+        for step in range(5000):
+            german = f"{rng.choice(['der ', 'die ', 'das ', ''])}Wort{rng.randrange(300)}"
+            if rng.random() < 0.4 and german in words:
+                del topic[german]
+                del words[german]
+                self.assertNotIn(german, topic)
+            else:
+                english = [f"word {step}", 'term'] if rng.random() < 0.2 else f"word {step}"
+                topic[german] = english
+                words[german] = english
+        self.check(topic, words)
+        with self.assertRaises(KeyError):
+            del topic['nicht da']
+        with self.assertRaises(KeyError):
+            topic['nicht da']
+
+    def test_compact_keeps_the_words(self):
+        topic = CompactTopic({f"das Wort{i}": f"word {i}" for i in range(100)})
+        for i in range(0, 100, 2):
+            topic[f"das Wort{i}"] = f"new word {i}"
+        size = topic.nbytes()
+        topic.compact()
+        self.assertLess(topic.nbytes(), size)
+        self.check(topic, {f"das Wort{i}": f"new word {i}" if i % 2 == 0 else f"word {i}" for i in range(100)})
+
+
+class LoadCompactJsonTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.filename = os.path.join(self.directory, 'dictionary.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_loads_like_json(self):
+        topics = {'Tiere': {'der Hund': 'dog', 'die "Katze"': ['cat', 'kitty\n']}, 'Leer': {}, 'Ü': {'ß': 'é'}}
+        with open(self.filename, 'w') as file:
+            json.dump(topics, file, indent=1)
+        loaded = load_compact_json(self.filename)
+        self.assertIsInstance(loaded, CompactTopics)
+        self.assertIsInstance(loaded['Tiere'], CompactTopic)
+        self.assertEqual({name: dict(words.items()) for name, words in loaded.items()}, topics)
+
+
+if __name__ == '__main__':
+    unittest.main()
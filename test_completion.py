@@ -0,0 +1,71 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from completion import ENGLISH, GERMAN, WordCompleter
+from quiz import VocabularyStore
+from storage import JournalStore
+
+# Suggestions and duplicate warnings of completion.py, kept up to date as
+# words change.
+#
+#   python -m unittest test_completion
+
+
+class WordCompleterTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        store = JournalStore(os.path.join(self.directory, 'dictionary.json'), coalesce_delay=0)
+        store.compact({'Essen': {'der Löffel': 'spoon', 'die Gabel': ['fork', 'prong']},
+                       'Tiere': {'der Hund': 'dog', 'die Gans': 'goose'}}, background=False)
+        self.vocabulary = VocabularyStore(store)
+        self.completer = WordCompleter(self.vocabulary.topics, lock=self.vocabulary.lock,
+                                       index=self.vocabulary.index)
+        self.vocabulary.listeners.append(self.completer)
+        # Built on this thread, so the lookups below never race the builder
+        self.completer.build()
+
+    def tearDown(self):
+        self.vocabulary.close()
+        shutil.rmtree(self.directory)
+
+    def suggest(self, topic, language, text):
+        return self.completer.suggest(topic, language, text)
+
+    def test_suggestions_prefer_the_topic(self):
+        self.assertEqual(self.suggest('Tiere', GERMAN, 'ga'), [('die Gans', 'Tiere'), ('die Gabel', 'Essen')])
+        self.assertEqual(self.completer.existing(GERMAN, 'hund'), [('der Hund', 'Tiere')])
+
+    def test_added_word(self):
+        self.vocabulary.add_words('Tiere', 'der Fuchs', 'fox')
+        self.assertEqual(self.suggest('Tiere', ENGLISH, 'fo'), [('fox', 'Tiere'), ('fork', 'Essen')])
+
+    def test_edited_translations(self):
+        self.vocabulary.edit_word('Essen', 'die Gabel', 'fork, tine')
+        self.assertEqual(self.suggest('Essen', ENGLISH, 'pro'), [])
+        self.assertEqual(self.suggest('Essen', ENGLISH, 'ti'), [('tine', 'Essen')])
+        self.assertEqual(self.suggest('Essen', ENGLISH, 'fo'), [('fork', 'Essen')])
+
+    def test_deleted_word(self):
+        self.vocabulary.delete_word('Tiere', 'der Hund')
+        self.assertEqual(self.completer.existing(GERMAN, 'hund'), [])
+        self.assertEqual(self.completer.existing(ENGLISH, 'dog'), [])
+
+    def test_shared_translation_survives_a_delete(self):
+        self.vocabulary.add_words('Essen', 'der Esslöffel', 'spoon')
+        self.vocabulary.delete_word('Essen', 'der Löffel')
+        self.assertEqual(self.completer.existing(ENGLISH, 'spoon'), [('spoon', 'Essen')])
+
+    def test_bulk_change_is_rebuilt_off_the_lookup(self):
+        self.vocabulary.topics['Tiere']['die Katze'] = 'cat'
+        self.vocabulary.changed('Tiere')
+        # Rebuilt on a thread of its own
+        while self.completer._building:
+            time.sleep(0.01)
+        self.assertEqual(self.suggest('Tiere', GERMAN, 'kat'), [('die Katze', 'Tiere')])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+import random
+import unittest
+
+from benchmark import generate_dictionary
+from matching import CLOSE, EXACT, WRONG, BKTree, bounded_distance, grade_answer
+from normalize import normalize
+
+# The typo-tolerant matching in matching.py.
+#
+#   python -m unittest test_matching
+
+LETTERS = 'abcdefghijklmnopqrstuvwxyz '
+
+
+def typo(rng, word):
+    # word with one random deletion, insertion, substitution or transposition
+    i = rng.randrange(len(word))
+    kind = rng.randrange(4)
+    if kind == 0:
+        return word[:i] + word[i + 1:]
+    if kind == 1:
+        return word[:i] + rng.choice(LETTERS) + word[i:]
+    if kind == 2:
+        return word[:i] + rng.choice(LETTERS) + word[i + 1:]
+    return word[:i] + word[i + 1:i + 2] + word[i] + word[i + 2:]
+
+
+class BKTreeTest(unittest.TestCase):
+    def brute_force(self, items, query, limit):
+        return {item for item in items if bounded_distance(query, normalize(item), limit) <= limit}
+
+    def test_transposition_is_not_pruned(self):
+        # "ac" is one transposition from "ca" and one insertion from "abc",
+        # which are three edits apart
+        tree = BKTree(['ca', 'abc'], normalize=lambda text: text)
+        self.assertEqual(sorted(tree.search('ac', 1)), ['abc', 'ca'])
+
+    def test_search_matches_brute_force(self):
+        rng = random.Random(5)
+        words = generate_dictionary(1000, topics=1, seed=5)['topic0000']
+        items = list(words) + sorted({english for value in words.values()
+                                      for english in (value if isinstance(value, list) else [value])})
+        tree = BKTree(items, normalize=normalize)
+        for limit in (1, 2):
+            for _ in range(200):
+                query = normalize(rng.choice(items))
+                for _ in range(rng.randint(0, limit + 1)):
+                    query = typo(rng, query) or query
+                self.assertEqual(set(tree.search(query, limit)), self.brute_force(items, query, limit), query)
+
+    def test_every_original_of_a_key_is_found(self):
+        tree = BKTree(['der Hund', 'Der  Hund', 'die Katze'], normalize=normalize)
+        self.assertEqual(sorted(tree.search('hund', 0)), ['Der  Hund', 'der Hund'])
+
+    def test_closest_first(self):
+        tree = BKTree(['kitten', 'kitty', 'mitten'], normalize=normalize)
+        self.assertEqual(tree.search('kitty', 2)[0], 'kitty')
+
+
+class GradeAnswerTest(unittest.TestCase):
+    def test_grades(self):
+        accepted = frozenset(['spoon', 'ladle'])
+        self.assertEqual(grade_answer('spoon', accepted), (EXACT, 'spoon'))
+        self.assertEqual(grade_answer('sopon', accepted), (CLOSE, 'spoon'))
+        self.assertEqual(grade_answer('spoons', accepted, max_typos=1), (CLOSE, 'spoon'))
+        self.assertEqual(grade_answer('fork', accepted), (WRONG, None))
+
+    def test_short_words_must_be_exact(self):
+        self.assertEqual(grade_answer('cta', frozenset(['cat'])), (WRONG, None))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,99 @@
+import os
+import random
+import shutil
+import tempfile
+import unittest
+
+from normalize import normalize, normalize_keeping_articles
+from packs import PackIndex, VocabularyPack, open_packs, write_pack
+from quiz import GE_TO_EN
+from scheduler import ReviewScheduler, SparseWeightedSampler, deck_name
+
+# The read-only vocabulary packs of packs.py.
+#
+#   python -m unittest test_packs
+
+WORDS = {'der See': 'lake', 'die See': 'sea', 'der Hund': 'dog', 'die Katze': ['cat', 'kitty']}
+
+
+class PackTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.filename = os.path.join(self.directory, 'natur.pack')
+        self.packs = {}
+
+    def tearDown(self):
+        for pack in self.packs.values():
+            pack.close()
+        shutil.rmtree(self.directory)
+
+    def test_normalizer_is_recorded(self):
+        write_pack(self.filename, 'Natur', WORDS, normalize_keeping_articles)
+        self.packs = {'Natur': VocabularyPack(self.filename)}
+        self.assertIs(self.packs['Natur'].normalize, normalize_keeping_articles)
+        self.assertEqual(self.packs['Natur']['die Katze'], ['cat', 'kitty'])
+
+    def test_mismatched_pack_is_rebuilt(self):
+        write_pack(self.filename, 'Natur', WORDS)
+        self.packs = open_packs(self.directory, normalize_keeping_articles)
+        pack = self.packs['Natur']
+        self.assertIs(pack.normalize, normalize_keeping_articles)
+        self.assertEqual(dict(pack.items()), WORDS)
+        # The articles tell the two words apart in the hints now
+        index = PackIndex(pack, normalize=normalize_keeping_articles)
+        self.assertEqual(index.answer_tree('en_to_ge').search('die see', 1), ['die See'])
+
+    def test_matching_pack_is_kept(self):
+        write_pack(self.filename, 'Natur', WORDS)
+        modified = os.stat(self.filename).st_mtime_ns
+        self.packs = open_packs(self.directory, normalize)
+        self.assertEqual(os.stat(self.filename).st_mtime_ns, modified)
+
+    def test_no_hints_from_mismatched_keys(self):
+        write_pack(self.filename, 'Natur', WORDS)
+        self.packs = {'Natur': VocabularyPack(self.filename)}
+        index = PackIndex(self.packs['Natur'], normalize=normalize_keeping_articles)
+        self.assertIsNone(index.answer_tree('en_to_ge'))
+
+
+class PackDrillTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        filename = os.path.join(self.directory, 'natur.pack')
+        write_pack(filename, 'Natur', {f"das Wort{i:03d}": f"word {i}" for i in range(200)})
+        self.pack = VocabularyPack(filename)
+        self.index = PackIndex(self.pack)
+        random.seed(7)
+
+    def tearDown(self):
+        self.pack.close()
+        shutil.rmtree(self.directory)
+
+    def test_drill_favours_missed_words(self):
+        scheduler = ReviewScheduler()
+        deck = deck_name(GE_TO_EN, 'Natur')
+        for _ in range(5):
+            scheduler.review(deck, 'das Wort007', False)
+        for i in range(100):
+            scheduler.review(deck, f"das Wort{i + 100:03d}", True)
+        sampler = self.index.german_sampler
+        drawn = [scheduler.drill_key(deck, sampler) for _ in range(20000)]
+        self.assertIsInstance(scheduler._drills[deck], SparseWeightedSampler)
+        # Only the reviewed words are held, not the pack's
+        self.assertEqual(len(scheduler._drills[deck].weighted.keys), 101)
+        self.assertTrue(all(key in self.pack for key in drawn))
+        # Weights of about 0.97 for the missed word, 0.55 for the others
+        # and 0.4 for the known ones
+        self.assertGreater(drawn.count('das Wort007'), drawn.count('das Wort050') * 1.3)
+        self.assertLess(drawn.count('das Wort150'), drawn.count('das Wort050'))
+
+    def test_reviews_reach_the_drill(self):
+        scheduler = ReviewScheduler()
+        deck = deck_name(GE_TO_EN, 'Natur')
+        scheduler.drill_key(deck, self.index.german_sampler)
+        scheduler.review(deck, 'das Wort003', False)
+        self.assertIn('das Wort003', scheduler._drills[deck].weighted.positions)
+
+
+if __name__ == '__main__':
+    unittest.main()
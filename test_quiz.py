@@ -0,0 +1,65 @@
+import os
+import random
+import shutil
+import tempfile
+import unittest
+
+from benchmark import generate_dictionary
+from matching import CLOSE, EXACT, WRONG, grade_answer
+from quiz import EN_TO_GE, GE_TO_EN, QuizEngine, VocabularyStore
+from scheduler import ReviewScheduler
+from storage import JournalStore
+
+# Headless checks of the quiz engine; quiz.py does not need Kivy.
+#
+#   python -m unittest test_quiz
+
+
+class MultipleChoiceTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        filename = os.path.join(self.directory, 'dictionary.json')
+        store = JournalStore(filename, coalesce_delay=0)
+        # Synthetic compounds, so many options are a typo away from the answer
+        store.compact(generate_dictionary(500, seed=3), background=False)
+        self.vocabulary = VocabularyStore(store)
+        self.topic = next(iter(self.vocabulary.topics))
+        random.seed(0)
+
+    def tearDown(self):
+        self.vocabulary.close()
+        shutil.rmtree(self.directory)
+
+    def engine(self, direction):
+        engine = QuizEngine(self.vocabulary.index, ReviewScheduler(), direction, choices=4)
+        engine.set_topic(self.topic)
+        return engine
+
+    def test_picking_a_distractor_is_wrong(self):
+        close = 0
+        for direction in (GE_TO_EN, EN_TO_GE):
+            engine = self.engine(direction)
+            for _ in range(200):
+                question = engine.new_question()
+                for choice in question.choices:
+                    key = engine.index.normalize(choice)
+                    if key in question.accepted:
+                        continue
+                    close += grade_answer(key, question.accepted, engine.max_typos)[0] == CLOSE
+                    self.assertEqual(engine.check_answer(choice).grade, WRONG)
+        # Otherwise the test would not cover the case that was graded right
+        self.assertGreater(close, 0)
+
+    def test_picking_the_answer_is_right(self):
+        for direction in (GE_TO_EN, EN_TO_GE):
+            engine = self.engine(direction)
+            for _ in range(50):
+                question = engine.new_question()
+                right = [choice for choice in question.choices
+                         if engine.index.normalize(choice) in question.accepted]
+                self.assertEqual(len(right), 1)
+                self.assertEqual(engine.check_answer(right[0]).grade, EXACT)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+import random
+import unittest
+
+from scheduler import FenwickTree, WeightedSampler
+
+# The drill sampler of scheduler.py: a Fenwick tree over the words' weights.
+#
+#   python -m unittest test_scheduler
+
+
+class FenwickTreeTest(unittest.TestCase):
+    def test_prefix_sums_follow_updates(self):
+        rng = random.Random(1)
+        weights = [rng.random() for _ in range(37)]
+        tree = FenwickTree(weights)
+        for _ in range(100):
+            i = rng.randrange(len(weights))
+            delta = rng.random() - weights[i] if rng.random() < 0.5 else rng.random()
+            weights[i] += delta
+            tree.add(i, delta)
+            end = rng.randrange(len(weights) + 1)
+            self.assertAlmostEqual(tree.prefix(end), sum(weights[:end]))
+        self.assertAlmostEqual(tree.total(), sum(weights))
+
+    def test_append_matches_a_tree_built_at_once(self):
+        weights = [float(i % 5) for i in range(50)]
+        tree = FenwickTree()
+        for weight in weights:
+            tree.append(weight)
+        self.assertEqual(tree.tree, FenwickTree(weights).tree)
+
+    def test_find(self):
+        tree = FenwickTree([1.0, 0.0, 2.0, 1.0])
+        self.assertEqual([tree.find(target) for target in (0.0, 0.5, 1.0, 2.9, 3.0, 3.9)], [0, 0, 2, 2, 3, 3])
+
+
+class WeightedSamplerTest(unittest.TestCase):
+    def setUp(self):
+        random.seed(2)
+        self.weights = {'a': 1.0, 'b': 3.0, 'c': 0.0}
+        self.sampler = WeightedSampler(self.weights, lambda key: self.weights[key])
+
+    def draw(self, count=20000):
+        drawn = [self.sampler.draw() for _ in range(count)]
+        return {key: drawn.count(key) / count for key in set(drawn)}
+
+    def test_draws_in_proportion(self):
+        shares = self.draw()
+        self.assertNotIn('c', shares)
+        self.assertAlmostEqual(shares['b'], 0.75, delta=0.02)
+
+    def test_follows_updates_adds_and_removes(self):
+        self.weights['c'] = 4.0
+        self.sampler.update('c')
+        self.weights['d'] = 4.0
+        self.sampler.added('d')
+        self.sampler.removed('b')
+        shares = self.draw()
+        self.assertNotIn('b', shares)
+        self.assertAlmostEqual(shares['a'], 1 / 9, delta=0.02)
+        self.assertAlmostEqual(shares['d'], 4 / 9, delta=0.02)
+
+    def test_holes_are_compacted(self):
+        for i in range(100):
+            self.weights[i] = 1.0
+            self.sampler.added(i)
+        for i in range(100):
+            self.sampler.removed(i)
+        # Holes are dropped once they outnumber the keys
+        self.assertLessEqual(len(self.sampler.keys), 2 * len(self.sampler.positions))
+        self.assertEqual([key for key in self.sampler.keys if key is not None], ['a', 'b', 'c'])
+        self.assertEqual(set(self.draw(1000)), {'a', 'b'})
+
+    def test_all_zero_weights(self):
+        sampler = WeightedSampler(['x', 'y'], lambda key: 0.0)
+        self.assertIn(sampler.draw(), ('x', 'y'))
+        self.assertIsNone(WeightedSampler([], lambda key: 1.0).draw())
+
+
+if __name__ == '__main__':
+    unittest.main()
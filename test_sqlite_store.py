@@ -0,0 +1,111 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+
+from sqlite_store import SCHEMA_VERSION, SQLiteStore, import_json
+from storage import JournalStore
+
+# The SQLite backend in sqlite_store.py.
+#
+#   python -m unittest test_sqlite_store
+
+
+class ImportTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.json_filename = os.path.join(self.directory, 'dictionary.json')
+        self.db_filename = os.path.join(self.directory, 'dictionary.db')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def load_database(self):
+        store = SQLiteStore(self.db_filename)
+        try:
+            return {name: dict(words.items()) for name, words in store.load().items()}
+        finally:
+            store.close()
+
+    def test_journal_is_imported(self):
+        store = JournalStore(self.json_filename, coalesce_delay=0)
+        store.compact({'Tiere': {'der Hund': 'dog', 'die Katze': 'cat'}}, background=False)
+        # Journaled but not compacted yet
+        store.append('add', 'Tiere', 'das Pferd', 'horse')
+        store.append('edit', 'Tiere', 'der Hund', ['dog', 'hound'])
+        store.append('delete', 'Tiere', 'die Katze')
+        store.append('add_topic', 'Essen')
+        store.close()
+
+        self.assertEqual(import_json(self.json_filename, self.db_filename), 2)
+        self.assertEqual(self.load_database(),
+                         {'Tiere': {'der Hund': ['dog', 'hound'], 'das Pferd': 'horse'}, 'Essen': {}})
+
+    def test_missing_snapshot_imports_nothing(self):
+        self.assertEqual(import_json(self.json_filename, self.db_filename), 0)
+        self.assertEqual(self.load_database(), {})
+
+
+class MigrationTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.db_filename = os.path.join(self.directory, 'dictionary.db')
+        # Version 0: several translations were a JSON list in english
+        conn = sqlite3.connect(self.db_filename)
+        conn.executescript("""
+            CREATE TABLE topics (id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE);
+            CREATE TABLE entries (
+                id INTEGER PRIMARY KEY,
+                topic_id INTEGER NOT NULL REFERENCES topics (id) ON DELETE CASCADE,
+                german TEXT NOT NULL,
+                english TEXT NOT NULL,
+                UNIQUE (topic_id, german)
+            );
+            INSERT INTO topics (id, name) VALUES (1, 'Essen');
+            INSERT INTO entries (topic_id, german, english) VALUES
+                (1, 'die Gabel', '["fork", "prong"]'),
+                (1, 'der Löffel', 'spoon'),
+                (1, 'die Klammer', '["bracket');
+        """)
+        conn.commit()
+        conn.close()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_lists_move_to_alternatives(self):
+        store = SQLiteStore(self.db_filename)
+        try:
+            words = store.load()['Essen']
+            self.assertEqual(words['die Gabel'], ['fork', 'prong'])
+            self.assertEqual(words['der Löffel'], 'spoon')
+            # Not JSON, so a translation that merely looks like a list
+            self.assertEqual(words['die Klammer'], '["bracket')
+        finally:
+            store.close()
+        conn = sqlite3.connect(self.db_filename)
+        try:
+            self.assertEqual(conn.execute("PRAGMA user_version").fetchone()[0], SCHEMA_VERSION)
+            self.assertEqual(conn.execute("SELECT english FROM entries WHERE german = 'die Gabel'").fetchone()[0],
+                             'fork')
+        finally:
+            conn.close()
+
+    def test_migration_runs_once(self):
+        SQLiteStore(self.db_filename).close()
+        store = SQLiteStore(self.db_filename)
+        try:
+            store.load()['Essen']['die Zange'] = '["pliers"]'
+        finally:
+            store.close()
+        store = SQLiteStore(self.db_filename)
+        try:
+            # A single translation stored after the migration stays as it is
+            self.assertEqual(store.load()['Essen']['die Zange'], '["pliers"]')
+        finally:
+            store.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
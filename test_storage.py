@@ -0,0 +1,119 @@
+import json
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from storage import JournalStore
+
+# The JSON snapshot, its journal and the background writer of storage.py.
+#
+#   python -m unittest test_storage
+
+
+class JournalTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.filename = os.path.join(self.directory, 'dictionary.json')
+        store = JournalStore(self.filename, coalesce_delay=0)
+        store.compact({'Tiere': {'der Hund': 'dog', 'die Katze': 'cat'}}, background=False)
+        store.close()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write_journal(self, text, filename=None):
+        with open(filename or self.filename + '.journal', 'a') as file:
+            file.write(text)
+
+    def record(self, op, topic, key=None, value=None):
+        record = {'op': op, 'topic': topic}
+        if key is not None:
+            record['key'] = key
+        if value is not None:
+            record['value'] = value
+        return json.dumps(record) + '\n'
+
+    def test_journal_is_replayed_over_the_snapshot(self):
+        store = JournalStore(self.filename, coalesce_delay=0)
+        store.append('add', 'Tiere', 'das Pferd', 'horse')
+        store.append('edit', 'Tiere', 'der Hund', ['dog', 'hound'])
+        store.append('delete', 'Tiere', 'die Katze')
+        store.append('add_topic', 'Essen')
+        store.close()
+        store = JournalStore(self.filename)
+        self.assertEqual(store.load(), {'Tiere': {'der Hund': ['dog', 'hound'], 'das Pferd': 'horse'}, 'Essen': {}})
+        self.assertEqual(store.pending, 4)
+
+    def test_torn_lines_are_skipped(self):
+        self.write_journal(self.record('add', 'Tiere', 'das Pferd', 'horse'))
+        # A crash in the middle of an append, then later records
+        self.write_journal('{"op": "add", "topic": "Tie\n')
+        self.write_journal(self.record('delete', 'Tiere', 'die Katze'))
+        self.write_journal('{"op": "delete", "topic": "Tiere", "ke')
+        self.assertEqual(JournalStore(self.filename).load(), {'Tiere': {'der Hund': 'dog', 'das Pferd': 'horse'}})
+
+    def test_append_after_a_torn_tail_starts_a_new_line(self):
+        self.write_journal('{"op": "delete", "topic": "Tiere", "ke')
+        store = JournalStore(self.filename, coalesce_delay=0)
+        store.append('add', 'Tiere', 'das Pferd', 'horse')
+        store.close()
+        self.assertEqual(JournalStore(self.filename).load(),
+                         {'Tiere': {'der Hund': 'dog', 'die Katze': 'cat', 'das Pferd': 'horse'}})
+
+    def test_rotated_journal_of_older_versions_is_replayed_first(self):
+        self.write_journal(self.record('edit', 'Tiere', 'der Hund', 'hound'), self.filename + '.journal.1')
+        self.write_journal(self.record('edit', 'Tiere', 'der Hund', 'dog'))
+        self.assertEqual(JournalStore(self.filename).load()['Tiere']['der Hund'], 'dog')
+
+    def test_compaction_folds_the_journal(self):
+        store = JournalStore(self.filename, coalesce_delay=0)
+        topics = store.load()
+        topics['Tiere']['das Pferd'] = 'horse'
+        store.append('add', 'Tiere', 'das Pferd', 'horse')
+        store.compact(topics, background=False)
+        store.close()
+        self.assertFalse(os.path.exists(self.filename + '.journal'))
+        with open(self.filename) as file:
+            self.assertEqual(json.load(file)['Tiere']['das Pferd'], 'horse')
+
+
+class WriteFailureTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        # Writes fail with FileNotFoundError until the directory exists
+        self.missing = os.path.join(self.directory, 'missing')
+        self.store = JournalStore(os.path.join(self.missing, 'dictionary.json'), coalesce_delay=0)
+
+    def tearDown(self):
+        self.store.close()
+        shutil.rmtree(self.directory)
+
+    def test_flush_raises_while_a_batch_is_unwritten(self):
+        self.store.append('add', 'Tiere', 'der Hund', 'dog')
+        with self.assertRaises(OSError):
+            self.store.flush()
+        with self.assertRaises(OSError):
+            self.store.compact({'Tiere': {'der Hund': 'dog'}}, background=False)
+
+    def test_retry_writes_the_batch(self):
+        self.store.append('add', 'Tiere', 'der Hund', 'dog')
+        with self.assertRaises(OSError):
+            self.store.flush()
+        os.mkdir(self.missing)
+        deadline = time.monotonic() + 10
+        while self.store._error is not None and time.monotonic() < deadline:
+            time.sleep(0.05)
+        self.store.flush()
+        self.assertEqual(JournalStore(self.store.filename).load(), {'Tiere': {'der Hund': 'dog'}})
+
+    def test_lost_batch_is_logged_on_close(self):
+        self.store.append('add', 'Tiere', 'der Hund', 'dog')
+        with self.assertLogs('translation.storage', 'ERROR') as logs:
+            self.store.close()
+        self.assertIn('unwritten changes lost', logs.output[0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,89 @@
+import os
+import random
+import shutil
+import tempfile
+import unittest
+
+from quiz import VocabularyStore
+from storage import JournalStore
+from vocabulary import KeySampler, TopicIndex
+
+# The in-memory indexes of vocabulary.py, and adding words through them.
+#
+#   python -m unittest test_vocabulary
+
+
+class EntryTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        store = JournalStore(os.path.join(self.directory, 'dictionary.json'), coalesce_delay=0)
+        store.compact({'Natur': {'der See': 'lake', 'die Band': 'band', 'der Ausflug': 'trip'}}, background=False)
+        self.vocabulary = VocabularyStore(store)
+        self.words = self.vocabulary.topics['Natur']
+
+    def tearDown(self):
+        self.vocabulary.close()
+        shutil.rmtree(self.directory)
+
+    def test_article_makes_a_different_word(self):
+        self.assertEqual(self.vocabulary.add_words('Natur', 'die See', 'sea'), 1)
+        self.assertEqual(self.vocabulary.add_words('Natur', 'das Band', 'ribbon'), 1)
+        self.assertEqual(self.words['der See'], 'lake')
+        self.assertEqual(self.words['die See'], 'sea')
+        self.assertEqual(self.words['die Band'], 'band')
+        self.assertEqual(self.words['das Band'], 'ribbon')
+
+    def test_case_and_spacing_are_the_same_word(self):
+        self.assertEqual(self.vocabulary.add_words('Natur', 'der  ausflug', 'excursion'), 1)
+        self.assertNotIn('der  ausflug', self.words)
+        self.assertEqual(self.words['der Ausflug'], ['trip', 'excursion'])
+
+    def test_entry_for(self):
+        index = TopicIndex({'der See': 'lake'})
+        self.assertEqual(index.entry_for('DER SEE'), 'der See')
+        self.assertIsNone(index.entry_for('die See'))
+        self.assertIsNone(index.entry_for('See'))
+        index.delete('der See')
+        self.assertIsNone(index.entry_for('der See'))
+
+    def test_grading_still_ignores_articles(self):
+        index = TopicIndex({'der See': 'lake', 'die See': 'sea'})
+        self.assertEqual(index.accepted_german('lake'), frozenset(['see']))
+
+
+class KeySamplerTest(unittest.TestCase):
+    def setUp(self):
+        random.seed(3)
+        self.keys = [f"key{i}" for i in range(10)]
+        self.sampler = KeySampler(self.keys)
+
+    def test_a_round_draws_every_key_once(self):
+        for _ in range(3):
+            self.assertEqual(sorted(self.sampler.draw() for _ in self.keys), sorted(self.keys))
+
+    def test_put_back_key_is_drawn_again_this_round(self):
+        drawn = [self.sampler.draw() for _ in range(4)]
+        self.sampler.put_back(drawn[1])
+        rest = [self.sampler.draw() for _ in range(7)]
+        self.assertEqual(sorted(drawn[:1] + drawn[2:] + rest), sorted(self.keys))
+
+    def test_put_back_of_an_undrawn_key_changes_nothing(self):
+        drawn = {self.sampler.draw() for _ in range(4)}
+        undrawn = next(key for key in self.keys if key not in drawn)
+        self.sampler.put_back(undrawn)
+        self.assertEqual(self.sampler.remaining, 6)
+        self.sampler.put_back('unknown')
+        self.assertEqual(self.sampler.remaining, 6)
+
+    def test_positions_follow_the_swaps(self):
+        for _ in range(5):
+            self.sampler.put_back(self.sampler.draw())
+            self.sampler.draw()
+        self.sampler.remove('key3')
+        self.sampler.add('key10')
+        self.assertEqual({key: i for i, key in enumerate(self.sampler.keys)}, self.sampler.positions)
+        self.assertEqual(len(self.sampler.keys[:self.sampler.remaining]), self.sampler.remaining)
+
+
+if __name__ == '__main__':
+    unittest.main()
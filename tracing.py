@@ -0,0 +1,193 @@
+import bisect
+import functools
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+# Opt-in instrumentation.  While the tracer is enabled, traced calls are
+# recorded as spans: kept as Chrome trace events (load the exported file in
+# chrome://tracing or https://ui.perfetto.dev) and in a rolling histogram of
+# recent durations per name, which the debug overlay shows.  While it is
+# disabled a traced call costs one attribute check.
+
+# Upper bounds of the histogram buckets, in milliseconds
+BUCKETS = (1, 2, 4, 8, 16, 33, 66, 133, 266)
+
+
+class RollingHistogram(object):
+    # Durations of the last `size` calls of one name
+    def __init__(self, size=500):
+        self.durations = deque(maxlen=size)
+        self.count = 0
+
+    def add(self, duration):
+        self.durations.append(duration)
+        self.count += 1
+
+    def percentile(self, p):
+        ordered = sorted(self.durations)
+        if not ordered:
+            return 0.0
+        return ordered[min(len(ordered) - 1, int(p / 100.0 * len(ordered)))]
+
+    def buckets(self):
+        # Counts per BUCKETS bound, plus one for anything slower
+        counts = [0] * (len(BUCKETS) + 1)
+        for duration in self.durations:
+            counts[bisect.bisect_left(BUCKETS, duration * 1000)] += 1
+        return counts
+
+
+class Tracer(object):
+    def __init__(self, max_events=100000):
+        self.enabled = False
+        self.events = deque(maxlen=max_events)
+        self.histograms = {}
+        self.slow_frames = 0
+        self.frame_budget = 1 / 60.0
+        self._pid = os.getpid()
+        self._start = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def _timestamp(self, t):
+        # Chrome trace timestamps are microseconds
+        return (t - self._start) * 1e6
+
+    def record(self, name, category, start, end, args=None):
+        event = {'name': name, 'cat': category, 'ph': 'X', 'ts': self._timestamp(start),
+                 'dur': (end - start) * 1e6, 'pid': self._pid, 'tid': threading.get_ident()}
+        if args:
+            event['args'] = args
+        # Store operations are also traced on the writer thread
+        with self._lock:
+            self.events.append(event)
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = RollingHistogram()
+            histogram.add(end - start)
+
+    def instant(self, name, category, args=None):
+        event = {'name': name, 'cat': category, 'ph': 'i', 's': 't', 'ts': self._timestamp(time.perf_counter()),
+                 'pid': self._pid, 'tid': threading.get_ident()}
+        if args:
+            event['args'] = args
+        with self._lock:
+            self.events.append(event)
+
+    @contextmanager
+    def span(self, name, category='app', **args):
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, category, start, time.perf_counter(), args)
+
+    def frame(self, dt):
+        # Called once per frame with the time since the previous one
+        if not self.enabled:
+            return
+        end = time.perf_counter()
+        self.record('frame', 'frame', end - dt, end)
+        if dt > self.frame_budget:
+            self.slow_frames += 1
+            self.instant('slow frame', 'frame', {'ms': round(dt * 1000, 1)})
+            log.warning('slow frame', ms=round(dt * 1000, 1), budget_ms=round(self.frame_budget * 1000, 1))
+
+    def summary(self):
+        # name -> (calls, p50, p95, max) in seconds, over the recent calls
+        with self._lock:
+            histograms = list(self.histograms.items())
+        return {name: (h.count, h.percentile(50), h.percentile(95), max(h.durations, default=0.0))
+                for name, h in histograms}
+
+    def export_chrome_trace(self, filename):
+        with self._lock:
+            events = list(self.events)
+        with open(filename, 'w') as file:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, file)
+
+
+TRACER = Tracer()
+
+
+def traced(name=None, category='ui'):
+    # Decorator recording every call of a function as a span
+    def decorate(function):
+        span_name = name or function.__name__
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not TRACER.enabled:
+                return function(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                TRACER.record(span_name, category, start, time.perf_counter())
+        return wrapper
+    return decorate
+
+
+def instrument(obj, names, category='store', prefix=None):
+    # Traces the given methods of one object, e.g. a store, by shadowing
+    # them with traced wrappers on the instance
+    prefix = prefix or type(obj).__name__
+    for method in names:
+        # Not every store has every method, e.g. SQLiteStore has no writer
+        if not hasattr(obj, method):
+            continue
+        setattr(obj, method, traced(f"{prefix}.{method}", category)(getattr(obj, method)))
+    return obj
+
+
+class StructuredLogger(object):
+    # logging.Logger taking an event name and key=value fields.  The message
+    # is only formatted when its level is enabled.
+    def __init__(self, name):
+        self.logger = logging.getLogger(name)
+
+    def log(self, level, event, exc_info=False, **fields):
+        if self.logger.isEnabledFor(level):
+            details = ' '.join(f"{key}={value!r}" for key, value in fields.items())
+            self.logger.log(level, f"{event} {details}" if details else event, exc_info=exc_info)
+
+    def debug(self, event, **fields):
+        self.log(logging.DEBUG, event, **fields)
+
+    def info(self, event, **fields):
+        self.log(logging.INFO, event, **fields)
+
+    def warning(self, event, **fields):
+        self.log(logging.WARNING, event, **fields)
+
+    def error(self, event, **fields):
+        self.log(logging.ERROR, event, **fields)
+
+    def exception(self, event, **fields):
+        # error() with the traceback of the exception being handled
+        self.log(logging.ERROR, event, exc_info=True, **fields)
+
+
+def get_logger(name):
+    return StructuredLogger(f"translation.{name}")
+
+
+def configure_logging(level):
+    # level is a name such as "debug" or "warning"
+    logger = logging.getLogger('translation')
+    logger.setLevel(getattr(logging, level.upper(), logging.WARNING))
+    if not logger.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter('[%(levelname)-7s] %(name)s: %(message)s'))
+        logger.addHandler(handler)
+        logger.propagate = False
+
+
+log = get_logger('tracing')
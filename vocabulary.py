@@ -0,0 +1,272 @@
+import random
+from matching import BKTree
+from normalize import identity_key, normalize
+
+# In-memory indexes over the topics, kept in sync with every change so the
+# quiz screens never have to scan a topic.
+
+
+class KeySampler(object):
+    # Cached key array for O(1) random draws.  In shuffle-bag mode the array
+    # is split into keys not yet drawn this round, keys[:remaining], and keys
+    # already drawn; every draw swaps its pick to the boundary, so no key
+    # repeats until the whole deck has been seen.
+    def __init__(self, keys, shuffle_bag=True):
+        self.keys = list(keys)
+        self.positions = {key: i for i, key in enumerate(self.keys)}
+        self.shuffle_bag = shuffle_bag
+        self.remaining = len(self.keys)
+        # Objects with added(key)/removed(key) that mirror this key set
+        self.listeners = []
+
+    def __len__(self):
+        return len(self.keys)
+
+    def draw(self):
+        if not self.keys:
+            return None
+        if not self.shuffle_bag:
+            return self.keys[int(random.random() * len(self.keys))]
+
+        if self.remaining == 0:
+            self.remaining = len(self.keys)
+        last = self.remaining - 1
+        self._swap(int(random.random() * self.remaining), last)
+        self.remaining = last
+        return self.keys[last]
+
+    def add(self, key):
+        if key in self.positions:
+            return
+        self.positions[key] = len(self.keys)
+        self.keys.append(key)
+        # A new word joins the current round
+        self._swap(len(self.keys) - 1, self.remaining)
+        self.remaining += 1
+        for listener in self.listeners:
+            listener.added(key)
+
+    def put_back(self, key):
+        # Returns a key drawn this round to the undrawn part, e.g. when a
+        # question drawn ahead of time is thrown away unasked
+        i = self.positions.get(key)
+        if i is None or not self.shuffle_bag or i < self.remaining:
+            return
+        self._swap(i, self.remaining)
+        self.remaining += 1
+
+    def remove(self, key):
+        i = self.positions[key]
+        if i < self.remaining:
+            # Keep the undrawn part contiguous
+            self.remaining -= 1
+            self._swap(i, self.remaining)
+            i = self.remaining
+        self._swap(i, len(self.keys) - 1)
+        self.keys.pop()
+        del self.positions[key]
+        for listener in self.listeners:
+            listener.removed(key)
+
+    def _swap(self, i, j):
+        if i != j:
+            keys = self.keys
+            keys[i], keys[j] = keys[j], keys[i]
+            self.positions[keys[i]] = i
+            self.positions[keys[j]] = j
+
+
+def alternatives(value):
+    # A translation is either one string or a list of accepted strings
+    return value if isinstance(value, list) else [value]
+
+
+def split_alternatives(text):
+    # "glasses, spectacles" -> ["glasses", "spectacles"]
+    parts = []
+    for part in text.split(','):
+        part = part.strip()
+        if part and part not in parts:
+            parts.append(part)
+    return parts
+
+
+class TopicIndex(object):
+    def __init__(self, words, shuffle_bag=True, normalize=normalize):
+        self.normalize = normalize
+        # german -> english (one string or a list) is the topic mapping itself
+        self.words = words
+        # english alternative -> set of german words accepting it
+        self.english_to_german = {}
+        # stored string -> its normalized form, computed once
+        self.normalized = {}
+        # identity_key() of a german word -> german words, to spot ones
+        # stored with a different case or spacing
+        self.german_by_key = {}
+        # german -> frozenset of normalized English answers
+        self.english_answers = {}
+        # english -> frozenset of normalized German answers, filled on use
+        self.german_answers = {}
+        # One sampler per quiz direction
+        self.german_sampler = KeySampler(self.words, shuffle_bag)
+        self.english_sampler = KeySampler((), shuffle_bag)
+        # direction -> BKTree over the answers, once build_answer_tree() is done
+        self._answer_trees = {}
+        # direction -> answers added while its tree is being built
+        self._tree_additions = {}
+        repeated = []
+        for german, english in words.items():
+            if isinstance(english, list) and len(set(english)) < len(english):
+                # A hand-edited dictionary.json can list a translation twice
+                english = list(dict.fromkeys(english))
+                repeated.append((german, english[0] if len(english) == 1 else english))
+            self.german_by_key.setdefault(identity_key(german), set()).add(german)
+            self._link(german, english)
+        for german, english in repeated:
+            words[german] = english
+
+    def key(self, text):
+        # Normalized form of a stored string
+        key = self.normalized.get(text)
+        if key is None:
+            key = self.normalized[text] = self.normalize(text)
+        return key
+
+    def german_for(self, english):
+        return self.english_to_german.get(english, set())
+
+    def accepted_english(self, german):
+        return self.english_answers[german]
+
+    def accepted_german(self, english):
+        answers = self.german_answers.get(english)
+        if answers is None:
+            answers = self.german_answers[english] = frozenset(self.key(german) for german in self.german_for(english))
+        return answers
+
+    def entry_for(self, german):
+        # The stored word german would be filed under, or None if it is new.
+        # Unlike grading, this never ignores articles: "die See" is not
+        # filed under "der See".
+        if german in self.words:
+            return german
+        duplicates = self.german_by_key.get(identity_key(german))
+        return min(duplicates) if duplicates else None
+
+    def answer_tree(self, direction):
+        # None until build_answer_tree() is done
+        return self._answer_trees.get(direction)
+
+    def build_answer_tree(self, direction, lock):
+        # Takes seconds for 100,000 answers, so it runs on the prefetch
+        # thread and lock, the VocabularyStore.lock, is only held to copy
+        # the answers and to hand the tree over.  Answers added meanwhile
+        # are collected by set() and _link() and added at the end.
+        with lock:
+            if direction in self._answer_trees or direction in self._tree_additions:
+                return
+            answers = list(self.english_to_german if direction == 'ge_to_en' else self.words)
+            additions = self._tree_additions[direction] = []
+        try:
+            tree = BKTree(normalize=self.key)
+            for answer in answers:
+                # normalize itself, as self.key() caches into a dict the
+                # other threads change
+                tree.add(answer, self.normalize(answer))
+            with lock:
+                for answer in additions:
+                    tree.add(answer)
+                self._answer_trees[direction] = tree
+        finally:
+            with lock:
+                del self._tree_additions[direction]
+
+    def _add_answer(self, direction, answer):
+        if direction in self._answer_trees:
+            self._answer_trees[direction].add(answer)
+        elif direction in self._tree_additions:
+            self._tree_additions[direction].append(answer)
+
+    def set(self, german, english):
+        old = self.words.get(german)
+        if old is not None:
+            self._unlink(old, german)
+        else:
+            self.german_sampler.add(german)
+            self.german_by_key.setdefault(identity_key(german), set()).add(german)
+            self._add_answer('en_to_ge', german)
+        self.words[german] = english
+        self._link(german, english)
+        return 'add' if old is None else 'edit'
+
+    def merge(self, german, english_alternatives):
+        # Adds the translations german does not accept yet; returns the
+        # (op, value) to persist, or None when there was nothing new.
+        old = self.words.get(german)
+        known = set(self.english_answers.get(german, ()))
+        merged = list(alternatives(old)) if old is not None else []
+        for english in english_alternatives:
+            if self.key(english) not in known:
+                known.add(self.key(english))
+                merged.append(english)
+        if old is not None and len(merged) == len(alternatives(old)):
+            return None
+        value = merged[0] if len(merged) == 1 else merged
+        return self.set(german, value), value
+
+    def delete(self, german):
+        english = self.words.pop(german)
+        self.german_sampler.remove(german)
+        self.normalized.pop(german, None)
+        key = identity_key(german)
+        self.german_by_key[key].discard(german)
+        if not self.german_by_key[key]:
+            del self.german_by_key[key]
+        self._unlink(english, german)
+        del self.english_answers[german]
+
+    def _link(self, german, english):
+        answers = []
+        for alternative in alternatives(english):
+            if alternative not in self.english_to_german:
+                self.english_to_german[alternative] = set()
+                self.english_sampler.add(alternative)
+                self._add_answer('ge_to_en', alternative)
+            self.english_to_german[alternative].add(german)
+            self.german_answers.pop(alternative, None)
+            answers.append(self.key(alternative))
+        self.english_answers[german] = frozenset(answers)
+
+    def _unlink(self, english, german):
+        for alternative in alternatives(english):
+            germans = self.english_to_german[alternative]
+            germans.discard(german)
+            self.german_answers.pop(alternative, None)
+            if not germans:
+                del self.english_to_german[alternative]
+                self.english_sampler.remove(alternative)
+
+
+class VocabularyIndex(object):
+    def __init__(self, topics, shuffle_bag=True, normalize=normalize, packs=None):
+        self.topics = topics
+        self.shuffle_bag = shuffle_bag
+        self.normalize = normalize
+        # name -> packs.VocabularyPack, read-only topics quizzed from disk
+        self.packs = packs if packs is not None else {}
+        self._indexes = {}
+
+    def topic(self, name):
+        # Built the first time a topic is used, then maintained incrementally
+        index = self._indexes.get(name)
+        if index is None:
+            if name not in self.topics and name in self.packs:
+                # packs builds on this module
+                from packs import PackIndex
+                index = self._indexes[name] = PackIndex(self.packs[name], self.shuffle_bag, self.normalize)
+            else:
+                index = self._indexes[name] = TopicIndex(self.topics[name], self.shuffle_bag, self.normalize)
+        return index
+
+    def is_built(self, name):
+        return name in self._indexes